@@ -1,194 +1,561 @@
 from http.server import BaseHTTPRequestHandler
+import io
 import json
-import base64
-import pandas as pd
-from io import StringIO, BytesIO
+import os
 import traceback
 import re
+import itertools
 import rate_limiter
 import cache_headers
 import cors
-import csv_validator
-import cgi
+import fast_path
+import multipart_parser
+import result_cache
+import parallel
+import response_writer
+import metrics
+from urllib.parse import parse_qs, urlsplit
+
+# Importing pandas and numpy is most of a cold start, so the modules built on
+# them (csv_validator, transaction_engine, whale_aggregator, incremental) are
+# imported where they are first needed. Small uploads on the fast path never
+# load them.
 
 class handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 is needed for chunked (streamed) responses; every other response
+    # sends a Content-Length so the connection can be kept alive
+    protocol_version = 'HTTP/1.1'
+    STREAM_BATCH_ROWS = 5000
+    MAX_TOKENS = 100
+    # Seconds per unit suffix of the timeline `interval`, and its bounds
+    INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    MAX_INTERVAL_SECONDS = 366 * 86400
+    MAX_EARLY_BUYERS = 1000
+    # Bodies above this are refused from their Content-Length, before any of them is read:
+    # the largest CSV the validator streams, plus room for the other form fields
+    MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', 513 * 1024 * 1024))
+
     def do_POST(self):
-        ctype, pdict = cgi.parse_header(self.headers.get('content-type'))
+        try:
+            content_length = int(self.headers.get('content-length') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self._send_error(400, "Invalid Content-Length header.")
+            return
+        if content_length > self.MAX_REQUEST_BYTES:
+            self._send_error(413, f"Request body exceeds the limit of {self.MAX_REQUEST_BYTES // (1024 * 1024)}MB.")
+            return
+
+        ctype, params = multipart_parser.parse_header_options(self.headers.get('content-type'))
         if ctype == 'multipart/form-data':
-            pdict['boundary'] = bytes(pdict['boundary'], "utf-8")
-            pdict['CONTENT-LENGTH'] = int(self.headers['content-length'])
-            form = cgi.FieldStorage(
-                fp=self.rfile,
-                headers=self.headers,
-                environ={'REQUEST_METHOD': 'POST'},
-                keep_blank_values=True
-            )
+            # Stream the body; the file part is spooled to disk once it gets large
+            try:
+                with metrics.metrics.stage('multipart') as stage:
+                    stage.nbytes = content_length
+                    form = multipart_parser.MultipartParser(
+                        self.rfile,
+                        params.get('boundary'),
+                        content_length
+                    ).parse()
+            except ValueError as e:
+                self._send_error(400, str(e))
+                return
+
             try:
                 # Extract fields from the form
                 sol_usd_price = float(form.getvalue('solPrice'))
-                token_address = form.getvalue('tokenAddress')
-                total_supply = float(form.getvalue('totalSupply'))
-                market_cap_threshold = float(form.getvalue('marketCap'))
-                fileitem = form['file']
-                if not fileitem.file:
+                # Multi-token mode takes a JSON list in place of the single-token fields
+                tokens = form.getvalue('tokens')
+                if tokens is not None:
+                    try:
+                        tokens = self._parse_tokens(tokens)
+                    except ValueError as e:
+                        self._send_error(400, str(e))
+                        return
+                    token_address = total_supply = market_cap_threshold = None
+                else:
+                    token_address = form.getvalue('tokenAddress')
+                    total_supply = float(form.getvalue('totalSupply'))
+                    market_cap_threshold = float(form.getvalue('marketCap'))
+                try:
+                    top_n = self._parse_top_n(form.getvalue('topN'))
+                except ValueError as e:
+                    self._send_error(400, str(e))
+                    return
+                # Either a new upload, or the hash of a file uploaded earlier
+                fileitem = form.files.get('file')
+                file_hash = fileitem.sha256 if fileitem is not None else form.getvalue('fileHash')
+                if not file_hash:
                     self._send_error(400, "No file uploaded.")
                     return
-                file_content = fileitem.file.read()
-                csv_base64 = base64.b64encode(file_content).decode('utf-8')
+                if not re.fullmatch(r'[0-9a-f]{64}', file_hash):
+                    self._send_error(400, "fileHash must be a hex SHA-256 digest.")
+                    return
+
+                # Incremental mode folds new rows into per-token state, so its
+                # responses depend on earlier requests and are never cached
+                incremental_mode = form.getvalue('mode') == 'incremental'
 
-                # Validate CSV data
                 try:
-                    df = csv_validator.CSVValidator.validate_csv_base64(csv_base64)
-                    token_columns = csv_validator.CSVValidator.validate_token_columns(df)
+                    response_format = response_writer.negotiate_format(
+                        self.headers.get('Accept'),
+                        form.getvalue('format') or self._query_param('format')
+                    )
                 except ValueError as e:
                     self._send_error(400, str(e))
                     return
+                if tokens is not None and (incremental_mode or response_format not in ('json', 'columnar')):
+                    self._send_error(400, "Multi-token mode only supports the json and columnar formats.")
+                    return
+                if incremental_mode and response_format != 'json':
+                    self._send_error(400, "mode=incremental only supports the json format.")
+                    return
 
-                # Process the data
-                result = self._process_transactions(
-                    df,
-                    sol_usd_price,
-                    token_address,
-                    total_supply,
-                    market_cap_threshold,
-                    token_columns
-                )
+                # Time-series aggregates, and dropping the per-row records, need the whole file at once
+                try:
+                    interval = self._parse_interval(form.getvalue('interval'))
+                    early_buyers = self._parse_early_buyers(form.getvalue('earlyBuyers'))
+                except ValueError as e:
+                    self._send_error(400, str(e))
+                    return
+                include_transactions = form.getvalue('summary') != 'true'
+                wants_aggregates = interval is not None or early_buyers is not None or not include_transactions
+                if wants_aggregates and (incremental_mode or response_format not in ('json', 'columnar')):
+                    self._send_error(400, "interval, earlyBuyers and summary only support the json and columnar "
+                                          "formats, without mode=incremental.")
+                    return
 
-                # Send successful response
-                self._send_success(result)
+                # NDJSON is written while the upload is still being processed,
+                # so it bypasses both caches to keep memory flat
+                if response_format == 'ndjson' and not incremental_mode:
+                    with parallel.analysis_executor.slot():
+                        self._stream_ndjson(
+                            fileitem,
+                            file_hash,
+                            sol_usd_price,
+                            token_address,
+                            total_supply,
+                            market_cap_threshold,
+                            top_n
+                        )
+                    return
+
+                if not incremental_mode:
+                    # Identical uploads with identical parameters map to the same result
+                    cache_key = result_cache.ResultCache.make_key(
+                        file_hash,
+                        sol_usd_price,
+                        token_address,
+                        total_supply,
+                        market_cap_threshold,
+                        top_n,
+                        response_format,
+                        # Passed as a list, not a string, so the addresses keep the case the response echoes
+                        tokens,
+                        interval,
+                        early_buyers,
+                        include_transactions
+                    )
+                    etag = f'"{cache_key}"'
+                    if result_cache.etag_matches(self.headers.get('If-None-Match'), etag):
+                        self._send_not_modified(etag, file_hash)
+                        return
+
+                    body = result_cache.result_cache.get(cache_key)
+                    if body is not None:
+                        self._send_body(body, etag, cache_status='HIT', file_hash=file_hash,
+                                        content_type=response_writer.FORMATS[response_format])
+                        return
+
+                # Small uploads answered as json or columnar are analyzed without pandas
+                use_fast_path = (tokens is None and not incremental_mode and response_format in fast_path.FORMATS
+                                 and interval is None and early_buyers is None)
+
+                # Parsing and pricing are the heavy part; they run in one of a bounded number of slots
+                with parallel.analysis_executor.slot():
+                    if fileitem is None:
+                        # Recompute from the parsed columns cached for this file
+                        parts = self._cached_parts(file_hash, use_fast_path)
+                        if parts is None:
+                            self._send_error(404, "Unknown or expired fileHash. Please upload the file again.")
+                            return
+                    else:
+                        try:
+                            parts = self._parse_upload(fileitem, use_fast_path)
+                        except ValueError as e:
+                            self._send_error(400, str(e))
+                            return
+                        result_cache.intermediate_cache.put(file_hash, parts)
+
+                    if incremental_mode:
+                        import incremental
+                        if form.getvalue('reset') == 'true':
+                            incremental.incremental_store.reset(token_address)
+                        state = incremental.incremental_store.get(
+                            token_address, total_supply, market_cap_threshold, sol_usd_price
+                        )
+                        with metrics.metrics.stage('process') as stage:
+                            result = state.update(parts, token_address, top_n)
+                            stage.rows = sum(len(prepared) for prepared in parts)
+                        with metrics.metrics.stage('serialize') as stage:
+                            body = json.dumps(result).encode()
+                            stage.nbytes = len(body)
+                        self._send_body(body, file_hash=file_hash)
+                        return
+
+                    columnar = response_format in response_writer.COLUMNAR_FORMATS
+                    with metrics.metrics.stage('process') as stage:
+                        if isinstance(parts, fast_path.SmallUpload):
+                            result = parts.process(
+                                sol_usd_price,
+                                token_address,
+                                total_supply,
+                                market_cap_threshold,
+                                top_n,
+                                columnar=columnar,
+                                include_transactions=include_transactions
+                            )
+                        elif tokens is not None:
+                            import transaction_engine
+                            result = {
+                                "tokens": transaction_engine.TransactionEngine.process_tokens(
+                                    parts, sol_usd_price, tokens, top_n, columnar=columnar, interval=interval,
+                                    early_buyers=early_buyers, include_transactions=include_transactions
+                                )
+                            }
+                        else:
+                            result = self._process_prepared(
+                                parts,
+                                sol_usd_price,
+                                token_address,
+                                total_supply,
+                                market_cap_threshold,
+                                top_n,
+                                columnar=columnar,
+                                interval=interval,
+                                early_buyers=early_buyers,
+                                include_transactions=include_transactions
+                            )
+                        stage.rows = (len(parts) if isinstance(parts, fast_path.SmallUpload)
+                                      else sum(len(prepared) for prepared in parts))
+
+                    # Cache and send successful response
+                    with metrics.metrics.stage('serialize') as stage:
+                        body = response_writer.encode_result(result, response_format)
+                        stage.nbytes = len(body)
+                    result_cache.result_cache.put(cache_key, body)
+                    self._send_body(body, etag, cache_status='MISS', file_hash=file_hash,
+                                    content_type=response_writer.FORMATS[response_format])
 
+            except parallel.Overloaded:
+                self._send_overloaded()
             except Exception as e:
                 print(f"Internal server error: {traceback.format_exc()}")
                 self._send_error(500, "An unexpected error occurred. Please try again later.")
+            finally:
+                form.close()
         else:
             self._send_error(400, "Content-Type must be multipart/form-data.")
 
-    def _process_transactions(self, df, sol_usd_price, token_address, total_supply, market_cap_threshold, token_columns):
+    def do_GET(self):
+        if urlsplit(self.path).path.rstrip('/') == '/api/metrics' and metrics.metrics.enabled:
+            self._send_metrics()
+            return
+        self._send_error(404, "Not found.")
+
+    def _process_transactions(self, df, sol_usd_price, token_address, total_supply, market_cap_threshold, token_columns, top_n=None):
         """
         Process the transaction data to calculate TOKEN2/USD Price, Market Cap, 
         and perform Whale & Early Buyer Analysis.
         """
-        # Create arrays for results
-        transactions = []
-        
-        # Track wallets for whale analysis
-        whale_data = {}
-        
-        for index, row in df.iterrows():
-            transaction = {
-                "Signature": row["Signature"],
-                "Human Time": row["Human Time"]
-            }
-            
-            # Get token addresses
-            token1_address = str(row[token_columns['token1_address']]).lower()
-            token2_address = str(row[token_columns['token2_address']]).lower()
-            
-            # Check if Token1 is SOL (handle different case variations)
-            is_sol_transaction = token1_address == "sol" or token1_address == "solana"
-            
-            # Check if Token2 matches the input token address
-            is_target_token = token2_address == token_address.lower()
-            
-            if is_sol_transaction and is_target_token:
-                try:
-                    # Convert amounts to float (handle string formats)
-                    token1_amount = self._parse_numeric(row[token_columns['token1_amount']])
-                    token2_amount = self._parse_numeric(row[token_columns['token2_amount']])
-                    
-                    # Prevent division by zero
-                    if token2_amount > 0:
-                        # Calculate price based on the ratio of SOL to token2 and SOL/USD price
-                        token2_usd_price = (token1_amount / token2_amount) * sol_usd_price
-                        market_cap_usd = token2_usd_price * total_supply
-                        
-                        transaction["TOKEN2_USD_Price"] = round(token2_usd_price, 4)
-                        transaction["Market_Cap_USD"] = round(market_cap_usd, 2)
-                        
-                        # Track for whale analysis if this is before market cap threshold
-                        if market_cap_usd < market_cap_threshold:
-                            # Get wallet address from appropriate column
-                            wallet_address = self._get_wallet_address(row, token_columns.get('wallet'))
-                            
-                            if wallet_address not in whale_data:
-                                whale_data[wallet_address] = {
-                                    "sol_invested": 0,
-                                    "market_caps": []
-                                }
-                            
-                            whale_data[wallet_address]["sol_invested"] += token1_amount
-                            whale_data[wallet_address]["market_caps"].append(market_cap_usd)
-                    else:
-                        transaction["TOKEN2_USD_Price"] = "N/A"
-                        transaction["Market_Cap_USD"] = "N/A"
-                except (ValueError, TypeError):
-                    transaction["TOKEN2_USD_Price"] = "N/A"
-                    transaction["Market_Cap_USD"] = "N/A"
-            else:
-                transaction["TOKEN2_USD_Price"] = "N/A"
-                transaction["Market_Cap_USD"] = "N/A"
-            
-            transactions.append(transaction)
-        
-        # Process whale report
-        whale_report = []
-        for wallet, data in whale_data.items():
-            total_sol = data["sol_invested"]
-            total_usd = total_sol * sol_usd_price
-            avg_market_cap = sum(data["market_caps"]) / len(data["market_caps"]) if data["market_caps"] else 0
-            
-            whale_report.append({
-                "Wallet": wallet,
-                "Total_SOL": f"{total_sol:.2f} SOL",
-                "Total_USD": f"${total_usd:,.2f}",
-                "Avg_Market_Cap_USD": f"${avg_market_cap / 1000000:.2f}M" if avg_market_cap >= 1000000 else f"${avg_market_cap:,.2f}"
-            })
-        
-        # Sort whale report by Total SOL invested (descending)
-        whale_report.sort(key=lambda x: float(x["Total_SOL"].split()[0]), reverse=True)
-        
-        return {
-            "transactions": transactions,
-            "whale_report": whale_report
-        }
-    
-    def _parse_numeric(self, value):
-        """Parse numeric values from various formats"""
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, str):
-            # Remove any currency symbols and commas
-            value = re.sub(r'[^\d.-]', '', value)
-            return float(value)
-        raise ValueError(f"Invalid numeric value: {value}")
+        import transaction_engine
+        return transaction_engine.TransactionEngine.process(
+            df,
+            sol_usd_price,
+            token_address,
+            total_supply,
+            market_cap_threshold,
+            token_columns,
+            top_n
+        )
     
-    def _get_wallet_address(self, row, wallet_column):
-        """Get wallet address from the appropriate column"""
-        if wallet_column and wallet_column in row:
-            return str(row[wallet_column]).lower()
-        return "unknown"
+    def _iter_prepared_upload(self, fileobj):
+        """Parse and validate an uploaded CSV chunk by chunk, yielding prepared columns"""
+        import csv_validator
+        import transaction_engine
+
+        chunks = csv_validator.CSVValidator.iter_validated_chunks(fileobj)
+        first_chunk = next(chunks)
+        token_columns = first_chunk.schema.token_columns()
+
+        # Later chunks are validated as they are read, so errors can surface here too
+        for chunk in itertools.chain([first_chunk], chunks):
+            with metrics.metrics.stage('prepare') as stage:
+                prepared = transaction_engine.TransactionEngine.prepare(chunk.frame, token_columns, chunk.timestamps)
+                stage.rows = len(prepared)
+            yield prepared
+
+    def _prepare_upload(self, fileobj):
+        """Parse and validate a whole uploaded CSV into a list of prepared columns"""
+        return list(self._iter_prepared_upload(fileobj))
+
+    def _parse_upload(self, fileitem, use_fast_path=False):
+        """Parse an upload into prepared columns, or into a fast_path.SmallUpload when it is small and plain"""
+        if not use_fast_path or fileitem.size > fast_path.MAX_BYTES:
+            return self._prepare_upload(fileitem.file)
+        data = fileitem.file.read()
+        try:
+            with metrics.metrics.stage('fast_parse') as stage:
+                upload = fast_path.parse(data)
+                stage.rows = len(upload)
+                stage.nbytes = len(data)
+            return upload
+        except fast_path.Unsupported:
+            # Anything out of the ordinary, invalid files included, gets the full engine's result or error
+            return self._prepare_upload(io.BytesIO(data))
+
+    def _cached_parts(self, file_hash, use_fast_path=False):
+        """
+        Return the parsed upload cached for a file hash, or None. A small upload
+        cached by the fast path is parsed again with the full engine when this
+        request needs prepared columns.
+        """
+        parts = result_cache.intermediate_cache.get(file_hash)
+        if isinstance(parts, fast_path.SmallUpload) and not use_fast_path:
+            parts = self._prepare_upload(io.BytesIO(parts.data))
+            result_cache.intermediate_cache.put(file_hash, parts)
+        return parts
+
+    def _stream_ndjson(self, fileitem, file_hash, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n=None):
+        """Analyze and send the result as NDJSON, one part at a time"""
+        import transaction_engine
+        import whale_aggregator
+
+        if fileitem is None:
+            parts = self._cached_parts(file_hash)
+            if parts is None:
+                self._send_error(404, "Unknown or expired fileHash. Please upload the file again.")
+                return
+        else:
+            # Pull the first part before responding so header and first-chunk errors are still a 400
+            parts = self._iter_prepared_upload(fileitem.file)
+            try:
+                parts = itertools.chain([next(parts)], parts)
+            except ValueError as e:
+                self._send_error(400, str(e))
+                return
+
+        aggregator = whale_aggregator.WhaleAggregator()
+        batches = transaction_engine.TransactionEngine.iter_transaction_batches(
+            parts,
+            sol_usd_price,
+            token_address,
+            total_supply,
+            market_cap_threshold,
+            aggregator
+        )
+        self._send_ndjson(batches, lambda: aggregator.report(sol_usd_price, top_n), file_hash)
+
+    def _parse_tokens(self, value):
+        """Parse the multi-token `tokens` field into (address, total supply, threshold) tuples"""
+        try:
+            entries = json.loads(value)
+        except json.JSONDecodeError:
+            raise ValueError("tokens must be a JSON list.")
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("tokens must be a non-empty JSON list.")
+        if len(entries) > self.MAX_TOKENS:
+            raise ValueError(f"At most {self.MAX_TOKENS} tokens can be analyzed per request.")
+
+        tokens = []
+        seen = set()
+        for entry in entries:
+            try:
+                token_address = entry['tokenAddress']
+                total_supply = float(entry['totalSupply'])
+                market_cap_threshold = float(entry['marketCap'])
+            except (TypeError, KeyError, ValueError):
+                raise ValueError("Each token needs tokenAddress, totalSupply and marketCap.")
+            if not isinstance(token_address, str) or not token_address:
+                raise ValueError("Each token needs tokenAddress, totalSupply and marketCap.")
+            if token_address.lower() in seen:
+                raise ValueError(f"Duplicate token address: {token_address}")
+            seen.add(token_address.lower())
+            tokens.append((token_address, total_supply, market_cap_threshold))
+        return tokens
+
+    def _parse_top_n(self, value):
+        """Parse the `topN` field, the number of whales to report"""
+        if not value:
+            return None
+        try:
+            top_n = int(value)
+        except ValueError:
+            top_n = -1
+        if top_n < 0:
+            raise ValueError("topN must be a whole number.")
+        return top_n
+
+    def _parse_interval(self, value):
+        """Parse the timeline `interval` field, seconds optionally suffixed with s, m, h or d, into seconds"""
+        if not value:
+            return None
+        match = re.fullmatch(r'(\d+)([smhd]?)', value.strip().lower())
+        if match is None:
+            raise ValueError("interval must be a number of seconds, optionally suffixed with s, m, h or d.")
+        seconds = int(match.group(1)) * self.INTERVAL_UNITS[match.group(2) or 's']
+        if not 1 <= seconds <= self.MAX_INTERVAL_SECONDS:
+            raise ValueError("interval must be between 1 second and 366 days.")
+        return seconds
+
+    def _parse_early_buyers(self, value):
+        """Parse the `earlyBuyers` field, the number of first buyers to rank"""
+        if not value:
+            return None
+        try:
+            count = int(value)
+        except ValueError:
+            count = 0
+        if not 1 <= count <= self.MAX_EARLY_BUYERS:
+            raise ValueError(f"earlyBuyers must be a whole number from 1 to {self.MAX_EARLY_BUYERS}.")
+        return count
+
+    def _query_param(self, name):
+        """Return a query string parameter of the request path"""
+        values = parse_qs(urlsplit(self.path).query).get(name)
+        return values[0] if values else None
+
+    def _process_prepared(self, parts, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n=None,
+                          columnar=False, interval=None, early_buyers=None, include_transactions=True):
+        """Evaluate prepared columns against the request parameters"""
+        # Large uploads are sharded across worker processes when ANALYSIS_WORKERS is set
+        return parallel.analysis_executor.process_prepared(
+            parts,
+            sol_usd_price,
+            token_address,
+            total_supply,
+            market_cap_threshold,
+            top_n,
+            columnar=columnar,
+            interval=interval,
+            early_buyers=early_buyers,
+            include_transactions=include_transactions
+        )
     
     def _send_success(self, data):
         """Send a successful response"""
+        self._send_body(json.dumps(data).encode())
+
+    def _send_body(self, body, etag=None, cache_status=None, file_hash=None, content_type=None):
+        """Send an already serialized response, JSON unless another content type is given"""
         self.send_response(200)
+        self.send_header('Content-Type', content_type or response_writer.JSON_CONTENT_TYPE)
+        if etag:
+            self.send_header('ETag', etag)
+        if cache_status:
+            self.send_header('X-Cache', cache_status)
+        if file_hash:
+            # Lets the client re-run the analysis later with only new parameters
+            self.send_header('X-File-Hash', file_hash)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_ndjson(self, batches, whale_report, file_hash=None):
+        """
+        Stream transactions as newline-delimited JSON, written batch by batch as
+        they are computed, followed by a final {"whale_report": [...]} line.
+        An error after the response has started is sent as a last error line.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', response_writer.NDJSON_CONTENT_TYPE)
+        if file_hash:
+            self.send_header('X-File-Hash', file_hash)
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # HTTP/1.0 clients read the body until the connection closes
+            self.close_connection = True
+        self.end_headers()
+
+        writer = response_writer.ChunkedWriter(self.wfile, chunked)
+        try:
+            for batch in batches:
+                for start in range(0, len(batch), self.STREAM_BATCH_ROWS):
+                    with metrics.metrics.stage('serialize') as stage:
+                        data = response_writer.encode_ndjson(batch[start:start + self.STREAM_BATCH_ROWS])
+                        stage.nbytes = len(data)
+                    writer.write(data)
+            writer.write(response_writer.encode_ndjson([{'whale_report': whale_report()}]))
+        except ValueError as e:
+            writer.write(response_writer.encode_ndjson([{'error': 'Invalid request', 'message': str(e)}]))
+        except Exception:
+            print(f"Internal server error: {traceback.format_exc()}")
+            writer.write(response_writer.encode_ndjson([{
+                'error': 'Internal server error',
+                'message': 'An unexpected error occurred. Please try again later.'
+            }]))
+        writer.close()
+
+    def _send_metrics(self):
+        """Send the Prometheus metrics of this process, including the cache counters"""
+        stats = {'result': result_cache.result_cache.stats(), 'intermediate': result_cache.intermediate_cache.stats()}
+        counters = [
+            (f'cache_{kind}_total', help_text, {'cache': name}, cache_stats[kind])
+            for kind, help_text in (('hits', 'Cache lookups that found an entry'),
+                                    ('misses', 'Cache lookups that found nothing'))
+            for name, cache_stats in stats.items()
+        ]
+        body = metrics.metrics.render(counters).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_overloaded(self):
+        """Tell the client every analysis slot is taken"""
+        body = json.dumps({
+            'error': 'Server busy',
+            'message': 'Too many analyses in progress. Please try again shortly.',
+            'retry_after': 5
+        }).encode()
+        self.send_response(503)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Retry-After', '5')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_modified(self, etag, file_hash=None):
+        """Tell the client its cached copy of the result is still valid"""
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        if file_hash:
+            self.send_header('X-File-Hash', file_hash)
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
     
     def _send_error(self, code, message):
         """Send an error response"""
+        body = json.dumps({
+            'error': 'Invalid request',
+            'message': message
+        }).encode()
         self.send_response(code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        # The request body may not have been fully read
+        self.close_connection = True
         self.end_headers()
-        self.wfile.write(json.dumps({
-            'error': 'Invalid request',
-            'message': message
-        }).encode())
+        self.wfile.write(body)
 
 # Apply middlewares
 handler = rate_limiter.rate_limit_middleware(handler)
 handler = cache_headers.cache_headers_middleware(handler)
 handler = cors.cors_middleware(handler)
+handler = metrics.metrics_middleware(handler)
 
 def main(req, context):
     return handler(req, context)
@@ -13,7 +13,8 @@ class CacheHeaders:
         if path.startswith('/api/'):
             # API responses should be cached for a short time
             handler.send_header('Cache-Control', f'public, max-age={CacheHeaders.API_RESPONSE}')
-            handler.send_header('Vary', 'Accept-Encoding')
+            # The response format is negotiated from the Accept header
+            handler.send_header('Vary', 'Accept, Accept-Encoding')
         elif any(path.endswith(ext) for ext in ['.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.ico']):
             # Static assets should be cached longer
             handler.send_header('Cache-Control', f'public, max-age={CacheHeaders.STATIC_ASSETS}')
@@ -13,8 +13,10 @@ class CORSHeaders:
         'Authorization',
         'X-Requested-With',
         'Accept',
-        'Origin'
+        'Origin',
+        'If-None-Match'
     ]
+    EXPOSED_HEADERS = ['ETag', 'X-Cache', 'X-File-Hash']
     MAX_AGE = 86400  # 24 hours
 
     @staticmethod
@@ -27,6 +29,7 @@ class CORSHeaders:
             handler.send_header('Access-Control-Allow-Origin', origin)
             handler.send_header('Access-Control-Allow-Methods', ', '.join(CORSHeaders.ALLOWED_METHODS))
             handler.send_header('Access-Control-Allow-Headers', ', '.join(CORSHeaders.ALLOWED_HEADERS))
+            handler.send_header('Access-Control-Expose-Headers', ', '.join(CORSHeaders.EXPOSED_HEADERS))
             handler.send_header('Access-Control-Max-Age', str(CORSHeaders.MAX_AGE))
             handler.send_header('Access-Control-Allow-Credentials', 'true')
 
@@ -36,17 +39,12 @@ def cors_middleware(handler_class):
         def do_OPTIONS(self):
             """Handle preflight requests"""
             self.send_response(200)
-            CORSHeaders.add_cors_headers(self)
+            self.send_header('Content-Length', '0')
             self.end_headers()
 
-        def do_GET(self):
-            """Add CORS headers to GET requests"""
-            CORSHeaders.add_cors_headers(self)
-            return handler_class.do_GET(self)
-
-        def do_POST(self):
-            """Add CORS headers to POST requests"""
+        def end_headers(self):
+            # Added here, after send_response has written the status line
             CORSHeaders.add_cors_headers(self)
-            return handler_class.do_POST(self)
+            return handler_class.end_headers(self)
 
-    return CORSHandler 
\ No newline at end of file
+    return CORSHandler
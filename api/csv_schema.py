@@ -0,0 +1,59 @@
+class CSVSchema:
+    """
+    Columns and date format of a transactions CSV, resolved from its header
+    and first rows. Standard library only, so the fast path can use it
+    without importing pandas.
+    """
+    REQUIRED_COLUMNS = ['Signature', 'Human Time']
+    TOKEN_FIELDS = ('token1_address', 'token1_amount', 'token2_address', 'token2_amount')
+    # Characters allowed in a signature (the base64 alphabet)
+    SIGNATURE_CHARSET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+
+    def __init__(self, signature='Signature', human_time='Human Time', token1_address=None, token1_amount=None,
+                 token2_address=None, token2_amount=None, wallet=None, date_format=None):
+        self.signature = signature
+        self.human_time = human_time
+        self.token1_address = token1_address
+        self.token1_amount = token1_amount
+        self.token2_address = token2_address
+        self.token2_amount = token2_amount
+        # Optional; without it every whale row is attributed to 'unknown'
+        self.wallet = wallet
+        # One of ALLOWED_DATE_FORMATS, 'ISO8601' or 'mixed'; None until rows have been seen
+        self.date_format = date_format
+
+    @staticmethod
+    def detect(columns):
+        """Resolve the token, amount and wallet columns from a header in one pass"""
+        schema = CSVSchema()
+        for col in columns:
+            col_lower = col.lower()
+            if 'token1' in col_lower and 'address' in col_lower:
+                schema.token1_address = col
+            elif 'token1' in col_lower and 'amount' in col_lower:
+                schema.token1_amount = col
+            elif 'token2' in col_lower and 'address' in col_lower:
+                schema.token2_address = col
+            elif 'token2' in col_lower and 'amount' in col_lower:
+                schema.token2_amount = col
+            elif 'wallet' in col_lower and schema.wallet is None:
+                schema.wallet = col
+        return schema
+
+    @staticmethod
+    def resolve(columns):
+        """Check the required columns are present and detect the rest"""
+        missing_columns = [col for col in CSVSchema.REQUIRED_COLUMNS if col not in columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+        return CSVSchema.detect(columns)
+
+    def token_columns(self):
+        """Column names used by the transaction engine, failing if a token column is missing"""
+        token_columns = {field: getattr(self, field) for field in CSVSchema.TOKEN_FIELDS}
+        missing_columns = [k for k, v in token_columns.items() if v is None]
+        if missing_columns:
+            raise ValueError(f"Missing required token columns: {', '.join(missing_columns)}")
+        if self.wallet is not None:
+            token_columns['wallet'] = self.wallet
+        return token_columns
@@ -1,50 +1,435 @@
 import pandas as pd
-from io import StringIO
 import base64
+import csv
+import os
+import metrics
+from csv_schema import CSVSchema
+
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+except ImportError:
+    pyarrow = None
+
+class _SizeLimitedReader:
+    """Binary file wrapper that fails once more than max_bytes have been read"""
+
+    def __init__(self, fileobj, max_bytes):
+        self.fileobj = fileobj
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise ValueError(f"File size exceeds maximum limit of {self.max_bytes/1024/1024}MB")
+        return data
+
+    def readline(self, size=-1):
+        data = self.fileobj.readline(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            raise ValueError(f"File size exceeds maximum limit of {self.max_bytes/1024/1024}MB")
+        return data
+
+    @property
+    def closed(self):
+        # Checked by pyarrow before it starts reading
+        return False
+
+    def __iter__(self):
+        # pandas only uses read(), but it checks for iteration support on file handles
+        return iter(self.fileobj)
+
+class _BufferReader:
+    """Read-only file interface over a bytes-like object, without copying it up front"""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.position = 0
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.position + size, len(self.view))
+        data = self.view[self.position:end].tobytes()
+        self.position = end
+        return data
+
+    def readline(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.position + size, len(self.view))
+        # Scan in small steps so a long buffer is not copied to find one line
+        stop = self.position
+        while stop < end:
+            step = min(stop + 4096, end)
+            newline = self.view[stop:step].tobytes().find(b'\n')
+            if newline >= 0:
+                end = stop + newline + 1
+                break
+            stop = step
+        return self.read(end - self.position)
+
+    @property
+    def closed(self):
+        return False
+
+    def __iter__(self):
+        # Only needed to satisfy pandas' file-like check; parsing goes through read()
+        return iter(self.read().splitlines(keepends=True))
+
+class ValidatedChunk:
+    """A validated DataFrame chunk together with its parsed 'Human Time' values"""
+
+    def __init__(self, frame, timestamps, schema):
+        self.frame = frame
+        # datetime64[ns] array (UTC for offset-aware input), or None if offsets were mixed
+        self.timestamps = timestamps
+        self.schema = schema
 
 class CSVValidator:
-    REQUIRED_COLUMNS = ['Signature', 'Human Time']
+    REQUIRED_COLUMNS = CSVSchema.REQUIRED_COLUMNS
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    MAX_STREAM_SIZE = 512 * 1024 * 1024  # 512MB, streamed uploads are never held in memory at once
+    CHUNK_ROWS = 50000
+    MAX_HEADER_SIZE = 64 * 1024
+    # pyarrow parses in parallel and is several times faster; 'c' forces the pandas parser
+    CSV_ENGINE = os.environ.get('CSV_ENGINE', 'pyarrow' if pyarrow is not None else 'c')
+    # Month-first comes before day-first, so dates whose day is 12 or less read month-first,
+    # as pandas' 'mixed' parsing reads them
     ALLOWED_DATE_FORMATS = [
         '%Y-%m-%d %H:%M:%S',
         '%Y-%m-%d %H:%M:%S.%f',
-        '%d/%m/%Y %H:%M:%S',
-        '%m/%d/%Y %H:%M:%S'
+        '%m/%d/%Y %H:%M:%S',
+        '%d/%m/%Y %H:%M:%S'
     ]
+    # Layouts that differ only in day and month order; a file is read with one of them throughout
+    DAY_MONTH_FORMATS = {
+        '%m/%d/%Y %H:%M:%S': 'MM/DD/YYYY hh:mm:ss',
+        '%d/%m/%Y %H:%M:%S': 'DD/MM/YYYY hh:mm:ss'
+    }
+    SLASH_DATE_PATTERN = r'\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2}'
+    DATE_SAMPLE_ROWS = 100
+    SIGNATURE_CHARSET = CSVSchema.SIGNATURE_CHARSET
 
     @staticmethod
-    def validate_csv_base64(csv_base64):
-        """Validate base64 encoded CSV data"""
+    def detect_schema(columns):
+        """Resolve the token, amount and wallet columns from a header in one pass"""
+        return CSVSchema.detect(columns)
+
+    @staticmethod
+    def _read_header(reader):
+        """Read and split the header line, leaving the reader at the first data row"""
+        line = reader.readline(CSVValidator.MAX_HEADER_SIZE)
+        if not line.strip():
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+        if not line.endswith(b'\n') and len(line) >= CSVValidator.MAX_HEADER_SIZE:
+            raise pd.errors.ParserError("Header line is too long")
         try:
-            # Check if base64 string is valid
-            csv_data = base64.b64decode(csv_base64).decode('utf-8')
-            
-            # Check file size
-            if len(csv_data.encode('utf-8')) > CSVValidator.MAX_FILE_SIZE:
-                raise ValueError(f"File size exceeds maximum limit of {CSVValidator.MAX_FILE_SIZE/1024/1024}MB")
-            
-            # Parse CSV
-            df = pd.read_csv(StringIO(csv_data))
-            
-            # Validate required columns
-            missing_columns = [col for col in CSVValidator.REQUIRED_COLUMNS if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
-            
-            # Validate date format
+            return next(csv.reader([line.decode('utf-8-sig').rstrip('\r\n')]))
+        except csv.Error:
+            raise pd.errors.ParserError("Invalid header line")
+
+    @staticmethod
+    def _column_types(schema):
+        """
+        Dtypes of the columns the analysis uses; every other column is skipped.
+        Addresses repeat a lot and load as categories. Amounts are left out:
+        they load as floats, or as text to be cleaned by the transaction
+        engine when a chunk holds currency symbols or thousands separators.
+        """
+        column_types = {schema.signature: 'str', schema.human_time: 'str'}
+        for column in (schema.token1_address, schema.token2_address, schema.wallet):
+            if column is not None:
+                column_types[column] = 'category'
+        return column_types
+
+    @staticmethod
+    def _amount_columns(schema):
+        return [column for column in (schema.token1_amount, schema.token2_amount) if column is not None]
+
+    @staticmethod
+    def _empty_frame(schema):
+        frame = pd.DataFrame({
+            column: pd.Series(dtype=dtype) for column, dtype in CSVValidator._column_types(schema).items()
+        })
+        for column in CSVValidator._amount_columns(schema):
+            frame[column] = pd.Series(dtype='float64')
+        return frame
+
+    @staticmethod
+    def _arrow_to_pandas(table, amount_columns):
+        """Convert a table to pandas, turning amount columns that are plain numbers into floats"""
+        for column in amount_columns:
+            index = table.schema.get_field_index(column)
             try:
-                pd.to_datetime(df['Human Time'], format='mixed')
+                # Same outcome as pandas' type inference: floats only if every value parses
+                table = table.set_column(index, column, table.column(index).cast(pyarrow.float64()))
+            except pyarrow.ArrowInvalid:
+                pass
+        return table.to_pandas()
+
+    @staticmethod
+    def _read_pyarrow(reader, header, schema, chunksize=None):
+        """Load the selected columns with pyarrow, as one frame or chunks of exactly `chunksize` rows"""
+        amount_columns = CSVValidator._amount_columns(schema)
+        arrow_types = {
+            column: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()) if dtype == 'category' else pyarrow.string()
+            for column, dtype in CSVValidator._column_types(schema).items()
+        }
+        # Amounts are read as text so a later block with '$' or ',' cannot fail the stream
+        arrow_types.update({column: pyarrow.string() for column in amount_columns})
+        read_options = pyarrow_csv.ReadOptions(column_names=header)
+        parse_options = pyarrow_csv.ParseOptions(newlines_in_values=True)
+        convert_options = pyarrow_csv.ConvertOptions(
+            column_types=arrow_types,
+            include_columns=list(arrow_types),
+            strings_can_be_null=True
+        )
+        try:
+            if chunksize is None:
+                table = pyarrow_csv.read_csv(reader, read_options, parse_options, convert_options)
+                yield CSVValidator._arrow_to_pandas(table, amount_columns)
+                return
+
+            # Arrow batches are sized in bytes, so they are re-cut into row chunks
+            batches = pyarrow_csv.open_csv(reader, read_options, parse_options, convert_options)
+            pending = batches.schema.empty_table()
+            for batch in batches:
+                pending = pyarrow.concat_tables([pending, pyarrow.Table.from_batches([batch])])
+                while pending.num_rows >= chunksize:
+                    yield CSVValidator._arrow_to_pandas(pending.slice(0, chunksize), amount_columns)
+                    pending = pending.slice(chunksize)
+            if pending.num_rows:
+                yield CSVValidator._arrow_to_pandas(pending, amount_columns)
+        except pyarrow.ArrowInvalid as e:
+            if str(e) == 'Empty CSV file':
+                # Only a header line; the caller supplies an empty frame
+                return
+            if 'UTF8' in str(e):
+                raise UnicodeDecodeError('utf-8', b'', 0, 0, str(e))
+            raise pd.errors.ParserError(str(e))
+
+    @staticmethod
+    def _read_frames(reader, chunksize=None):
+        """
+        Resolve the schema from the header line alone, then load only the
+        columns it names, with explicit dtypes. Returns the schema and an
+        iterator of DataFrames: the whole file, or chunks of `chunksize` rows.
+        """
+        header = CSVValidator._read_header(reader)
+        schema = CSVValidator._resolve_schema(header)
+        if CSVValidator.CSV_ENGINE == 'pyarrow' and pyarrow is not None:
+            frames = CSVValidator._read_pyarrow(reader, header, schema, chunksize)
+        else:
+            column_types = CSVValidator._column_types(schema)
+            usecols = list(column_types) + CSVValidator._amount_columns(schema)
+            frames = pd.read_csv(reader, header=None, names=header, usecols=usecols, dtype=column_types,
+                                 chunksize=chunksize, encoding='utf-8')
+            if chunksize is None:
+                frames = [frames]
+        return schema, frames
+
+    @staticmethod
+    def _resolve_schema(columns):
+        """Check the required columns are present and detect the rest"""
+        return CSVSchema.resolve(columns)
+
+    @staticmethod
+    def detect_date_format(values):
+        """
+        Find the first of ALLOWED_DATE_FORMATS (then ISO 8601) that parses a
+        sample of the column, falling back to per-element 'mixed' parsing.
+        Slash dates that neither day/month order reads are an error, since
+        'mixed' parsing would read some of them each way.
+        """
+        sample = values.dropna().iloc[:CSVValidator.DATE_SAMPLE_ROWS]
+        if not len(sample):
+            return None
+        for date_format in CSVValidator.ALLOWED_DATE_FORMATS + ['ISO8601']:
+            if CSVValidator._parses(sample, date_format):
+                return date_format
+        slash_dates = sample[sample.astype(str).str.fullmatch(CSVValidator.SLASH_DATE_PATTERN)]
+        if len(slash_dates) and not any(
+            CSVValidator._parses(slash_dates, date_format) for date_format in CSVValidator.DAY_MONTH_FORMATS
+        ):
+            raise ValueError(f"'Human Time' values must all use one of the "
+                             f"{' or '.join(CSVValidator.DAY_MONTH_FORMATS.values())} layouts, not both")
+        return 'mixed'
+
+    @staticmethod
+    def _parses(values, date_format):
+        try:
+            pd.to_datetime(values, format=date_format)
+            return True
+        except (ValueError, TypeError):
+            return False
+
+    @staticmethod
+    def parse_dates(values, date_format=None):
+        """
+        Parse a date column in one vectorized pass, returning datetime64[ns]
+        values or None. Values that do not fit `date_format` fall back to
+        per-element parsing, except for the day/month layouts: there a
+        fallback could read some dates the other way round, so it is an error.
+        """
+        parsed = None
+        if date_format and date_format != 'mixed':
+            try:
+                parsed = pd.to_datetime(values, format=date_format)
+            except (ValueError, TypeError):
+                if date_format in CSVValidator.DAY_MONTH_FORMATS:
+                    raise ValueError(f"Every 'Human Time' value must use the "
+                                     f"{CSVValidator.DAY_MONTH_FORMATS[date_format]} layout of the first rows")
+                # Rows further down the file use another format
+                parsed = None
+        if parsed is None:
+            try:
+                parsed = pd.to_datetime(values, format='mixed')
             except ValueError:
                 raise ValueError("Invalid date format in 'Human Time' column")
-            
-            # Validate data types
-            if not df['Signature'].str.match(r'^[A-Za-z0-9+/=]+$').all():
-                raise ValueError("Invalid signature format")
-            
+
+        if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+            parsed = parsed.dt.tz_convert('UTC').dt.tz_localize(None)
+        elif parsed.dtype == object:
+            # Mixed UTC offsets have no single datetime64 representation
+            return None
+        return parsed.to_numpy(dtype='datetime64[ns]')
+
+    @staticmethod
+    def check_signatures(values):
+        """Check that every signature is a non-empty string over SIGNATURE_CHARSET"""
+        if values.isna().any():
+            raise ValueError("Invalid signature format")
+        signatures = values.astype(str).tolist()
+        # Deleting the allowed bytes from all signatures at once must leave nothing behind
+        try:
+            joined = ''.join(signatures).encode('ascii')
+        except UnicodeEncodeError:
+            raise ValueError("Invalid signature format")
+        if joined.translate(None, CSVValidator.SIGNATURE_CHARSET) or not all(signatures):
+            raise ValueError("Invalid signature format")
+
+    @staticmethod
+    def _validate_frame(df, schema=None):
+        """
+        Validate the columns and values of a parsed DataFrame or chunk and
+        return its parsed timestamps. Without a schema (the first chunk) the
+        columns are checked and resolved; the date format is detected once.
+        """
+        if schema is None:
+            schema = CSVValidator._resolve_schema(df.columns)
+
+        # Validate date format; it is detected once and holds for the whole file
+        detected = schema.date_format is None
+        if detected:
+            schema.date_format = CSVValidator.detect_date_format(df[schema.human_time])
+        try:
+            timestamps = CSVValidator.parse_dates(df[schema.human_time], schema.date_format)
+        except ValueError:
+            if not detected or schema.date_format not in CSVValidator.DAY_MONTH_FORMATS:
+                raise
+            # The sample can miss the rows that tell day and month apart; nothing has been
+            # yielded yet, so the first chunk may still switch to the other order
+            schema.date_format = next(
+                date_format for date_format in CSVValidator.DAY_MONTH_FORMATS if date_format != schema.date_format
+            )
+            timestamps = CSVValidator.parse_dates(df[schema.human_time], schema.date_format)
+
+        # Validate data types
+        CSVValidator.check_signatures(df[schema.signature])
+        return timestamps
+
+    @staticmethod
+    def _open_source(source, max_size):
+        """Wrap a binary file object or bytes-like buffer in a size-checked reader"""
+        if hasattr(source, 'read'):
+            return _SizeLimitedReader(source, max_size)
+        reader = _BufferReader(source)
+        if len(reader.view) > max_size:
+            raise ValueError(f"File size exceeds maximum limit of {max_size/1024/1024}MB")
+        return reader
+
+    @staticmethod
+    def validate_csv_stream(source, max_size=None):
+        """
+        Validate CSV data read directly from a binary file object, or from a
+        bytes, bytearray or memoryview buffer, and return the DataFrame.
+        """
+        try:
+            reader = CSVValidator._open_source(source, max_size or CSVValidator.MAX_STREAM_SIZE)
+            with metrics.metrics.stage('read_csv') as stage:
+                schema, frames = CSVValidator._read_frames(reader)
+                df = next(iter(frames), None)
+                if df is None:
+                    df = CSVValidator._empty_frame(schema)
+                stage.rows = len(df)
+            with metrics.metrics.stage('validate') as stage:
+                CSVValidator._validate_frame(df, schema)
+                stage.rows = len(df)
             return df
-            
+
+        except UnicodeDecodeError:
+            raise ValueError("Invalid UTF-8 encoding")
+        except pd.errors.EmptyDataError:
+            raise ValueError("Empty CSV file")
+        except pd.errors.ParserError:
+            raise ValueError("Invalid CSV format")
+        except Exception as e:
+            raise ValueError(f"CSV validation error: {str(e)}")
+
+    @staticmethod
+    def validate_csv_base64(csv_base64):
+        """Validate base64 encoded CSV data"""
+        try:
+            # Check if base64 string is valid
+            with metrics.metrics.stage('base64') as stage:
+                csv_bytes = base64.b64decode(csv_base64)
+                stage.nbytes = len(csv_bytes)
         except base64.binascii.Error:
             raise ValueError("Invalid base64 encoding")
+
+        # The decoded bytes are parsed as-is; their length is the UTF-8 size
+        return CSVValidator.validate_csv_stream(csv_bytes, CSVValidator.MAX_FILE_SIZE)
+
+    @staticmethod
+    def iter_csv_chunks(fileobj, chunksize=None, max_size=None):
+        """
+        Parse and validate a binary CSV file object (or bytes-like buffer)
+        incrementally.
+
+        Yields DataFrames of at most `chunksize` rows, validating each one as it
+        is read, so only one chunk is held in memory at a time. At least one
+        (possibly empty) chunk is always yielded for a file with a header.
+        """
+        for chunk in CSVValidator.iter_validated_chunks(fileobj, chunksize, max_size):
+            yield chunk.frame
+
+    @staticmethod
+    def iter_validated_chunks(fileobj, chunksize=None, max_size=None):
+        """
+        Like iter_csv_chunks, but yield ValidatedChunk objects that keep the
+        parsed timestamps and the schema resolved from the first chunk.
+        """
+        chunksize = chunksize or CSVValidator.CHUNK_ROWS
+        try:
+            reader = CSVValidator._open_source(fileobj, max_size or CSVValidator.MAX_STREAM_SIZE)
+            schema, chunks = CSVValidator._read_frames(reader, chunksize)
+            chunks = iter(chunks)
+            empty = True
+            while True:
+                # Reading and validating alternate chunk by chunk, so each is timed per chunk
+                with metrics.metrics.stage('read_csv') as stage:
+                    chunk = next(chunks, None)
+                    stage.rows = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
+                empty = False
+                with metrics.metrics.stage('validate') as stage:
+                    timestamps = CSVValidator._validate_frame(chunk, schema)
+                    stage.rows = len(chunk)
+                yield ValidatedChunk(chunk, timestamps, schema)
+            if empty:
+                chunk = CSVValidator._empty_frame(schema)
+                yield ValidatedChunk(chunk, CSVValidator._validate_frame(chunk, schema), schema)
         except UnicodeDecodeError:
             raise ValueError("Invalid UTF-8 encoding")
         except pd.errors.EmptyDataError:
@@ -56,29 +441,5 @@ class CSVValidator:
 
     @staticmethod
     def validate_token_columns(df):
-        """Validate token-related columns"""
-        token_columns = {
-            'token1_address': None,
-            'token1_amount': None,
-            'token2_address': None,
-            'token2_amount': None
-        }
-        
-        # Look for token columns
-        for col in df.columns:
-            col_lower = col.lower()
-            if 'token1' in col_lower and 'address' in col_lower:
-                token_columns['token1_address'] = col
-            elif 'token1' in col_lower and 'amount' in col_lower:
-                token_columns['token1_amount'] = col
-            elif 'token2' in col_lower and 'address' in col_lower:
-                token_columns['token2_address'] = col
-            elif 'token2' in col_lower and 'amount' in col_lower:
-                token_columns['token2_amount'] = col
-        
-        # Check if all required token columns are present
-        missing_columns = [k for k, v in token_columns.items() if v is None]
-        if missing_columns:
-            raise ValueError(f"Missing required token columns: {', '.join(missing_columns)}")
-        
-        return token_columns 
\ No newline at end of file
+        """Validate token-related columns, including the optional wallet column"""
+        return CSVValidator.detect_schema(df.columns).token_columns()
\ No newline at end of file
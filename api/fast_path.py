@@ -0,0 +1,277 @@
+import csv
+import datetime
+import io
+import os
+import re
+import sys
+from csv_schema import CSVSchema
+
+# Uploads up to this many bytes are analyzed without pandas or numpy; 0 turns the fast path off
+MAX_BYTES = int(os.environ.get('FAST_PATH_MAX_BYTES', 512 * 1024))
+# No more than one CSVValidator chunk, so whale totals are summed in the same order as the engine
+MAX_ROWS = 50000
+# Response formats the fast path can produce
+FORMATS = ('json', 'columnar')
+
+# The same rules as TransactionEngine, restated here so this module never imports numpy
+SOL_ADDRESSES = ('sol', 'solana')
+UNKNOWN_WALLET = 'unknown'
+BUY = 1
+SELL = -1
+SIDE_NAMES = {BUY: 'buy', SELL: 'sell'}
+
+# Fields pandas would read as missing values
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+    'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+# Plain decimals of at most 15 digits parse to exactly the same float in Python, pandas and pyarrow
+AMOUNT_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+MAX_AMOUNT_DIGITS = 15
+# 'Human Time' layouts every CSV engine parses in one pass, with the positions of year, month and day
+DATE_LAYOUTS = (
+    (re.compile(r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})'), (0, 1, 2)),
+    (re.compile(r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})\.\d{1,6}'), (0, 1, 2)),
+    (re.compile(r'(\d{2})/(\d{2})/(\d{4}) (\d{2}):(\d{2}):(\d{2})'), (2, 0, 1)),
+    (re.compile(r'(\d{2})/(\d{2})/(\d{4}) (\d{2}):(\d{2}):(\d{2})'), (2, 1, 0)),
+    (re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.\d{1,6})?'), (0, 1, 2)),
+    (re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.\d{1,6})?Z'), (0, 1, 2))
+)
+# Years that fit in datetime64[ns]
+MIN_YEAR = 1678
+MAX_YEAR = 2261
+MAX_HEADER_SIZE = 64 * 1024
+
+
+class Unsupported(Exception):
+    """Raised for input the fast path does not handle; the caller falls back to the full engine"""
+
+
+def _date_matches(layout, value):
+    pattern, (year, month, day) = layout
+    match = pattern.fullmatch(value)
+    if match is None:
+        return False
+    fields = [int(group) for group in match.groups()]
+    if not MIN_YEAR <= fields[year] <= MAX_YEAR:
+        return False
+    try:
+        datetime.datetime(fields[year], fields[month], fields[day], fields[3], fields[4], fields[5])
+    except ValueError:
+        return False
+    return True
+
+
+def _amount(value):
+    if AMOUNT_PATTERN.fullmatch(value) is None or len(value) - ('.' in value) > MAX_AMOUNT_DIGITS:
+        raise Unsupported(f"Amount needs the full parser: {value!r}")
+    return float(value)
+
+
+def format_market_cap(market_cap):
+    """Format a USD market cap the way the reports show it, in millions from $1M up"""
+    return f"${market_cap / 1000000:.2f}M" if market_cap >= 1000000 else f"${market_cap:,.2f}"
+
+
+def format_whale_entry(wallet, total_sol, avg_market_cap, sol_usd_price, sol_sold, sol_spent):
+    """Format one whale report row for the response"""
+    total_usd = total_sol * sol_usd_price
+    return {
+        "Wallet": wallet,
+        "Total_SOL": f"{total_sol:.2f} SOL",
+        "Total_USD": f"${total_usd:,.2f}",
+        "Avg_Market_Cap_USD": format_market_cap(avg_market_cap),
+        "SOL_Sold": f"{sol_sold:.2f} SOL",
+        # SOL received from all sells minus SOL spent on all buys, at any market cap
+        "Net_SOL": f"{sol_sold - sol_spent:.2f} SOL"
+    }
+
+
+class SmallUpload:
+    """
+    Rows of a small upload, parsed with the csv module.
+
+    Addresses and wallets are lowercased like the engine's labels, and the
+    raw bytes are kept so the upload can still be handed to the full engine
+    for the modes the fast path does not cover.
+    """
+
+    def __init__(self, data, signatures, times, token1, token1_amount, token2, token2_amount, wallets):
+        self.data = data
+        self.signatures = signatures
+        self.times = times
+        self.token1 = token1
+        self.token1_amount = token1_amount
+        self.token2 = token2
+        self.token2_amount = token2_amount
+        self.wallets = wallets
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @property
+    def nbytes(self):
+        """Approximate memory footprint, used to budget the parsed-file cache"""
+        columns = (self.signatures, self.times, self.token1, self.token1_amount, self.token2, self.token2_amount,
+                   self.wallets)
+        return len(self.data) + sum(sys.getsizeof(values) + sum(map(sys.getsizeof, values)) for values in columns)
+
+    def process(self, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n=None,
+                columnar=False, include_transactions=True):
+        """Price every row and build the whale report, with the same output as TransactionEngine.process_prepared"""
+        target = token_address.lower()
+        prices = []
+        market_caps = []
+        sides = []
+        # wallet -> [SOL invested, market cap sum, buys], in order of first qualifying buy
+        buys = {}
+        sold = {}
+        spent = {}
+        for token1, amount1, token2, amount2, wallet in zip(
+            self.token1, self.token1_amount, self.token2, self.token2_amount, self.wallets
+        ):
+            side = 0
+            if token1 in SOL_ADDRESSES and token2 == target:
+                side = BUY
+            if token1 == target and token2 in SOL_ADDRESSES:
+                side = SELL
+            sol_amount, token_amount = (amount2, amount1) if side == SELL else (amount1, amount2)
+            sides.append(side)
+            if side == 0 or not token_amount > 0:
+                prices.append(None)
+                market_caps.append(None)
+                continue
+
+            price = (sol_amount / token_amount) * sol_usd_price
+            market_cap = price * total_supply
+            prices.append(price)
+            market_caps.append(market_cap)
+            if side == SELL:
+                sold[wallet] = sold.get(wallet, 0.0) + sol_amount
+                continue
+            spent[wallet] = spent.get(wallet, 0.0) + sol_amount
+            if market_cap < market_cap_threshold:
+                totals = buys.get(wallet)
+                if totals is None:
+                    totals = buys[wallet] = [0.0, 0.0, 0]
+                totals[0] += sol_amount
+                totals[1] += market_cap
+                totals[2] += 1
+
+        ranked = sorted(buys, key=lambda wallet: -buys[wallet][0])
+        if top_n is not None:
+            ranked = ranked[:max(top_n, 0)]
+        whale_report = [
+            format_whale_entry(wallet, buys[wallet][0], buys[wallet][1] / buys[wallet][2], sol_usd_price,
+                               sold.get(wallet, 0.0), spent[wallet])
+            for wallet in ranked
+        ]
+        if not include_transactions:
+            return {"whale_report": whale_report}
+        return {
+            "transactions": self._build(prices, market_caps, sides, columnar),
+            "whale_report": whale_report
+        }
+
+    def _build(self, prices, market_caps, sides, columnar):
+        if columnar:
+            return {
+                "Signature": list(self.signatures),
+                "Human Time": list(self.times),
+                "TOKEN2_USD_Price": [None if price is None else round(price, 4) for price in prices],
+                "Market_Cap_USD": [None if market_cap is None else round(market_cap, 2) for market_cap in market_caps],
+                "Side": [SIDE_NAMES.get(side) for side in sides]
+            }
+        return [
+            {
+                "Signature": signature,
+                "Human Time": human_time,
+                "TOKEN2_USD_Price": "N/A" if price is None else round(price, 4),
+                "Market_Cap_USD": "N/A" if market_cap is None else round(market_cap, 2),
+                "Side": SIDE_NAMES.get(side, "N/A")
+            }
+            for signature, human_time, price, market_cap, side in zip(
+                self.signatures, self.times, prices, market_caps, sides
+            )
+        ]
+
+
+def parse(data):
+    """
+    Parse and validate a small CSV upload with the csv module.
+
+    Only input the full engine is known to accept, and to read into the same
+    values, is handled here: anything else, including every kind of invalid
+    file, raises Unsupported so the caller can run the full engine and get
+    its exact result or error message.
+    """
+    if len(data) > MAX_BYTES or b'\x00' in data:
+        raise Unsupported("Too large, or holds NUL bytes")
+    header_end = data.find(b'\n') + 1
+    if not 0 < header_end <= MAX_HEADER_SIZE:
+        raise Unsupported("No header line")
+    try:
+        header = next(csv.reader([data[:header_end].decode('utf-8-sig').rstrip('\r\n')], strict=True))
+        body = data[header_end:].decode('utf-8')
+        schema = CSVSchema.resolve(header)
+        token_columns = schema.token_columns()
+    except (csv.Error, StopIteration, UnicodeDecodeError, ValueError) as e:
+        raise Unsupported(str(e))
+    if len(set(header)) != len(header):
+        raise Unsupported("Duplicate column names")
+
+    positions = {column: index for index, column in enumerate(header)}
+    signature_at = positions[schema.signature]
+    time_at = positions[schema.human_time]
+    token1_at = positions[token_columns['token1_address']]
+    amount1_at = positions[token_columns['token1_amount']]
+    token2_at = positions[token_columns['token2_address']]
+    amount2_at = positions[token_columns['token2_amount']]
+    wallet_at = positions.get(token_columns.get('wallet'))
+    used = [signature_at, time_at, token1_at, amount1_at, token2_at, amount2_at]
+    if wallet_at is not None:
+        used.append(wallet_at)
+
+    signatures = []
+    times = []
+    token1 = []
+    token1_amount = []
+    token2 = []
+    token2_amount = []
+    wallets = []
+    layout = None
+    try:
+        for row in csv.reader(io.StringIO(body, newline=''), strict=True):
+            if not row:
+                # Blank lines are skipped by every engine
+                continue
+            if len(row) != len(header) or any(row[index] in NA_VALUES for index in used):
+                raise Unsupported("Ragged row or missing value")
+            human_time = row[time_at]
+            if layout is None:
+                layout = next((candidate for candidate in DATE_LAYOUTS if _date_matches(candidate, human_time)), None)
+            if layout is None or not _date_matches(layout, human_time):
+                raise Unsupported("Date layout needs the full parser")
+            signatures.append(row[signature_at])
+            times.append(human_time)
+            token1.append(row[token1_at].lower())
+            token1_amount.append(_amount(row[amount1_at]))
+            token2.append(row[token2_at].lower())
+            token2_amount.append(_amount(row[amount2_at]))
+            wallets.append(UNKNOWN_WALLET if wallet_at is None else row[wallet_at].lower())
+            if len(signatures) > MAX_ROWS:
+                raise Unsupported("Too many rows")
+    except csv.Error as e:
+        raise Unsupported(str(e))
+
+    if not signatures:
+        raise Unsupported("No rows")
+    # Deleting the allowed bytes from all signatures at once must leave nothing behind
+    try:
+        joined = ''.join(signatures).encode('ascii')
+    except UnicodeEncodeError:
+        raise Unsupported("Invalid signature")
+    if joined.translate(None, CSVSchema.SIGNATURE_CHARSET):
+        raise Unsupported("Invalid signature")
+
+    return SmallUpload(data, signatures, times, token1, token1_amount, token2, token2_amount, wallets)
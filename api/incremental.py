@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import transaction_engine
+import whale_aggregator
+
+
+class IncrementalAnalysis:
+    """
+    Running analysis of one token's growing swap history.
+
+    Each export is expected to be a superset of the previous one. Rows
+    whose signature was already seen are skipped, so each update costs
+    O(new rows) in the engine and aggregator. Signatures are stored as a
+    sorted array of 64-bit hashes (8 bytes each) rather than as strings.
+    Every row is priced with the same SOL price, supply and threshold, so
+    a state is only reused while all three stay the same.
+    """
+
+    def __init__(self, total_supply, market_cap_threshold, sol_usd_price):
+        self.total_supply = total_supply
+        self.market_cap_threshold = market_cap_threshold
+        self.sol_usd_price = sol_usd_price
+        self.aggregator = whale_aggregator.WhaleAggregator()
+        self.signature_hashes = np.zeros(0, dtype=np.uint64)
+        self.total_rows = 0
+        self.last_signature = None
+        self.last_time = None
+        self.last_timestamp = None
+        self.lock = threading.Lock()
+
+    def matches(self, total_supply, market_cap_threshold, sol_usd_price):
+        """Whether the aggregates were built with the same supply, threshold and SOL price"""
+        return (self.total_supply == total_supply and self.market_cap_threshold == market_cap_threshold
+                and self.sol_usd_price == sol_usd_price)
+
+    def _seen(self, hashes):
+        """Vectorized membership test against the sorted signature index"""
+        if not len(self.signature_hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.searchsorted(self.signature_hashes, hashes)
+        positions[positions == len(self.signature_hashes)] = 0
+        return self.signature_hashes[positions] == hashes
+
+    def _track_latest(self, prepared):
+        """Remember the signature and time of the most recent new row"""
+        if prepared.timestamps is not None:
+            timestamps = pd.Series(prepared.timestamps)
+        else:
+            timestamps = pd.to_datetime(pd.Series(prepared.times, dtype=object), format='mixed', errors='coerce')
+        if not len(timestamps) or timestamps.isna().all():
+            return
+        # idxmax skips NaT, unlike argmax on the raw datetime64 values
+        latest = int(timestamps.idxmax())
+        if self.last_timestamp is None or timestamps.iloc[latest] >= self.last_timestamp:
+            self.last_timestamp = timestamps.iloc[latest]
+            self.last_signature = prepared.signatures[latest]
+            self.last_time = prepared.times[latest]
+
+    def update(self, parts, token_address, top_n=None):
+        """Fold the unseen rows of an export into the state and return the report"""
+        with self.lock:
+            # Decide what is new against the index as it was before this export,
+            # so several rows of one transaction are all kept together
+            new_parts = []
+            new_hashes = []
+            for prepared in parts:
+                hashes = pd.util.hash_array(np.asarray(prepared.signatures, dtype=object))
+                is_new = ~self._seen(hashes)
+                if is_new.any():
+                    new_parts.append(prepared.take(is_new))
+                    new_hashes.append(hashes[is_new])
+
+            result = transaction_engine.TransactionEngine.process_prepared(
+                new_parts,
+                self.sol_usd_price,
+                token_address,
+                self.total_supply,
+                self.market_cap_threshold,
+                top_n,
+                aggregator=self.aggregator
+            )
+
+            if new_hashes:
+                # One insertion into the sorted index instead of re-sorting it
+                added = np.unique(np.concatenate(new_hashes))
+                self.signature_hashes = np.insert(
+                    self.signature_hashes, np.searchsorted(self.signature_hashes, added), added
+                )
+            new_rows = sum(len(prepared) for prepared in new_parts)
+            self.total_rows += new_rows
+            for prepared in new_parts:
+                self._track_latest(prepared)
+
+            result["incremental"] = {
+                "new_rows": new_rows,
+                "total_rows": self.total_rows,
+                "last_signature": self.last_signature,
+                "last_time": self.last_time
+            }
+            return result
+
+
+class IncrementalStore:
+    """Bounded LRU of IncrementalAnalysis states keyed by token address"""
+
+    def __init__(self, max_tokens=256, ttl=3600, time_func=time.time):
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+        self.time_func = time_func
+        self.states = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token_address, total_supply, market_cap_threshold, sol_usd_price):
+        """Return the state for a token, starting over if it is idle or its parameters changed"""
+        key = token_address.strip().lower()
+        now = self.time_func()
+        with self.lock:
+            entry = self.states.pop(key, None)
+            if entry is not None:
+                state, last_used = entry
+                if now - last_used >= self.ttl or not state.matches(total_supply, market_cap_threshold, sol_usd_price):
+                    entry = None
+            if entry is None:
+                state = IncrementalAnalysis(total_supply, market_cap_threshold, sol_usd_price)
+            self.states[key] = (state, now)
+            while len(self.states) > self.max_tokens:
+                self.states.popitem(last=False)
+            return state
+
+    def reset(self, token_address):
+        """Forget everything known about a token"""
+        with self.lock:
+            self.states.pop(token_address.strip().lower(), None)
+
+
+# Create a global incremental state store
+incremental_store = IncrementalStore(
+    max_tokens=int(os.environ.get('INCREMENTAL_MAX_TOKENS', 256)),
+    ttl=int(os.environ.get('INCREMENTAL_TTL', 3600))
+)
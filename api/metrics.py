@@ -0,0 +1,197 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Stage:
+    """Timing of one stage run; set `rows` and `nbytes` inside the block to count throughput"""
+    __slots__ = ('name', 'rows', 'nbytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.nbytes = 0
+
+
+class _NullStage:
+    """Stand-in used when metrics are disabled; attribute writes are discarded"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class RequestTimings:
+    """Stage durations of a single request, summed per stage, for the Server-Timing header"""
+
+    def __init__(self):
+        self.durations = {}
+        self.status = None
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.durations.items())
+
+
+class Metrics:
+    """
+    Per-stage latency histograms plus row and byte counters, rendered in the
+    Prometheus text format.
+
+    Stages nest freely and may run more than once per request (once per CSV
+    chunk, for instance); every run is one histogram observation, and the
+    current request's total per stage is kept for its Server-Timing header.
+    When disabled, `stage()` returns a shared no-op object and nothing is
+    recorded.
+    """
+    PREFIX = 'token_analyzer'
+    # Histogram bucket upper bounds, in seconds
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, enabled=True, time_func=time.perf_counter):
+        self.enabled = enabled
+        self.time_func = time_func
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # stage -> [bucket counts..., +Inf count], total seconds, rows, bytes
+        self.bucket_counts = {}
+        self.seconds = {}
+        self.rows = {}
+        self.nbytes = {}
+        self.responses = {}
+
+    def observe(self, name, seconds, rows=0, nbytes=0):
+        """Record one run of a stage"""
+        with self.lock:
+            counts = self.bucket_counts.get(name)
+            if counts is None:
+                counts = self.bucket_counts[name] = [0] * (len(self.BUCKETS) + 1)
+                self.seconds[name] = 0.0
+                self.rows[name] = 0
+                self.nbytes[name] = 0
+            counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.seconds[name] += seconds
+            self.rows[name] += rows
+            self.nbytes[name] += nbytes
+
+        timings = getattr(self.local, 'timings', None)
+        if timings is not None:
+            timings.add(name, seconds)
+
+    def stage(self, name):
+        """Context manager timing a block as stage `name`"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        stage = Stage(name)
+        start = self.time_func()
+        try:
+            yield stage
+        finally:
+            self.observe(name, self.time_func() - start, stage.rows, stage.nbytes)
+
+    @contextmanager
+    def request(self):
+        """Collect the stage timings of the request handled by this thread"""
+        if not self.enabled:
+            yield None
+            return
+        timings = self.local.timings = RequestTimings()
+        try:
+            with self.stage('request'):
+                yield timings
+        finally:
+            self.local.timings = None
+            if timings.status is not None:
+                with self.lock:
+                    self.responses[timings.status] = self.responses.get(timings.status, 0) + 1
+
+    def current(self):
+        """Timings of the request handled by this thread, or None"""
+        return getattr(self.local, 'timings', None) if self.enabled else None
+
+    def render(self, extra_counters=()):
+        """
+        Render every metric in the Prometheus text exposition format.
+        `extra_counters` is an iterable of (name, help, labels, value), with
+        the samples of one counter next to each other.
+        """
+        prefix = self.PREFIX
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent in each processing stage',
+            f'# TYPE {prefix}_stage_seconds histogram'
+        ]
+        with self.lock:
+            stages = sorted(self.bucket_counts)
+            for name in stages:
+                cumulative = 0
+                for bound, count in zip(self.BUCKETS + ('+Inf',), self.bucket_counts[name]):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {self.seconds[name]:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {cumulative}')
+
+            for metric, help_text, values in (
+                ('stage_rows_total', 'CSV rows handled by each stage', self.rows),
+                ('stage_bytes_total', 'Bytes read or written by each stage', self.nbytes)
+            ):
+                lines.append(f'# HELP {prefix}_{metric} {help_text}')
+                lines.append(f'# TYPE {prefix}_{metric} counter')
+                lines.extend(f'{prefix}_{metric}{{stage="{name}"}} {values[name]}' for name in stages if values[name])
+
+            lines.append(f'# HELP {prefix}_responses_total Analysis responses by status code')
+            lines.append(f'# TYPE {prefix}_responses_total counter')
+            lines.extend(f'{prefix}_responses_total{{code="{code}"}} {count}'
+                         for code, count in sorted(self.responses.items()))
+
+        described = set()
+        for name, help_text, labels, value in extra_counters:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} counter')
+            label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f'{prefix}_{name}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_middleware(handler_class):
+    """Middleware timing each POST and reporting its stages in a Server-Timing header"""
+    class MetricsHandler(handler_class):
+        def do_POST(self):
+            with metrics.request():
+                return handler_class.do_POST(self)
+
+        def send_response(self, code, message=None):
+            timings = metrics.current()
+            if timings is not None:
+                timings.status = code
+            return handler_class.send_response(self, code, message)
+
+        def end_headers(self):
+            timings = metrics.current()
+            if timings is not None and timings.durations:
+                self.send_header('Server-Timing', timings.server_timing())
+            return handler_class.end_headers(self)
+
+    return MetricsHandler
+
+
+# Create a global metrics registry; METRICS_ENABLED=0 turns all recording off
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
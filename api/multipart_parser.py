@@ -0,0 +1,216 @@
+import hashlib
+import os
+import tempfile
+from email.message import Message
+
+
+def parse_header_options(value, header='content-type'):
+    """Split a header like 'multipart/form-data; boundary=xyz' into value and params"""
+    message = Message()
+    message[header] = value or ''
+    params = dict(message.get_params(header=header, failobj=[])[1:])
+    main_value = message.get(header, '').split(';', 1)[0].strip().lower()
+    return main_value, params
+
+
+class UploadedFile:
+    """A file part of a multipart body, spooled to disk once it gets large"""
+
+    def __init__(self, name, filename, content_type, spool_threshold):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_threshold, mode='w+b')
+        self.size = 0
+        # Hashed while streaming so the content can be addressed without a second read
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.file.write(data)
+        self.hash.update(data)
+        self.size += len(data)
+
+    @property
+    def sha256(self):
+        return self.hash.hexdigest()
+
+    def finish(self):
+        self.file.seek(0)
+
+    def close(self):
+        self.file.close()
+
+
+class _FieldValue:
+    """An in-memory text part of a multipart body"""
+
+    def __init__(self, name, max_size):
+        self.name = name
+        self.max_size = max_size
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+        if len(self.data) > self.max_size:
+            raise ValueError(f"Form field '{self.name}' exceeds {self.max_size} bytes")
+
+    def finish(self):
+        pass
+
+
+class MultipartForm:
+    """Parsed fields and files of a multipart/form-data request"""
+
+    def __init__(self):
+        self.fields = {}
+        self.files = {}
+
+    def getvalue(self, name, default=None):
+        """Return a text field, mirroring cgi.FieldStorage.getvalue"""
+        return self.fields.get(name, default)
+
+    def close(self):
+        for uploaded in self.files.values():
+            uploaded.close()
+
+
+class MultipartParser:
+    """
+    Incremental multipart/form-data parser.
+
+    The body is read from `fp` in fixed-size chunks and boundaries are
+    located in a small rolling buffer, so memory use does not depend on the
+    size of the request. File parts go to a SpooledTemporaryFile that moves
+    to disk above `spool_threshold` bytes.
+    """
+    CHUNK_SIZE = 64 * 1024
+    SPOOL_THRESHOLD = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 1024 * 1024))  # 1MB
+    MAX_HEADER_SIZE = 16 * 1024
+    MAX_FIELD_SIZE = 64 * 1024
+
+    def __init__(self, fp, boundary, content_length, chunk_size=None, spool_threshold=None):
+        if not boundary:
+            raise ValueError("Missing multipart boundary")
+        if isinstance(boundary, str):
+            boundary = boundary.encode('latin-1')
+        self.fp = fp
+        self.delimiter = b'\r\n--' + boundary
+        self.remaining = content_length
+        self.chunk_size = chunk_size or MultipartParser.CHUNK_SIZE
+        self.spool_threshold = spool_threshold or MultipartParser.SPOOL_THRESHOLD
+
+    def _read_chunk(self):
+        """Read the next chunk of the body without going past Content-Length"""
+        if self.remaining <= 0:
+            return b''
+        data = self.fp.read(min(self.chunk_size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def _fill_to(self, buffer, size):
+        """Read until the buffer holds at least `size` bytes"""
+        while len(buffer) < size:
+            chunk = self._read_chunk()
+            if not chunk:
+                raise ValueError("Multipart body ended before the closing boundary")
+            buffer += chunk
+
+    def _fill_until(self, buffer, marker, limit):
+        """Read until `marker` is in the buffer and return its index"""
+        while True:
+            index = buffer.find(marker)
+            if index >= 0:
+                return index
+            if len(buffer) > limit:
+                raise ValueError("Multipart headers are too large")
+            chunk = self._read_chunk()
+            if not chunk:
+                raise ValueError("Multipart body ended before the closing boundary")
+            buffer += chunk
+
+    def _skip_preamble(self, buffer):
+        """Discard everything up to and including the first boundary"""
+        keep = len(self.delimiter) - 1
+        while True:
+            index = buffer.find(self.delimiter)
+            if index >= 0:
+                del buffer[:index + len(self.delimiter)]
+                return
+            if len(buffer) > keep:
+                del buffer[:-keep]
+            chunk = self._read_chunk()
+            if not chunk:
+                raise ValueError("Multipart body does not contain the boundary")
+            buffer += chunk
+
+    def _stream_body(self, buffer, sink):
+        """Copy part data into `sink` until the next boundary"""
+        keep = len(self.delimiter) - 1
+        while True:
+            index = buffer.find(self.delimiter)
+            if index >= 0:
+                sink.write(buffer[:index])
+                del buffer[:index + len(self.delimiter)]
+                return
+            # Hold back a possible partial delimiter at the end of the buffer
+            if len(buffer) > keep:
+                sink.write(buffer[:-keep])
+                del buffer[:-keep]
+            chunk = self._read_chunk()
+            if not chunk:
+                raise ValueError("Multipart body ended before the closing boundary")
+            buffer += chunk
+
+    def _open_part(self, header_block):
+        """Create the sink for a part from its raw header block"""
+        headers = Message()
+        for line in header_block.decode('utf-8', 'replace').split('\r\n'):
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip()] = value.strip()
+
+        disposition, params = parse_header_options(headers.get('Content-Disposition'), 'content-disposition')
+        name = params.get('name')
+        if disposition != 'form-data' or not name:
+            raise ValueError("Multipart part is missing a form-data name")
+        if 'filename' in params:
+            content_type = headers.get('Content-Type', 'application/octet-stream')
+            return UploadedFile(name, params['filename'], content_type, self.spool_threshold)
+        return _FieldValue(name, MultipartParser.MAX_FIELD_SIZE)
+
+    def parse(self):
+        """Read the whole body and return a MultipartForm"""
+        form = MultipartForm()
+        # The leading CRLF lets the first boundary match the same delimiter as the others
+        buffer = bytearray(b'\r\n')
+        try:
+            self._skip_preamble(buffer)
+            while True:
+                # After a boundary comes either '--' (end of body) or the end of the line
+                self._fill_to(buffer, 2)
+                if buffer[:2] == b'--':
+                    break
+                eol = self._fill_until(buffer, b'\r\n', MultipartParser.MAX_HEADER_SIZE)
+                del buffer[:eol + 2]
+
+                self._fill_to(buffer, 2)
+                if buffer[:2] == b'\r\n':
+                    raise ValueError("Multipart part is missing a form-data name")
+                end = self._fill_until(buffer, b'\r\n\r\n', MultipartParser.MAX_HEADER_SIZE)
+                part = self._open_part(bytes(buffer[:end]))
+                del buffer[:end + 4]
+                if isinstance(part, UploadedFile):
+                    form.files[part.name] = part
+
+                self._stream_body(buffer, part)
+                part.finish()
+                if isinstance(part, _FieldValue):
+                    form.fields[part.name] = part.data.decode('utf-8', 'replace')
+        except Exception:
+            form.close()
+            raise
+
+        # Drain the epilogue so the connection is left at the end of the request
+        while self._read_chunk():
+            pass
+        return form
@@ -0,0 +1,173 @@
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when every analysis slot is busy and the wait queue is full"""
+
+
+def _evaluate_shard(parts, sol_usd_price, token_address, total_supply, market_cap_threshold, columnar,
+                    include_transactions=True, with_series=False):
+    """
+    Worker entry point: evaluate one shard, returning its transactions, partial
+    whale aggregates and, with `with_series`, its priced rows for the time series
+    """
+    import time_series
+    import transaction_engine
+    import whale_aggregator
+
+    aggregator = whale_aggregator.WhaleAggregator()
+    series = time_series.TimeSeries() if with_series else None
+    result = transaction_engine.TransactionEngine.process_prepared(
+        parts, sol_usd_price, token_address, total_supply, market_cap_threshold,
+        top_n=0, aggregator=aggregator, columnar=columnar, include_transactions=include_transactions, series=series
+    )
+    return result.get("transactions"), aggregator, series
+
+
+def shard_parts(parts, shard_count):
+    """Split a sequence of PreparedTransactions into `shard_count` contiguous row ranges of similar size"""
+    total_rows = sum(len(part) for part in parts)
+    shard_rows = max(1, math.ceil(total_rows / max(1, shard_count)))
+    shards = []
+    current = []
+    current_rows = 0
+    for part in parts:
+        start = 0
+        while start < len(part):
+            stop = min(len(part), start + shard_rows - current_rows)
+            current.append(part if start == 0 and stop == len(part) else part.slice(start, stop))
+            current_rows += stop - start
+            start = stop
+            if current_rows == shard_rows:
+                shards.append(current)
+                current = []
+                current_rows = 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+class AnalysisExecutor:
+    """
+    Optional process-pool backend for the evaluation stage.
+
+    With `workers` > 0, uploads of at least `min_rows` rows are split into
+    row ranges that are priced in separate processes. Whale aggregates are
+    sums and counts, so the partial aggregators merge into the same result
+    a single pass would give. Independently, `max_concurrent` caps how many
+    analyses run at once, with at most `max_queued` more waiting for a slot.
+    """
+
+    def __init__(self, workers=0, min_rows=200000, max_concurrent=0, max_queued=16, start_method='spawn'):
+        self.workers = workers
+        self.min_rows = min_rows
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.start_method = start_method
+        self.pool = None
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.slots = threading.Semaphore(max_concurrent) if max_concurrent > 0 else None
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the `max_concurrent` analysis slots, waiting in a bounded queue"""
+        if self.slots is None:
+            yield
+            return
+        with self.lock:
+            if self.active >= self.max_concurrent and self.waiting >= self.max_queued:
+                raise Overloaded("Too many analyses in progress")
+            self.waiting += 1
+        self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+            self.slots.release()
+
+    def _get_pool(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self.pool
+
+    def process_prepared(self, parts, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n=None,
+                         columnar=False, interval=None, early_buyers=None, include_transactions=True):
+        """Same result as TransactionEngine.process_prepared, sharded across processes when worthwhile"""
+        # Imported on first use so a cold start does not pay for pandas and numpy up front
+        import time_series
+        import transaction_engine
+        import whale_aggregator
+
+        engine = transaction_engine.TransactionEngine
+        parts = list(parts)
+        if self.workers <= 0 or sum(len(part) for part in parts) < self.min_rows:
+            return engine.process_prepared(
+                parts, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n, columnar=columnar,
+                interval=interval, early_buyers=early_buyers, include_transactions=include_transactions
+            )
+
+        with_series = interval is not None or early_buyers is not None
+        pool = self._get_pool()
+        futures = [
+            pool.submit(_evaluate_shard, shard, sol_usd_price, token_address, total_supply,
+                        market_cap_threshold, columnar, include_transactions, with_series)
+            for shard in shard_parts(parts, self.workers)
+        ]
+
+        # Merge in row order so transactions and first-seen wallet order match a single pass
+        if not include_transactions:
+            transactions = None
+        elif columnar:
+            transactions = {field: [] for field in engine.TRANSACTION_FIELDS}
+        else:
+            transactions = []
+        aggregator = whale_aggregator.WhaleAggregator()
+        series = time_series.TimeSeries() if with_series else None
+        for future in futures:
+            shard_transactions, shard_aggregator, shard_series = future.result()
+            if transactions is not None and columnar:
+                for field, values in shard_transactions.items():
+                    transactions[field].extend(values)
+            elif transactions is not None:
+                transactions.extend(shard_transactions)
+            aggregator.merge(shard_aggregator)
+            if series is not None:
+                series.merge(shard_series)
+
+        result = {"whale_report": aggregator.report(sol_usd_price, top_n)}
+        if transactions is not None:
+            result = {"transactions": transactions, **result}
+        engine.add_time_series(result, series, interval, early_buyers)
+        return result
+
+    def shutdown(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+# Create a global executor; sharding and the concurrency cap are both off by default
+analysis_executor = AnalysisExecutor(
+    workers=int(os.environ.get('ANALYSIS_WORKERS', 0)),
+    min_rows=int(os.environ.get('ANALYSIS_SHARD_MIN_ROWS', 200000)),
+    max_concurrent=int(os.environ.get('ANALYSIS_MAX_CONCURRENT', 0)),
+    max_queued=int(os.environ.get('ANALYSIS_MAX_QUEUED', 16)),
+    start_method=os.environ.get('ANALYSIS_START_METHOD', 'spawn')
+)
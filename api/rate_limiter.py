@@ -1,53 +1,100 @@
 from http.server import BaseHTTPRequestHandler
+import math
+import os
 import time
-from collections import defaultdict
-import threading
 import json
+import shared_state
+
 
 class RateLimiter:
-    def __init__(self, requests_per_minute=60):
+    """
+    Token bucket rate limiter.
+
+    Each key owns a fixed-size bucket of `requests_per_minute` tokens that
+    refills continuously, so checking a request is O(1) regardless of how
+    many requests the key made. Buckets live in a shared_state backend:
+    process-local by default, or shared by every instance when the backend
+    is SQLite or Redis.
+    """
+
+    def __init__(self, requests_per_minute=60, backend=None, time_func=time.time):
         self.requests_per_minute = requests_per_minute
-        self.requests = defaultdict(list)
-        self.lock = threading.Lock()
-
-    def is_rate_limited(self, ip):
-        with self.lock:
-            now = time.time()
-            # Remove requests older than 1 minute
-            self.requests[ip] = [req_time for req_time in self.requests[ip] 
-                               if now - req_time < 60]
-            
-            # Check if rate limit is exceeded
-            if len(self.requests[ip]) >= self.requests_per_minute:
-                return True
-            
-            # Add current request
-            self.requests[ip].append(now)
-            return False
+        self.capacity = float(requests_per_minute)
+        self.refill_rate = requests_per_minute / 60.0
+        self.backend = backend if backend is not None else shared_state.MemoryBackend(time_func=time_func)
+        self.time_func = time_func
+
+    def __len__(self):
+        return len(self.backend)
+
+    def acquire(self, key, cost=1):
+        """
+        Take `cost` tokens from the key's bucket. Returns 0 when the request is
+        allowed, otherwise the seconds until enough tokens are available.
+        A cost above the bucket size is capped, so it drains a full bucket.
+        """
+        cost = min(float(cost), self.capacity)
+        try:
+            return self.backend.take_tokens(key, cost, self.capacity, self.refill_rate, self.time_func())
+        except shared_state.BackendError as e:
+            # An unreachable shared store must not take the API down with it
+            print(f"Rate limiter backend error, allowing request: {e}")
+            return 0
+
+    def is_rate_limited(self, ip, cost=1):
+        return self.acquire(ip, cost) > 0
+
+    @staticmethod
+    def request_cost(content_length, cost_bytes):
+        """
+        Weight of a request: one token, plus one per started `cost_bytes` of
+        upload. `content_length` is the raw header value; a missing or invalid
+        one costs one token and is left for the handler to reject.
+        """
+        try:
+            content_length = int(content_length or 0)
+        except ValueError:
+            return 1
+        if cost_bytes <= 0 or content_length <= 0:
+            return 1
+        return 1 + content_length // cost_bytes
+
 
 # Create a global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(
+    requests_per_minute=int(os.environ.get('RATE_LIMIT_PER_MINUTE', 60)),
+    backend=shared_state.shared_backend
+)
+# Bytes of upload that count as one extra request; 0 charges every request the same
+RATE_LIMIT_COST_BYTES = int(os.environ.get('RATE_LIMIT_COST_BYTES', 0))
 
 def rate_limit_middleware(handler_class):
     class RateLimitedHandler(handler_class):
         def do_POST(self):
             # Get client IP
             ip = self.client_address[0]
-            
-            # Check rate limit
-            if rate_limiter.is_rate_limited(ip):
+
+            # Check rate limit, weighting large uploads when configured
+            cost = rate_limiter.request_cost(self.headers.get('content-length'), RATE_LIMIT_COST_BYTES)
+            wait = rate_limiter.acquire(ip, cost)
+            if wait > 0:
+                retry_after = math.ceil(wait) if math.isfinite(wait) else 60
+                body = json.dumps({
+                    'error': 'Rate limit exceeded',
+                    'message': 'Too many requests. Please try again later.',
+                    'retry_after': retry_after
+                }).encode()
                 self.send_response(429)
                 self.send_header('Content-Type', 'application/json')
-                self.send_header('Retry-After', '60')
+                self.send_header('Retry-After', str(retry_after))
+                self.send_header('Content-Length', str(len(body)))
+                # The request body is left unread
+                self.close_connection = True
                 self.end_headers()
-                self.wfile.write(json.dumps({
-                    'error': 'Rate limit exceeded',
-                    'message': 'Too many requests. Please try again later.',
-                    'retry_after': 60
-                }).encode())
+                self.wfile.write(body)
                 return
-            
+
             # If not rate limited, proceed with original handler
             return handler_class.do_POST(self)
-    
-    return RateLimitedHandler 
\ No newline at end of file
+
+    return RateLimitedHandler
@@ -0,0 +1,99 @@
+import json
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+COLUMNAR_CONTENT_TYPE = 'application/vnd.token-analyzer.columnar+json'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Response formats by name (as used in ?format= and the form field) and media type
+FORMATS = {
+    'json': JSON_CONTENT_TYPE,
+    'ndjson': NDJSON_CONTENT_TYPE,
+    'columnar': COLUMNAR_CONTENT_TYPE
+}
+# Arrow IPC is only offered when pyarrow is installed
+if pyarrow is not None:
+    FORMATS['arrow'] = ARROW_CONTENT_TYPE
+
+# Formats whose transactions are built as one list per field
+COLUMNAR_FORMATS = ('columnar', 'arrow')
+
+
+def negotiate_format(accept=None, requested=None):
+    """Pick a response format from an explicit format= value or the Accept header"""
+    if requested:
+        requested = requested.strip().lower()
+        if requested in FORMATS:
+            return requested
+        raise ValueError(f"Unsupported format '{requested}'. Use one of: {', '.join(FORMATS)}")
+    for media_range in (accept or '').split(','):
+        media_type = media_range.split(';', 1)[0].strip().lower()
+        for name, content_type in FORMATS.items():
+            if media_type == content_type:
+                return name
+    return 'json'
+
+
+def encode_arrow(result):
+    """
+    Serialize a columnar result as an Arrow IPC stream. Transactions become the
+    record batch; the whale report is kept as JSON in the schema metadata.
+    """
+    transactions = result['transactions']
+    table = pyarrow.table(
+        {
+            'Signature': pyarrow.array(transactions['Signature'], pyarrow.string()),
+            'Human Time': pyarrow.array(transactions['Human Time'], pyarrow.string()),
+            'TOKEN2_USD_Price': pyarrow.array(transactions['TOKEN2_USD_Price'], pyarrow.float64()),
+            'Market_Cap_USD': pyarrow.array(transactions['Market_Cap_USD'], pyarrow.float64()),
+            'Side': pyarrow.array(transactions['Side'], pyarrow.string())
+        },
+        metadata={'whale_report': json.dumps(result['whale_report'])}
+    )
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_result(result, response_format='json'):
+    """Serialize an analysis result for a non-streaming response format"""
+    if response_format == 'arrow':
+        return encode_arrow(result)
+    return json.dumps(result).encode()
+
+
+def encode_ndjson(records):
+    """Serialize records as newline-delimited JSON"""
+    return ''.join(json.dumps(record) + '\n' for record in records).encode()
+
+
+class ChunkedWriter:
+    """Write a response body incrementally, using chunked transfer encoding when enabled"""
+
+    def __init__(self, wfile, chunked=True):
+        self.wfile = wfile
+        self.chunked = chunked
+
+    def write(self, data):
+        if not data:
+            # An empty chunk would terminate the body
+            return
+        if self.chunked:
+            self.wfile.write(f'{len(data):X}\r\n'.encode('ascii'))
+            self.wfile.write(data)
+            self.wfile.write(b'\r\n')
+        else:
+            self.wfile.write(data)
+        if hasattr(self.wfile, 'flush'):
+            self.wfile.flush()
+
+    def close(self):
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
@@ -0,0 +1,233 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import fast_path
+import shared_state
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of serialized analysis results.
+
+    Keys are content addresses: a hash of the uploaded file plus the
+    normalized request parameters, so identical requests map to the same
+    entry and the key doubles as the response ETag. The in-memory part is
+    bounded by the total size of the cached payloads, as measured by
+    `sizeof`; bytes entries can also be persisted as files under
+    `directory` to survive process restarts, and written through to a
+    `shared` shared_state backend so other instances can serve them.
+    Write-through happens on a background thread, so a slow disk or round
+    trip never delays the response being cached; payloads too large for
+    memory are not written through either.
+    """
+    # Bump when the response format changes so stale entries and ETags are never reused
+    VERSION = 2
+    # Writes waiting for the background thread; more are dropped rather than queued
+    MAX_PENDING_WRITES = 32
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300, directory=None, time_func=time.time, sizeof=len,
+                 shared=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.directory = directory
+        self.shared = shared
+        self.time_func = time_func
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        self.writer = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if directory or shared is not None:
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='result-cache')
+
+    @staticmethod
+    def make_key(file_digest, *params):
+        """
+        Build a cache key from a file hash and the request parameters. Strings
+        are stripped and lower-cased; other values, such as lists, are keyed
+        by their repr as they are.
+        """
+        normalized = [f'v{ResultCache.VERSION}', file_digest]
+        for value in params:
+            if isinstance(value, float):
+                value = repr(value)
+            elif isinstance(value, str):
+                value = value.strip().lower()
+            normalized.append(str(value))
+        return hashlib.sha256('\x1f'.join(normalized).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _evict(self):
+        """Drop least recently used entries until the memory budget is met"""
+        while self.size > self.max_bytes and self.entries:
+            _, (_, _, nbytes) = self.entries.popitem(last=False)
+            self.size -= nbytes
+
+    def _store(self, key, body, stored_at):
+        """Keep `body` in memory; returns False when it is larger than the whole budget"""
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[2]
+        nbytes = self.sizeof(body)
+        if nbytes > self.max_bytes:
+            return False
+        self.entries[key] = (body, stored_at, nbytes)
+        self.size += nbytes
+        self._evict()
+        return True
+
+    def _load_from_disk(self, key, now):
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if now - stored_at >= self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        self._store(key, body, stored_at)
+        return body
+
+    def _load_from_shared(self, key):
+        try:
+            return self.shared.get(self._shared_key(key))
+        except shared_state.BackendError as e:
+            print(f"Shared cache error: {e}")
+            return None
+
+    def _shared_key(self, key):
+        return f'result:{key}'
+
+    def get(self, key):
+        """Return the cached payload for `key`, or None"""
+        with self.lock:
+            now = self.time_func()
+            entry = self.entries.get(key)
+            body = None
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self.entries.move_to_end(key)
+                    body = entry[0]
+                else:
+                    self.size -= self.entries.pop(key)[2]
+            if body is None and self.directory:
+                body = self._load_from_disk(key, now)
+            if body is not None or self.shared is None:
+                self._count(body)
+                return body
+
+        # The shared store is asked outside the lock so a slow round trip only delays this request
+        body = self._load_from_shared(key)
+        with self.lock:
+            if body is not None:
+                self._store(key, body, now)
+            self._count(body)
+        return body
+
+    def _count(self, body):
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def put(self, key, body):
+        """Cache a serialized payload under `key`"""
+        with self.lock:
+            if not self._store(key, body, self.time_func()) or self.writer is None:
+                return
+            if self.pending_writes >= self.MAX_PENDING_WRITES:
+                return
+            self.pending_writes += 1
+        self.writer.submit(self._write_through, key, body)
+
+    def flush(self):
+        """Wait until every write-through queued so far has finished"""
+        if self.writer is not None:
+            self.writer.submit(lambda: None).result()
+
+    def _write_through(self, key, body):
+        try:
+            self._write(key, body)
+        finally:
+            with self.lock:
+                self.pending_writes -= 1
+
+    def _write(self, key, body):
+        if self.directory:
+            # Write to a temporary name first so readers never see a partial file
+            path = self._path(key)
+            temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(temp_path, 'wb') as f:
+                    f.write(body)
+                os.replace(temp_path, path)
+            except OSError:
+                pass
+
+        if self.shared is not None:
+            try:
+                self.shared.put(self._shared_key(key), body, self.ttl)
+            except shared_state.BackendError as e:
+                print(f"Shared cache error: {e}")
+
+    def stats(self):
+        """Hit/miss counters and current memory usage"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'bytes': self.size
+            }
+
+
+# Create a global result cache instance
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024)),
+    ttl=int(os.environ.get('RESULT_CACHE_TTL', 300)),
+    directory=os.environ.get('RESULT_CACHE_DIR'),
+    # Only worth a round trip when the backend is shared with other instances
+    shared=None if isinstance(shared_state.shared_backend, shared_state.MemoryBackend) else shared_state.shared_backend
+)
+
+def parsed_size(entry):
+    """Size of a parsed upload: one fast_path.SmallUpload, or a list of PreparedTransactions"""
+    if isinstance(entry, fast_path.SmallUpload):
+        return entry.nbytes
+    return sum(part.nbytes for part in entry)
+
+
+# Parsed, parameter-independent columns per file hash
+intermediate_cache = ResultCache(
+    max_bytes=int(os.environ.get('INTERMEDIATE_CACHE_BYTES', 256 * 1024 * 1024)),
+    ttl=int(os.environ.get('INTERMEDIATE_CACHE_TTL', 1800)),
+    sizeof=parsed_size
+)
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Check an If-None-Match header value against an ETag. The `*` wildcard
+    is not honored: a POST result is only unmodified for a client that
+    already holds that exact result.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
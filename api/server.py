@@ -0,0 +1,199 @@
+"""
+Standalone HTTP server for self-hosting the analyzer.
+
+    python server.py --host 0.0.0.0 --port 8000
+
+Serves the same middleware-wrapped handler as the serverless function.
+Connections are kept alive and served by a bounded pool of threads, so a
+slow upload only ties up its own connection thread, and only until its
+body deadline. Connections that find every thread busy wait in a bounded
+queue; beyond it they are answered 503 straight away. Parsing and pricing
+take one of ANALYSIS_MAX_CONCURRENT slots, which defaults to the number of
+CPUs here; set ANALYSIS_WORKERS to also price large uploads in worker
+processes.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+# Connection threads; each one serves a single keep-alive connection at a time
+DEFAULT_THREADS = int(os.environ.get('SERVER_THREADS', 64))
+# Seconds an idle keep-alive connection, or a stalled upload, may hold its thread
+DEFAULT_KEEP_ALIVE = float(os.environ.get('SERVER_KEEP_ALIVE', 15))
+# Seconds a request body may take to arrive in full, however steadily it trickles in
+DEFAULT_BODY_TIMEOUT = float(os.environ.get('SERVER_BODY_TIMEOUT', 120))
+# Connections that may wait for a free thread; further ones are answered 503
+DEFAULT_MAX_PENDING = int(os.environ.get('SERVER_MAX_PENDING', 64))
+
+BUSY_BODY = json.dumps({
+    'error': 'Server busy',
+    'message': 'Too many connections. Please try again shortly.',
+    'retry_after': 5
+}).encode()
+BUSY_RESPONSE = (
+    b'HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\nRetry-After: 5\r\n'
+    b'Connection: close\r\nContent-Length: %d\r\n\r\n' % len(BUSY_BODY)
+) + BUSY_BODY
+
+
+class BodyReader:
+    """
+    The connection's input stream while a request body is read. Each read
+    waits at most until `deadline`, so a client cannot hold its thread by
+    sending a byte now and then; past it, reads raise TimeoutError.
+    """
+
+    def __init__(self, rfile, connection, deadline, idle_timeout):
+        self.rfile = rfile
+        self.connection = connection
+        self.deadline = deadline
+        self.idle_timeout = idle_timeout
+
+    def _receive(self, read, size):
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Request body was not received in time")
+        self.connection.settimeout(min(remaining, self.idle_timeout))
+        try:
+            return read(size)
+        finally:
+            # Writing the response keeps the usual timeout
+            self.connection.settimeout(self.idle_timeout)
+
+    def read(self, size=-1):
+        # read1 returns after at most one receive, so the deadline is checked between receives
+        chunks = []
+        received = 0
+        while size < 0 or received < size:
+            chunk = self._receive(self.rfile.read1, size - received if size >= 0 else 64 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+        return b''.join(chunks)
+
+    def readline(self, size=-1):
+        return self._receive(self.rfile.readline, size)
+
+    def close(self):
+        self.rfile.close()
+
+
+def connection_handler(handler_class, keep_alive, body_timeout):
+    """Subclass a handler with the connection's idle timeout and a deadline for each request body"""
+    class ConnectionHandler(handler_class):
+        # Sets the socket timeout of every connection in StreamRequestHandler.setup
+        timeout = keep_alive
+
+        def setup(self):
+            super().setup()
+            self.connection_rfile = self.rfile
+
+        def handle_one_request(self):
+            # Waiting for the next request on a kept-alive connection only has the idle timeout
+            self.rfile = self.connection_rfile
+            self.connection.settimeout(self.timeout)
+            super().handle_one_request()
+
+        def parse_request(self):
+            if not super().parse_request():
+                return False
+            self.rfile = BodyReader(self.connection_rfile, self.connection, time.monotonic() + body_timeout,
+                                    self.timeout)
+            return True
+
+    ConnectionHandler.__name__ = handler_class.__name__
+    return ConnectionHandler
+
+
+class AnalyzerServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with a fixed pool of connection threads in place of
+    one new thread per connection. Up to `max_pending` connections beyond
+    the pool wait in its queue until a thread is free; any more are
+    answered 503 and closed without being queued.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, threads=DEFAULT_THREADS, keep_alive=DEFAULT_KEEP_ALIVE,
+                 body_timeout=DEFAULT_BODY_TIMEOUT, max_pending=DEFAULT_MAX_PENDING):
+        super().__init__(server_address, connection_handler(handler_class, keep_alive, body_timeout))
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='analyzer')
+        # Connections being served or waiting for a thread
+        self.slots = threading.BoundedSemaphore(threads + max_pending)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.refuse(request)
+            return
+        self.pool.submit(self.serve_connection, request, client_address)
+
+    def serve_connection(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+    def refuse(self, request):
+        """Answer a connection that found the queue full, without reading from it"""
+        try:
+            request.settimeout(1)
+            request.sendall(BUSY_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(host='127.0.0.1', port=8000, threads=DEFAULT_THREADS, keep_alive=DEFAULT_KEEP_ALIVE,
+                body_timeout=DEFAULT_BODY_TIMEOUT, max_pending=DEFAULT_MAX_PENDING):
+    """Build a server for the analyze handler; call serve_forever() to start it"""
+    import analyze
+    return AnalyzerServer((host, port), analyze.handler, threads, keep_alive, body_timeout, max_pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)), help='0 picks a free port')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='connection threads')
+    parser.add_argument('--keep-alive', type=float, default=DEFAULT_KEEP_ALIVE,
+                        help='seconds before an idle connection is closed')
+    parser.add_argument('--body-timeout', type=float, default=DEFAULT_BODY_TIMEOUT,
+                        help='seconds a request body may take to arrive')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='connections that may wait for a thread before new ones get 503')
+    args = parser.parse_args()
+
+    # Analyses beyond the core count only slow each other down. The setting is read
+    # from the environment when parallel is first imported, so it is set before that.
+    os.environ.setdefault('ANALYSIS_MAX_CONCURRENT', str(os.cpu_count() or 1))
+    import parallel
+    server = make_server(args.host, args.port, args.threads, args.keep_alive, args.body_timeout, args.max_pending)
+
+    # SIGTERM stops the server like Ctrl+C does
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port} with {args.threads} threads", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        parallel.analysis_executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
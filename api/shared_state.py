@@ -0,0 +1,369 @@
+import math
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+
+class BackendError(Exception):
+    """Raised when a shared state backend cannot be reached or answers with an error"""
+
+
+class _Stripe:
+    """One shard of the bucket table, with its own lock and sweep schedule"""
+
+    def __init__(self, now):
+        self.lock = threading.Lock()
+        # key -> [tokens, last refill time]
+        self.buckets = {}
+        self.last_sweep = now
+
+
+class MemoryBackend:
+    """
+    Process-local state: token buckets in striped, independently locked
+    tables, and a plain expiring key/value map.
+
+    A bucket left idle long enough to refill completely is
+    indistinguishable from a missing one, so such buckets are swept out
+    every `sweep_interval` seconds and memory only holds recently active keys.
+    """
+
+    def __init__(self, stripes=16, sweep_interval=60, time_func=time.time):
+        self.sweep_interval = sweep_interval
+        self.time_func = time_func
+        now = time_func()
+        self.stripes = [_Stripe(now) for _ in range(max(1, stripes))]
+        self.values = {}
+        self.values_lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(stripe.buckets) for stripe in self.stripes)
+
+    def _sweep(self, stripe, now, idle_ttl):
+        """Drop buckets that have been idle long enough to be full again"""
+        idle = [key for key, (_, updated) in stripe.buckets.items() if now - updated >= idle_ttl]
+        for key in idle:
+            del stripe.buckets[key]
+        stripe.last_sweep = now
+
+    def take_tokens(self, key, cost, capacity, refill_rate, now):
+        """Take `cost` tokens from a bucket; returns 0, or the seconds until they are available"""
+        stripe = self.stripes[hash(key) % len(self.stripes)]
+        with stripe.lock:
+            if now - stripe.last_sweep >= self.sweep_interval:
+                self._sweep(stripe, now, capacity / refill_rate if refill_rate > 0 else math.inf)
+
+            bucket = stripe.buckets.get(key)
+            if bucket is None:
+                bucket = stripe.buckets[key] = [capacity, now]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+                bucket[1] = now
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            if refill_rate <= 0:
+                return math.inf
+            return (cost - bucket[0]) / refill_rate
+
+    def get(self, key):
+        with self.values_lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return None
+            if self.time_func() >= entry[1]:
+                del self.values[key]
+                return None
+            return entry[0]
+
+    def put(self, key, value, ttl):
+        with self.values_lock:
+            self.values[key] = (value, self.time_func() + ttl)
+
+
+class SQLiteBackend:
+    """
+    State shared by every process on one host through a SQLite file.
+
+    Each token bucket update is a single IMMEDIATE transaction, so
+    concurrent processes serialize on the database lock rather than
+    overwriting each other. Idle buckets and expired values are deleted
+    every `sweep_interval` seconds.
+    """
+
+    def __init__(self, path, timeout=5.0, sweep_interval=60, time_func=time.time):
+        self.path = path
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.time_func = time_func
+        self.local = threading.local()
+        self.last_sweep = time_func()
+        connection = self._connection()
+        try:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS shared_values (key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+        except sqlite3.Error as e:
+            raise BackendError(str(e))
+
+    def _connection(self):
+        """One connection per thread; sqlite3 connections must not be shared across threads"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            try:
+                connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+                connection.execute('PRAGMA journal_mode=WAL')
+                connection.execute('PRAGMA synchronous=NORMAL')
+            except sqlite3.Error as e:
+                raise BackendError(str(e))
+            self.local.connection = connection
+        return connection
+
+    def _sweep(self, connection, now, idle_ttl):
+        connection.execute('DELETE FROM rate_buckets WHERE updated <= ?', (now - idle_ttl,))
+        connection.execute('DELETE FROM shared_values WHERE expires <= ?', (self.time_func(),))
+        self.last_sweep = now
+
+    def take_tokens(self, key, cost, capacity, refill_rate, now):
+        """Take `cost` tokens from a bucket; returns 0, or the seconds until they are available"""
+        connection = self._connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if now - self.last_sweep >= self.sweep_interval and refill_rate > 0:
+                    self._sweep(connection, now, capacity / refill_rate)
+                row = connection.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * refill_rate)
+                if tokens >= cost:
+                    tokens -= cost
+                    wait = 0
+                elif refill_rate <= 0:
+                    wait = math.inf
+                else:
+                    wait = (cost - tokens) / refill_rate
+                connection.execute('INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)', (key, tokens, now))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            raise BackendError(str(e))
+        return wait
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM shared_values WHERE key = ? AND expires > ?', (key, self.time_func())
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise BackendError(str(e))
+        return None if row is None else bytes(row[0])
+
+    def put(self, key, value, ttl):
+        try:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO shared_values VALUES (?, ?, ?)',
+                (key, sqlite3.Binary(value), self.time_func() + ttl)
+            )
+        except sqlite3.Error as e:
+            raise BackendError(str(e))
+
+
+class RedisConnection:
+    """A single connection speaking the Redis protocol (RESP2)"""
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    @staticmethod
+    def encode(command):
+        parts = [f'*{len(command)}\r\n'.encode()]
+        for argument in command:
+            if not isinstance(argument, bytes):
+                argument = str(argument).encode()
+            parts.append(f'${len(argument)}\r\n'.encode() + argument + b'\r\n')
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise BackendError("Connection closed by the server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            # Error replies are returned, not raised, so the rest of a pipeline is still read
+            return BackendError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise BackendError("Connection closed by the server")
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise BackendError(f"Unexpected reply from the server: {line!r}")
+
+    def execute(self, commands):
+        """Send every command in one write, then read one reply per command"""
+        self.sock.sendall(b''.join(map(self.encode, commands)))
+        return [self.read_reply() for _ in commands]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """
+    State shared across hosts through a Redis-protocol server.
+
+    Connections come from a pool of at most `max_connections`. Every
+    operation is sent as one pipeline, so a rate limit check costs a single
+    round trip. Rate limits use a fixed window of capacity / refill_rate
+    seconds: SET NX starts the window with its expiry, INCRBY counts the
+    request and PTTL tells a rejected client how long to wait. The three
+    run in one MULTI/EXEC transaction, so the window cannot expire between
+    SET NX and INCRBY and leave a counter without an expiry.
+    """
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, max_connections=8, timeout=1.0,
+                 prefix='token-analyzer:'):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.prefix = prefix
+        # Empty slots are None and are filled with a connection on first use
+        self.pool = queue.LifoQueue(max_connections)
+        for _ in range(max_connections):
+            self.pool.put(None)
+
+    def _connect(self):
+        connection = RedisConnection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for reply in connection.execute(setup) if setup else ():
+            if isinstance(reply, BackendError):
+                connection.close()
+                raise reply
+        return connection
+
+    def pipeline(self, *commands):
+        """Run commands in one round trip on a pooled connection and return their replies"""
+        try:
+            connection = self.pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise BackendError("No Redis connection available")
+        try:
+            if connection is None:
+                connection = self._connect()
+            replies = connection.execute(commands)
+        except (OSError, ValueError, BackendError) as e:
+            # A failed connection may hold half a reply; it is dropped, not reused
+            if connection is not None:
+                connection.close()
+            self.pool.put(None)
+            raise e if isinstance(e, BackendError) else BackendError(str(e))
+        self.pool.put(connection)
+        for reply in replies:
+            if isinstance(reply, BackendError):
+                raise reply
+        return replies
+
+    def close(self):
+        """Close every idle pooled connection"""
+        connections = []
+        while True:
+            try:
+                connections.append(self.pool.get_nowait())
+            except queue.Empty:
+                break
+        for connection in connections:
+            if connection is not None:
+                connection.close()
+            self.pool.put(None)
+
+    def take_tokens(self, key, cost, capacity, refill_rate, now):
+        """Count `cost` against the key's window; returns 0, or the seconds until the window resets"""
+        key = f'{self.prefix}rate:{key}'
+        window_ms = int(capacity / refill_rate * 1000) if refill_rate > 0 else 60000
+        cost = math.ceil(cost)
+        *_, replies = self.pipeline(
+            ('MULTI',),
+            ('SET', key, 0, 'PX', window_ms, 'NX'),
+            ('INCRBY', key, cost),
+            ('PTTL', key),
+            ('EXEC',)
+        )
+        for reply in replies:
+            if isinstance(reply, BackendError):
+                raise reply
+        _, count, ttl_ms = replies
+        repair = []
+        if ttl_ms < 0:
+            # A counter without an expiry, e.g. from a server that does not keep
+            # transaction time fixed, would reject this client for good
+            repair.append(('PEXPIRE', key, window_ms))
+            ttl_ms = window_ms
+        if count <= capacity:
+            if repair:
+                self.pipeline(*repair)
+            return 0
+        # A rejected request does not use up any of the allowance
+        self.pipeline(('DECRBY', key, cost), *repair)
+        return max(ttl_ms, 1) / 1000
+
+    def get(self, key):
+        return self.pipeline(('GET', f'{self.prefix}value:{key}'))[0]
+
+    def put(self, key, value, ttl):
+        self.pipeline(('SET', f'{self.prefix}value:{key}', value, 'PX', max(1, int(ttl * 1000))))
+
+
+def backend_from_url(url):
+    """
+    Build a backend from a SHARED_STATE_URL: unset or memory:// for
+    process-local state, sqlite:///path/to/state.db, or
+    redis://[:password@]host[:port][/db].
+    """
+    if not url or url.startswith('memory:'):
+        return MemoryBackend()
+    parts = urlsplit(url)
+    if parts.scheme == 'sqlite':
+        return SQLiteBackend(unquote(parts.path))
+    if parts.scheme == 'redis':
+        return RedisBackend(
+            host=parts.hostname or 'localhost',
+            port=parts.port or 6379,
+            db=int(parts.path.strip('/') or 0),
+            password=unquote(parts.password) if parts.password else None,
+            max_connections=int(os.environ.get('SHARED_STATE_MAX_CONNECTIONS', 8))
+        )
+    raise ValueError(f"Unsupported SHARED_STATE_URL scheme: {parts.scheme}")
+
+
+# Shared by the rate limiter and the result cache; process-local unless SHARED_STATE_URL is set
+shared_backend = backend_from_url(os.environ.get('SHARED_STATE_URL'))
@@ -1,9 +1,77 @@
 import unittest
 import json
+import itertools
 import base64
 import pandas as pd
 from io import StringIO
+from io import BytesIO
+from email.message import Message
 from analyze import handler
+import fast_path
+import metrics
+import response_writer
+import parallel
+
+
+def build_multipart(fields, csv_bytes, boundary='----tokenanalyzerboundary'):
+    """Encode form fields and a CSV file the way the frontend's FormData does"""
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    if csv_bytes is not None:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="swaps.csv"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode() + csv_bytes + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+_client_ids = itertools.count()
+
+
+def run_handler(body, content_type, extra_headers=None, method='POST', path='/api/analyze'):
+    """Drive the wrapped handler over in-memory streams and split the raw response"""
+    h = handler.__new__(handler)
+    h.rfile = BytesIO(body)
+    h.wfile = BytesIO()
+    # Every call comes from its own address so the suite never trips the shared rate limit
+    client_id = next(_client_ids)
+    h.client_address = (f'10.0.{client_id // 250}.{client_id % 250 + 1}', 50000)
+    h.request_version = 'HTTP/1.1'
+    h.requestline = f'{method} {path} HTTP/1.1'
+    h.command = method
+    h.path = path
+    h.headers = Message()
+    h.headers['Content-Type'] = content_type
+    h.headers['Content-Length'] = str(len(body))
+    for name, value in (extra_headers or {}).items():
+        h.headers[name] = value
+    h.log_message = lambda *args: None
+    getattr(h, f'do_{method}')()
+    head, _, payload = h.wfile.getvalue().partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    if headers.get('Transfer-Encoding') == 'chunked':
+        payload = decode_chunked(payload)
+    return status, headers, payload
+
+
+def decode_chunked(payload):
+    """Reassemble a chunked transfer-encoded body, checking it is terminated"""
+    body = b''
+    while True:
+        size_line, _, payload = payload.partition(b'\r\n')
+        size = int(size_line, 16)
+        if size == 0:
+            assert payload == b'\r\n', 'chunked body is not terminated'
+            return body
+        body += payload[:size]
+        assert payload[size:size + 2] == b'\r\n'
+        payload = payload[size + 2:]
 
 class TestAnalyzeAPI(unittest.TestCase):
     def setUp(self):
@@ -93,5 +161,360 @@ class TestAnalyzeAPI(unittest.TestCase):
         self.assertEqual(response['error'], 'Invalid request')
         self.assertIn('Invalid base64 encoding', response['message'])
 
+class TestMultipartUpload(unittest.TestCase):
+    def setUp(self):
+        self.fields = {
+            'solPrice': '100',
+            'tokenAddress': 'token123',
+            'totalSupply': '1000000',
+            'marketCap': '10000000'
+        }
+        self.csv_bytes = (
+            b"Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount\n"
+            b"sig1,2024-03-20 10:00:00,sol,1.0,token123,100\n"
+            b"sig2,2024-03-20 10:01:00,sol,2.0,token123,200\n"
+            b"sig3,2024-03-20 10:02:00,token123,100,sol,1.0\n"
+        )
+
+    def test_upload_is_processed(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 200)
+        response = json.loads(payload)
+        self.assertEqual(len(response['transactions']), 3)
+        self.assertEqual(response['transactions'][0]['TOKEN2_USD_Price'], 1.0)
+        self.assertEqual(response['whale_report'][0]['Total_SOL'], '3.00 SOL')
+
+    def test_stage_timings_and_metrics_endpoint(self):
+        # A price no other test uses, so the result is not served from the cache
+        self.fields['solPrice'] = '87.5'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        # The pandas stages only run when the fast path is off
+        original, fast_path.MAX_BYTES = fast_path.MAX_BYTES, 0
+        try:
+            status, headers, payload = run_handler(body, content_type)
+        finally:
+            fast_path.MAX_BYTES = original
+        stages = [entry.split(';')[0] for entry in headers['Server-Timing'].split(', ')]
+        for stage in ('multipart', 'read_csv', 'validate', 'prepare', 'evaluate', 'process', 'serialize'):
+            self.assertIn(stage, stages)
+
+        status, headers, payload = run_handler(b'', 'text/plain', method='GET', path='/api/metrics')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['Content-Type'].startswith('text/plain'))
+        self.assertIn('token_analyzer_stage_rows_total{stage="read_csv"}', payload.decode())
+        self.assertIn('token_analyzer_cache_misses_total{cache="result"}', payload.decode())
+
+    def test_uploads_work_with_metrics_disabled(self):
+        original_metrics = metrics.metrics
+        metrics.metrics = metrics.Metrics(enabled=False)
+        try:
+            for max_bytes, sol_price in ((fast_path.MAX_BYTES, '58.5'), (0, '59.5')):
+                self.fields['solPrice'] = sol_price
+                body, content_type = build_multipart(self.fields, self.csv_bytes)
+                original, fast_path.MAX_BYTES = fast_path.MAX_BYTES, max_bytes
+                try:
+                    status, headers, payload = run_handler(body, content_type)
+                finally:
+                    fast_path.MAX_BYTES = original
+                self.assertEqual(status, 200)
+                self.assertNotIn('Server-Timing', headers)
+                self.assertEqual(len(json.loads(payload)['transactions']), 3)
+
+            status, headers, payload = run_handler(b'', 'text/plain', method='GET', path='/api/metrics')
+            self.assertEqual(status, 404)
+        finally:
+            metrics.metrics = original_metrics
+
+    def test_small_upload_takes_fast_path(self):
+        self.fields['solPrice'] = '64.5'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, fast = run_handler(body, content_type)
+        self.assertEqual(status, 200)
+        self.assertIn('fast_parse;dur=', headers['Server-Timing'])
+        self.assertNotIn('read_csv', headers['Server-Timing'])
+
+        # The cached small upload is parsed by the full engine for a streamed recompute
+        self.fields['fileHash'] = headers['X-File-Hash']
+        body, content_type = build_multipart(self.fields, None)
+        status, headers, payload = run_handler(body, content_type, {'Accept': 'application/x-ndjson'})
+        lines = [json.loads(line) for line in payload.decode().splitlines()]
+        self.assertEqual(lines[-1], {'whale_report': json.loads(fast)['whale_report']})
+
+        # A new cache key, so the full engine really runs
+        del self.fields['fileHash']
+        self.fields['topN'] = '5'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        original, fast_path.MAX_BYTES = fast_path.MAX_BYTES, 0
+        try:
+            status, headers, full = run_handler(body, content_type)
+        finally:
+            fast_path.MAX_BYTES = original
+        self.assertIn('read_csv', headers['Server-Timing'])
+        self.assertEqual(json.loads(full), json.loads(fast))
+
+    def test_sells_are_priced_and_netted(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        response = json.loads(payload)
+        self.assertEqual([t['Side'] for t in response['transactions']], ['buy', 'buy', 'sell'])
+        self.assertEqual(response['transactions'][2]['TOKEN2_USD_Price'], 1.0)
+        self.assertEqual(response['whale_report'][0]['SOL_Sold'], '1.00 SOL')
+        self.assertEqual(response['whale_report'][0]['Net_SOL'], '-2.00 SOL')
+
+    def test_whales_are_grouped_by_wallet_column(self):
+        csv_bytes = (
+            b"Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount,Wallet\n"
+            b"sig1,2025-05-17T22:39:40.000Z,sol,1.0,token123,100,WalletA\n"
+            b"sig2,2025-05-17T22:40:12.000Z,sol,2.0,token123,200,walletb\n"
+            b"sig3,2025-05-17T22:45:30.000Z,sol,0.5,token123,50,walleta\n"
+        )
+        body, content_type = build_multipart(self.fields, csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 200)
+        report = json.loads(payload)['whale_report']
+        self.assertEqual([(entry['Wallet'], entry['Total_SOL']) for entry in report],
+                         [('walletb', '2.00 SOL'), ('walleta', '1.50 SOL')])
+
+    def test_multi_token_upload(self):
+        csv_bytes = self.csv_bytes + b"sig4,2024-03-20 10:03:00,sol,3.0,other,30\n"
+        tokens = [
+            {'tokenAddress': 'token123', 'totalSupply': 1000000, 'marketCap': 10000000},
+            {'tokenAddress': 'OTHER', 'totalSupply': '500', 'marketCap': '100'}
+        ]
+        body, content_type = build_multipart({'solPrice': '100', 'tokens': json.dumps(tokens)}, csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 200)
+        results = json.loads(payload)['tokens']
+        self.assertEqual([result['tokenAddress'] for result in results], ['token123', 'OTHER'])
+        self.assertEqual([t['Signature'] for t in results[0]['transactions']], ['sig1', 'sig2', 'sig3'])
+        self.assertEqual(results[0]['whale_report'][0]['Total_SOL'], '3.00 SOL')
+        self.assertEqual(results[1]['transactions'][0]['TOKEN2_USD_Price'], 10.0)
+        # Market cap 5000 is above the threshold, so OTHER has no whales
+        self.assertEqual(results[1]['whale_report'], [])
+
+    def test_timeline_and_early_buyers(self):
+        self.fields.update(interval='1m', earlyBuyers='1', summary='true')
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 200)
+        self.assertIn('time_series;dur=', headers['Server-Timing'])
+        response = json.loads(payload)
+        self.assertNotIn('transactions', response)
+        self.assertEqual([(bucket['Time'], bucket['Buys'], bucket['Sells']) for bucket in response['timeline']],
+                         [('2024-03-20T10:00:00', 1, 0), ('2024-03-20T10:01:00', 1, 0),
+                          ('2024-03-20T10:02:00', 0, 1)])
+        self.assertEqual(response['early_buyers'][0]['Entry_Market_Cap_USD'], '$1.00M')
+        self.assertEqual(response['early_buyers'][0]['Total_SOL'], '3.00 SOL')
+
+        # A summary alone still takes the fast path
+        del self.fields['interval'], self.fields['earlyBuyers']
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertIn('fast_parse;dur=', headers['Server-Timing'])
+        self.assertEqual(list(json.loads(payload)), ['whale_report'])
+
+    def test_multi_token_cache_keeps_address_case(self):
+        tokens = [{'tokenAddress': 'TOKEN123', 'totalSupply': 1000000, 'marketCap': 10000000}]
+        body, content_type = build_multipart({'solPrice': '99.5', 'tokens': json.dumps(tokens)}, self.csv_bytes)
+        status, upper_headers, payload = run_handler(body, content_type)
+        self.assertEqual(json.loads(payload)['tokens'][0]['tokenAddress'], 'TOKEN123')
+
+        tokens[0]['tokenAddress'] = 'token123'
+        body, content_type = build_multipart({'solPrice': '99.5', 'tokens': json.dumps(tokens)}, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(headers['X-Cache'], 'MISS')
+        self.assertNotEqual(headers['ETag'], upper_headers['ETag'])
+        self.assertEqual(json.loads(payload)['tokens'][0]['tokenAddress'], 'token123')
+
+    def test_invalid_time_series_fields_are_rejected(self):
+        for fields in ({'interval': '0'}, {'interval': '5 minutes'}, {'earlyBuyers': '-1'}, {'earlyBuyers': 'x'},
+                       {'interval': '1h', 'format': 'ndjson'}, {'summary': 'true', 'mode': 'incremental'}):
+            body, content_type = build_multipart(dict(self.fields, **fields), self.csv_bytes)
+            status, headers, payload = run_handler(body, content_type)
+            self.assertEqual(status, 400, fields)
+
+    def test_invalid_top_n_is_rejected(self):
+        for top_n in ('five', '2.5', '-1'):
+            body, content_type = build_multipart(dict(self.fields, topN=top_n), self.csv_bytes)
+            status, headers, payload = run_handler(body, content_type)
+            self.assertEqual(status, 400, top_n)
+            self.assertEqual(json.loads(payload)['message'], "topN must be a whole number.")
+
+    def test_invalid_token_list_is_rejected(self):
+        for tokens in ('[]', 'not json', '[{"tokenAddress": "a"}]',
+                       '[{"tokenAddress": "a", "totalSupply": 1, "marketCap": 1},'
+                       ' {"tokenAddress": "A", "totalSupply": 1, "marketCap": 1}]'):
+            body, content_type = build_multipart({'solPrice': '100', 'tokens': tokens}, self.csv_bytes)
+            status, headers, payload = run_handler(body, content_type)
+            self.assertEqual(status, 400, tokens)
+
+    def test_invalid_csv_is_rejected(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes + b"bad sig!,2024-03-20 10:03:00,sol,1,token123,1\n")
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 400)
+        self.assertIn('Invalid signature format', json.loads(payload)['message'])
+
+    def test_repeat_upload_is_served_from_cache(self):
+        self.fields['solPrice'] = '123.25'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, first = run_handler(body, content_type)
+        self.assertEqual((status, headers['X-Cache']), (200, 'MISS'))
+        status, headers, second = run_handler(body, content_type)
+        self.assertEqual((status, headers['X-Cache']), (200, 'HIT'))
+        self.assertEqual(first, second)
+
+        # A client that already holds this result only gets a 304
+        status, not_modified_headers, payload = run_handler(body, content_type, {'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+        self.assertEqual(not_modified_headers['ETag'], headers['ETag'])
+        self.assertEqual(payload, b'')
+
+        # A wildcard is not a result the client holds
+        self.fields['solPrice'] = '123.75'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, wildcard_headers, payload = run_handler(body, content_type, {'If-None-Match': '*'})
+        self.assertEqual((status, wildcard_headers['X-Cache']), (200, 'MISS'))
+        self.assertEqual(len(json.loads(payload)['transactions']), 3)
+
+        # Changing a parameter changes the ETag
+        self.fields['marketCap'] = '20000000'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, changed_headers, payload = run_handler(body, content_type, {'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(changed_headers['ETag'], headers['ETag'])
+
+    def test_recompute_from_file_hash(self):
+        self.fields['solPrice'] = '77'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        file_hash = headers['X-File-Hash']
+
+        # Re-run with a new SOL price and threshold without uploading the file again
+        self.fields.update({'solPrice': '88', 'marketCap': '500000', 'fileHash': file_hash})
+        body, content_type = build_multipart(self.fields, None)
+        status, headers, recomputed = run_handler(body, content_type, path='/api/analyze/recompute')
+        self.assertEqual((status, headers['X-Cache'], headers['X-File-Hash']), (200, 'MISS', file_hash))
+
+        del self.fields['fileHash']
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, uploaded = run_handler(body, content_type)
+        self.assertEqual(json.loads(recomputed), json.loads(uploaded))
+
+    def test_recompute_with_unknown_or_invalid_hash(self):
+        self.fields['fileHash'] = '0' * 64
+        body, content_type = build_multipart(self.fields, None)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 404)
+        self.fields['fileHash'] = 'abc\r\nX-Injected: 1'
+        body, content_type = build_multipart(self.fields, None)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 400)
+        self.assertNotIn('X-Injected', headers)
+
+    def test_incremental_mode(self):
+        self.fields.update({'tokenAddress': 'TOKEN123', 'mode': 'incremental', 'reset': 'true'})
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(json.loads(payload)['incremental']['new_rows'], 3)
+        self.assertNotIn('ETag', headers)
+
+        del self.fields['reset']
+        grown = self.csv_bytes + b"sig4,2024-03-20 10:03:00,sol,4.0,token123,400\n"
+        body, content_type = build_multipart(self.fields, grown)
+        status, headers, payload = run_handler(body, content_type)
+        response = json.loads(payload)
+        self.assertEqual(status, 200)
+        self.assertEqual([t['Signature'] for t in response['transactions']], ['sig4'])
+        self.assertEqual(response['incremental']['total_rows'], 4)
+        self.assertEqual(response['whale_report'][0]['Total_SOL'], '7.00 SOL')
+
+        for response_format in ('columnar', 'ndjson'):
+            body, content_type = build_multipart(dict(self.fields, format=response_format), grown)
+            status, headers, payload = run_handler(body, content_type)
+            self.assertEqual(status, 400, response_format)
+            self.assertEqual(json.loads(payload)['message'], "mode=incremental only supports the json format.")
+
+    def test_busy_server_answers_503(self):
+        executor = parallel.AnalysisExecutor(max_concurrent=1, max_queued=0)
+        original, parallel.analysis_executor = parallel.analysis_executor, executor
+        try:
+            self.fields['solPrice'] = '101.5'
+            body, content_type = build_multipart(self.fields, self.csv_bytes)
+            with executor.slot():
+                status, headers, payload = run_handler(body, content_type)
+            self.assertEqual((status, headers['Retry-After']), (503, '5'))
+            status, headers, payload = run_handler(body, content_type)
+            self.assertEqual(status, 200)
+        finally:
+            parallel.analysis_executor = original
+
+    def test_non_multipart_is_rejected(self):
+        status, headers, payload = run_handler(b'{}', 'application/json')
+        self.assertEqual(status, 400)
+
+    def test_ndjson_stream_matches_json(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        _, _, payload = run_handler(body, content_type)
+        expected = json.loads(payload)
+
+        status, headers, payload = run_handler(body, content_type, {'Accept': 'application/x-ndjson'})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(headers['Transfer-Encoding'], 'chunked')
+        lines = [json.loads(line) for line in payload.decode().splitlines()]
+        self.assertEqual(lines[:-1], expected['transactions'])
+        self.assertEqual(lines[-1], {'whale_report': expected['whale_report']})
+
+    def test_ndjson_selected_by_format_param(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type, path='/api/analyze?format=ndjson')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(payload.decode().splitlines()), 4)
+
+        self.fields['format'] = 'xml'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 400)
+
+    def test_columnar_format(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        _, json_headers, payload = run_handler(body, content_type)
+        expected = json.loads(payload)
+
+        status, headers, payload = run_handler(body, content_type, {'Accept': response_writer.COLUMNAR_CONTENT_TYPE})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], response_writer.COLUMNAR_CONTENT_TYPE)
+        self.assertNotEqual(headers['ETag'], json_headers['ETag'])
+        response = json.loads(payload)
+        self.assertEqual(response['whale_report'], expected['whale_report'])
+        self.assertEqual(response['transactions']['Signature'], ['sig1', 'sig2', 'sig3'])
+        self.assertEqual(response['transactions']['TOKEN2_USD_Price'], [1.0, 1.0, 1.0])
+        self.assertEqual(response['transactions']['Side'], ['buy', 'buy', 'sell'])
+
+        # The format field selects the same representation, served from the cache
+        self.fields['format'] = 'columnar'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, cached_headers, cached = run_handler(body, content_type)
+        self.assertEqual(cached_headers['X-Cache'], 'HIT')
+        self.assertEqual(cached, payload)
+
+    @unittest.skipUnless(response_writer.pyarrow, "pyarrow is not installed")
+    def test_arrow_format(self):
+        self.fields['format'] = 'arrow'
+        body, content_type = build_multipart(self.fields, self.csv_bytes)
+        status, headers, payload = run_handler(body, content_type)
+        self.assertEqual(status, 200)
+        table = response_writer.pyarrow.ipc.open_stream(payload).read_all()
+        self.assertEqual(table.column('TOKEN2_USD_Price').to_pylist(), [1.0, 1.0, 1.0])
+        self.assertEqual(json.loads(table.schema.metadata[b'whale_report'])[0]['Total_SOL'], '3.00 SOL')
+
+    def test_ndjson_invalid_csv_is_rejected_before_streaming(self):
+        body, content_type = build_multipart(self.fields, self.csv_bytes + b"bad sig!,2024-03-20 10:03:00,sol,1,token123,1\n")
+        status, headers, payload = run_handler(body, content_type, {'Accept': 'application/x-ndjson'})
+        self.assertEqual(status, 400)
+        self.assertIn('Invalid signature format', json.loads(payload)['message'])
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,234 @@
+import unittest
+import base64
+from io import BytesIO
+import numpy as np
+import pandas as pd
+import csv_validator
+from csv_validator import CSVValidator
+from transaction_engine import TransactionEngine
+
+CSV_HEADER = b"Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount\n"
+
+
+def make_csv(rows):
+    lines = [
+        f"sig{i},2024-03-20 10:00:{i % 60:02d},sol,{i + 1}.0,token123,{(i + 1) * 100}\n".encode()
+        for i in range(rows)
+    ]
+    return CSV_HEADER + b"".join(lines)
+
+
+class TestCSVChunks(unittest.TestCase):
+    def test_chunks_cover_all_rows(self):
+        chunks = list(CSVValidator.iter_csv_chunks(BytesIO(make_csv(7)), chunksize=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual(chunks[2]['Signature'].iloc[0], 'sig6')
+
+    def test_header_only_yields_empty_chunk(self):
+        chunks = list(CSVValidator.iter_csv_chunks(BytesIO(CSV_HEADER)))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(len(chunks[0]), 0)
+
+    def test_invalid_row_in_later_chunk(self):
+        data = make_csv(5) + b"bad sig!,2024-03-20 10:00:00,sol,1,token123,1\n"
+        chunks = CSVValidator.iter_csv_chunks(BytesIO(data), chunksize=2)
+        self.assertEqual(len(next(chunks)), 2)
+        with self.assertRaises(ValueError) as context:
+            list(chunks)
+        self.assertIn("Invalid signature format", str(context.exception))
+
+    def test_size_limit_is_enforced_while_streaming(self):
+        with self.assertRaises(ValueError) as context:
+            list(CSVValidator.iter_csv_chunks(BytesIO(make_csv(1000)), max_size=1024))
+        self.assertIn("File size exceeds maximum limit", str(context.exception))
+
+    def test_empty_and_non_utf8_files(self):
+        with self.assertRaises(ValueError) as context:
+            list(CSVValidator.iter_csv_chunks(BytesIO(b"")))
+        self.assertEqual(str(context.exception), "Empty CSV file")
+        with self.assertRaises(ValueError) as context:
+            list(CSVValidator.iter_csv_chunks(BytesIO(CSV_HEADER + b"sig1,\xff\xfe,sol,1,t,1\n")))
+        self.assertEqual(str(context.exception), "Invalid UTF-8 encoding")
+
+
+class TestCSVStream(unittest.TestCase):
+    def setUp(self):
+        self.data = make_csv(5)
+
+    def test_accepts_file_objects_and_buffers(self):
+        expected = CSVValidator.validate_csv_stream(BytesIO(self.data))
+        self.assertEqual(len(expected), 5)
+        for source in (self.data, bytearray(self.data), memoryview(self.data)):
+            self.assertTrue(CSVValidator.validate_csv_stream(source).equals(expected))
+
+    def test_base64_api_matches_stream(self):
+        df = CSVValidator.validate_csv_base64(base64.b64encode(self.data).decode())
+        self.assertTrue(df.equals(CSVValidator.validate_csv_stream(self.data)))
+        with self.assertRaises(ValueError) as context:
+            CSVValidator.validate_csv_base64('invalid_base64')
+        self.assertEqual(str(context.exception), "Invalid base64 encoding")
+
+    def test_buffer_size_limit(self):
+        with self.assertRaises(ValueError) as context:
+            CSVValidator.validate_csv_stream(memoryview(self.data), max_size=16)
+        self.assertIn("File size exceeds maximum limit", str(context.exception))
+
+    def test_missing_columns(self):
+        with self.assertRaises(ValueError) as context:
+            CSVValidator.validate_csv_stream(b"Signature,Other\nsig1,1\n")
+        self.assertIn("Missing required columns: Human Time", str(context.exception))
+
+
+
+class TestCSVSchema(unittest.TestCase):
+    def test_detects_columns_in_one_pass(self):
+        schema = CSVValidator.detect_schema(['Signature', 'Human Time', 'Token1 Address', 'Token1 Amount',
+                                             'Token2 Address', 'Token2 Amount', 'Wallet', 'Other Wallet'])
+        self.assertEqual(schema.token_columns(), {
+            'token1_address': 'Token1 Address',
+            'token1_amount': 'Token1 Amount',
+            'token2_address': 'Token2 Address',
+            'token2_amount': 'Token2 Amount',
+            'wallet': 'Wallet'
+        })
+        with self.assertRaises(ValueError) as context:
+            CSVValidator.detect_schema(['Signature', 'Token1 Address']).token_columns()
+        self.assertIn("Missing required token columns: token1_amount", str(context.exception))
+
+    def test_detects_date_format_from_sample(self):
+        cases = {
+            '%Y-%m-%d %H:%M:%S': ['2024-03-20 10:00:00', '2024-03-21 11:00:00'],
+            '%Y-%m-%d %H:%M:%S.%f': ['2024-03-20 10:00:00.250', '2024-03-21 11:00:00.5'],
+            '%d/%m/%Y %H:%M:%S': ['20/03/2024 10:00:00', '01/04/2024 11:00:00'],
+            '%m/%d/%Y %H:%M:%S': ['03/20/2024 10:00:00', '04/01/2024 11:00:00'],
+            'ISO8601': ['2025-05-17T22:39:40.000Z', '2025-05-17T22:40:12.000Z'],
+            'mixed': ['March 20 2024 10:00', '2024-03-20 10:00:00']
+        }
+        for expected, values in cases.items():
+            self.assertEqual(CSVValidator.detect_date_format(pd.Series(values)), expected)
+        self.assertIsNone(CSVValidator.detect_date_format(pd.Series([np.nan])))
+
+    def test_parsed_timestamps_match_mixed_parsing(self):
+        values = pd.Series(['2024-03-20 10:00:00', None, '2024-03-20 10:00:01.5'])
+        # The sample format misses the last row, which falls back to mixed parsing
+        timestamps = CSVValidator.parse_dates(values, '%Y-%m-%d %H:%M:%S')
+        expected = pd.to_datetime(values, format='mixed').to_numpy(dtype='datetime64[ns]')
+        np.testing.assert_array_equal(timestamps, expected)
+
+        timestamps = CSVValidator.parse_dates(pd.Series(['2025-05-17T22:39:40.000Z']), 'ISO8601')
+        self.assertEqual(timestamps[0], np.datetime64('2025-05-17T22:39:40', 'ns'))
+
+        with self.assertRaises(ValueError) as context:
+            CSVValidator.parse_dates(pd.Series(['not a date']), 'mixed')
+        self.assertEqual(str(context.exception), "Invalid date format in 'Human Time' column")
+
+    def test_signature_charset(self):
+        CSVValidator.check_signatures(pd.Series(['abc+/=', '5VfYdw3bq9']))
+        for bad in (['ok', 'bad sig'], ['ok', None], ['ok', ''], ['ok', 'sigé'], ['ok', 'a-b']):
+            with self.assertRaises(ValueError):
+                CSVValidator.check_signatures(pd.Series(bad, dtype=object))
+
+    def test_validated_chunks_keep_schema_and_timestamps(self):
+        chunks = list(CSVValidator.iter_validated_chunks(BytesIO(make_csv(5)), chunksize=2))
+        self.assertEqual([len(chunk.frame) for chunk in chunks], [2, 2, 1])
+        self.assertIs(chunks[0].schema, chunks[2].schema)
+        self.assertEqual(chunks[0].schema.date_format, '%Y-%m-%d %H:%M:%S')
+        self.assertEqual(chunks[2].timestamps[0], np.datetime64('2024-03-20T10:00:04', 'ns'))
+
+    def test_day_month_order_holds_across_chunks(self):
+        def slash_csv(dates):
+            return CSV_HEADER + b"".join(
+                f"sig{i},{date} 10:00:00,sol,1.0,token123,100\n".encode() for i, date in enumerate(dates)
+            )
+
+        def timestamps(data, chunksize):
+            chunks = list(CSVValidator.iter_validated_chunks(BytesIO(data), chunksize=chunksize))
+            self.assertEqual(len({chunk.schema.date_format for chunk in chunks}), 1)
+            return np.concatenate([chunk.timestamps for chunk in chunks])
+
+        # The first chunk cannot tell day and month apart; ties read month-first
+        data = slash_csv(['01/02/2024'] * 5 + ['02/20/2024'] * 3)
+        whole = timestamps(data, chunksize=None)
+        self.assertEqual(whole[0], np.datetime64('2024-01-02T10:00:00', 'ns'))
+        np.testing.assert_array_equal(timestamps(data, chunksize=5), whole)
+
+        # Within the first chunk a day-first row past the sample switches the whole chunk over
+        data = slash_csv(['01/02/2024'] * 4 + ['20/02/2024'])
+        self.assertEqual(timestamps(data, chunksize=5)[0], np.datetime64('2024-02-01T10:00:00', 'ns'))
+
+        # A later chunk cannot: the earlier ones were read month-first already
+        data = slash_csv(['01/02/2024'] * 5 + ['20/02/2024'] * 3)
+        with self.assertRaises(ValueError) as context:
+            list(CSVValidator.iter_validated_chunks(BytesIO(data), chunksize=5))
+        self.assertIn("MM/DD/YYYY hh:mm:ss", str(context.exception))
+
+        # Both orders within the sample itself are not read value by value either
+        data = slash_csv(['13/06/2024', '06/13/2024'])
+        with self.assertRaises(ValueError) as context:
+            list(CSVValidator.iter_validated_chunks(BytesIO(data)))
+        self.assertIn("not both", str(context.exception))
+
+
+
+class TestSchemaLoading(unittest.TestCase):
+    ENGINES = ['c'] + (['pyarrow'] if csv_validator.pyarrow is not None else [])
+
+    def setUp(self):
+        self.engine = CSVValidator.CSV_ENGINE
+        self.data = (
+            b"Notes,Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount,Wallet\n"
+            b"\"a, long note\",sig1,2024-03-20 10:00:00,SOL,\"$1,000.50\",tok,100,WalletA\n"
+            b"x,sig2,2024-03-20 10:00:01,sol,2.5e-1,TOK,1e3,walleta\n"
+            b",sig3,2024-03-20 10:00:02,,3,tok,,walletb\n"
+            b"y,sig4,2024-03-20 10:00:03,tok,5,sol,0.5,walletb\n"
+        )
+
+    def tearDown(self):
+        CSVValidator.CSV_ENGINE = self.engine
+
+    def _process(self, chunksize):
+        chunks = CSVValidator.iter_csv_chunks(BytesIO(self.data), chunksize=chunksize)
+        first_chunk = next(chunks)
+        token_columns = CSVValidator.validate_token_columns(first_chunk)
+        return TransactionEngine.process_chunks([first_chunk, *chunks], 100.0, 'tok', 1000000, 10000000000,
+                                                token_columns)
+
+    def test_loads_only_schema_columns(self):
+        for engine in self.ENGINES:
+            CSVValidator.CSV_ENGINE = engine
+            df = CSVValidator.validate_csv_stream(self.data)
+            self.assertNotIn('Notes', df.columns, engine)
+            self.assertEqual(len(df.columns), 7, engine)
+            self.assertIsInstance(df['Token1 Address'].dtype, pd.CategoricalDtype, engine)
+            self.assertIsInstance(df['Wallet'].dtype, pd.CategoricalDtype, engine)
+            self.assertEqual(df['Signature'].tolist(), ['sig1', 'sig2', 'sig3', 'sig4'], engine)
+
+    def test_engines_match_whole_file_parsing(self):
+        # Whole-file pandas parsing, as the analyzer did before columns were selected
+        df = pd.read_csv(BytesIO(self.data))
+        expected = TransactionEngine.process(df, 100.0, 'tok', 1000000, 10000000000,
+                                             CSVValidator.validate_token_columns(df))
+        for engine in self.ENGINES:
+            CSVValidator.CSV_ENGINE = engine
+            self.assertEqual(self._process(chunksize=10), expected, engine)
+
+    def test_engines_agree_chunk_by_chunk(self):
+        results = []
+        for engine in self.ENGINES:
+            CSVValidator.CSV_ENGINE = engine
+            chunks = list(CSVValidator.iter_csv_chunks(BytesIO(self.data), chunksize=3))
+            self.assertEqual([len(chunk) for chunk in chunks], [3, 1], engine)
+            results.append(self._process(chunksize=3))
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_header_only_and_bom(self):
+        for engine in self.ENGINES:
+            CSVValidator.CSV_ENGINE = engine
+            chunks = list(CSVValidator.iter_csv_chunks(BytesIO(b"\xef\xbb\xbf" + CSV_HEADER)))
+            self.assertEqual(len(chunks), 1, engine)
+            self.assertEqual(list(chunks[0].columns)[:2], ['Signature', 'Human Time'], engine)
+            self.assertEqual(len(chunks[0]), 0, engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
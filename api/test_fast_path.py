@@ -0,0 +1,77 @@
+import json
+import unittest
+import fast_path
+from csv_validator import CSVValidator
+from test_helpers import HEADER, engine_result, random_csv
+from transaction_engine import TransactionEngine
+
+class TestFastPath(unittest.TestCase):
+    def assertSameAsEngine(self, data, *args, **kwargs):
+        expected = engine_result(data, *args, **kwargs)
+        actual = fast_path.parse(data).process(*args, **kwargs)
+        # Serialized, so -0.0, NaN and key order would all show up as differences
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_matches_engine(self):
+        for seed in range(8):
+            data = random_csv(seed)
+            self.assertSameAsEngine(data, 150.0, 'Token123', 1e9, 5e7)
+            self.assertSameAsEngine(data, 87.5, 'token123', 1e6, 2e6, top_n=3, columnar=True)
+            self.assertSameAsEngine(data, 87.5, 'token123', 1e6, 2e6, top_n=0)
+
+    def test_matches_engine_without_wallet_column(self):
+        data = b"\xef\xbb\xbfSignature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount\r\n" \
+               b"sig1,20/03/2024 10:00:00,sol,1.0,token123,100\r\n" \
+               b"\r\n" \
+               b"sig2,21/03/2024 10:01:00,token123,50,sol,0.75\r\n"
+        self.assertSameAsEngine(data, 100.0, 'token123', 1e6, 1e7)
+
+    def test_net_sol_counts_buys_above_the_threshold(self):
+        data = (HEADER + "sig1,2024-03-20 10:00:00,sol,1.0,token123,1000,w\n"
+                         "sig2,2024-03-20 10:01:00,sol,100.0,token123,1000,w\n"
+                         "sig3,2024-03-20 10:02:00,token123,1000,sol,101.0,w\n").encode()
+        self.assertSameAsEngine(data, 100.0, 'token123', 1e6, 1e6)
+        self.assertEqual(fast_path.parse(data).process(100.0, 'token123', 1e6, 1e6)['whale_report'][0]['Net_SOL'],
+                         '0.00 SOL')
+
+    def test_date_layouts(self):
+        for human_time in ('2024-03-20 10:00:00', '2024-03-20 10:00:00.125', '03/20/2024 10:00:00',
+                           '2024-03-20T10:00:00.000Z', '2024-03-20T10:00:00'):
+            data = (HEADER + f"sig1,{human_time},sol,1.0,token123,100,w\n").encode()
+            self.assertSameAsEngine(data, 100.0, 'token123', 1e6, 1e7)
+
+    def test_unusual_input_is_left_to_the_engine(self):
+        rows = {
+            'currency amount': 'sig1,2024-03-20 10:00:00,sol,"$1,000.00",token123,100,w',
+            'missing value': 'sig1,2024-03-20 10:00:00,sol,NA,token123,100,w',
+            'exponent': 'sig1,2024-03-20 10:00:00,sol,1e3,token123,100,w',
+            'negative amount': 'sig1,2024-03-20 10:00:00,sol,-0,token123,100,w',
+            'ragged row': 'sig1,2024-03-20 10:00:00,sol,1.0,token123,100',
+            'bad signature': 'bad sig!,2024-03-20 10:00:00,sol,1.0,token123,100,w',
+            'unknown date layout': 'sig1,March 20 2024,sol,1.0,token123,100,w',
+            'out of range date': 'sig1,2999-03-20 10:00:00,sol,1.0,token123,100,w',
+            'mixed date layouts': 'sig1,2024-03-20 10:00:00,sol,1.0,token123,100,w\n'
+                                  'sig2,2024-03-20T10:00:00Z,sol,1.0,token123,100,w',
+            'stray quote': 'sig1,"2024-03-20 10:00:00"x,sol,1.0,token123,100,w'
+        }
+        for name, row in rows.items():
+            with self.subTest(name), self.assertRaises(fast_path.Unsupported):
+                fast_path.parse((HEADER + row + '\n').encode())
+        for data in (b'', b'Signature,Token1 Address\nsig1,sol\n', HEADER.encode(),
+                     b'Signature,Signature,Human Time\n'):
+            with self.assertRaises(fast_path.Unsupported):
+                fast_path.parse(data)
+
+    def test_size_limits(self):
+        self.assertLessEqual(fast_path.MAX_ROWS, CSVValidator.CHUNK_ROWS)
+        with self.assertRaises(fast_path.Unsupported):
+            fast_path.parse(b'x' * (fast_path.MAX_BYTES + 1))
+
+    def test_rules_match_engine(self):
+        self.assertEqual(fast_path.SOL_ADDRESSES, TransactionEngine.SOL_ADDRESSES)
+        self.assertEqual(fast_path.SIDE_NAMES, TransactionEngine.SIDE_NAMES)
+        self.assertEqual(fast_path.UNKNOWN_WALLET, TransactionEngine.UNKNOWN_WALLET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Upload generators and engine shortcuts shared by the engine test modules"""
+import random
+from io import BytesIO
+from csv_validator import CSVValidator
+from transaction_engine import TransactionEngine
+
+TOKEN_COLUMNS = {
+    'token1_address': 'Token1 Address',
+    'token1_amount': 'Token1 Amount',
+    'token2_address': 'Token2 Address',
+    'token2_amount': 'Token2 Amount',
+    'wallet': 'Wallet'
+}
+HEADER = "Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount,Wallet\n"
+
+
+def random_csv(seed, rows=300):
+    """
+    Buys, sells and unrelated swaps of token123 with mixed-case addresses,
+    repeated wallets, some unpriced rows and times out of file order
+    """
+    rng = random.Random(seed)
+    wallets = [f'Wallet{i}' for i in range(12)]
+    lines = [HEADER]
+    for i in range(rows):
+        sol = f'{rng.uniform(0.001, 40):.6f}'
+        tokens = f'{rng.uniform(1, 900000):.2f}'
+        token = rng.choice(['token123', 'TOKEN123', 'other'])
+        sol_name = rng.choice(['sol', 'SOL', 'Solana'])
+        human_time = f'2024-03-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:{(7 * i) % 60:02d}'
+        if rng.random() < 0.3:
+            row = (token, tokens, sol_name, sol)
+        else:
+            row = (sol_name, sol, token, tokens if rng.random() > 0.05 else '0')
+        lines.append(f'sig{i}/{seed},{human_time},{",".join(row)},{rng.choice(wallets)}\n')
+    return ''.join(lines).encode()
+
+
+def prepare(data, chunk_rows=None):
+    """Validate and prepare an upload the way the handler does, optionally split into smaller parts"""
+    chunks = list(CSVValidator.iter_validated_chunks(BytesIO(data)))
+    token_columns = chunks[0].schema.token_columns()
+    parts = [TransactionEngine.prepare(chunk.frame, token_columns, chunk.timestamps) for chunk in chunks]
+    if chunk_rows:
+        parts = [part.slice(start, start + chunk_rows) for part in parts for start in range(0, len(part), chunk_rows)]
+    return parts
+
+
+def engine_result(data, *args, **kwargs):
+    """The full engine's result for an upload"""
+    return TransactionEngine.process_prepared(prepare(data), *args, **kwargs)
@@ -0,0 +1,92 @@
+import unittest
+import pandas as pd
+from incremental import IncrementalAnalysis, IncrementalStore
+from test_helpers import TOKEN_COLUMNS
+from transaction_engine import TransactionEngine
+
+
+def export(rows):
+    return pd.DataFrame({
+        'Signature': [f'sig{i}' for i in rows],
+        'Human Time': [f'2024-03-20 10:{i:02d}:00' for i in rows],
+        'Token1 Address': ['sol'] * len(rows),
+        'Token1 Amount': [str(i + 1) for i in rows],
+        'Token2 Address': ['token123'] * len(rows),
+        'Token2 Amount': [str((i + 1) * 100) for i in rows],
+        'Wallet': [f'wallet{i % 3}' for i in rows]
+    })
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def _parts(self, df, chunk=2):
+        chunks = [df.iloc[start:start + chunk] for start in range(0, len(df), chunk)]
+        return list(TransactionEngine.prepare_chunks(chunks, TOKEN_COLUMNS))
+
+    def test_only_new_rows_are_processed(self):
+        state = IncrementalAnalysis(1000000, 10000000, 100.0)
+        first = state.update(self._parts(export(range(3))), 'token123')
+        self.assertEqual(first['incremental']['new_rows'], 3)
+
+        # Newest-first export that repeats the earlier rows
+        second = state.update(self._parts(export([5, 4, 3, 2, 1, 0])), 'token123')
+        self.assertEqual([t['Signature'] for t in second['transactions']], ['sig5', 'sig4', 'sig3'])
+        self.assertEqual(second['incremental'], {
+            'new_rows': 3,
+            'total_rows': 6,
+            'last_signature': 'sig5',
+            'last_time': '2024-03-20 10:05:00'
+        })
+
+        # The cumulative whale report equals a full analysis of the latest export
+        full = TransactionEngine.process(export(range(6)), 100.0, 'token123', 1000000, 10000000, TOKEN_COLUMNS)
+        self.assertEqual(second['whale_report'], full['whale_report'])
+
+    def test_sol_price_change_starts_over(self):
+        store = IncrementalStore()
+        store.get('token123', 1e6, 1.5e6, 100.0).update(self._parts(export(range(3))), 'token123')
+        # At 200.0 every buy is above the threshold, so the full analysis reports no whales
+        result = store.get('token123', 1e6, 1.5e6, 200.0).update(self._parts(export(range(6))), 'token123')
+        full = TransactionEngine.process(export(range(6)), 200.0, 'token123', 1e6, 1.5e6, TOKEN_COLUMNS)
+        self.assertEqual(full['whale_report'], [])
+        self.assertEqual(result['whale_report'], full['whale_report'])
+        self.assertEqual(result['transactions'], full['transactions'])
+        self.assertEqual(result['incremental']['total_rows'], 6)
+
+    def test_repeated_export_adds_nothing(self):
+        state = IncrementalAnalysis(1000000, 10000000, 100.0)
+        state.update(self._parts(export(range(4))), 'token123')
+        again = state.update(self._parts(export(range(4))), 'token123')
+        self.assertEqual(again['transactions'], [])
+        self.assertEqual(again['incremental']['total_rows'], 4)
+        self.assertEqual(len(state.signature_hashes), 4)
+
+
+class TestIncrementalStore(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.store = IncrementalStore(max_tokens=2, ttl=60, time_func=lambda: self.now)
+
+    def test_state_is_shared_per_token(self):
+        state = self.store.get('TokenA', 1, 2, 100.0)
+        self.assertIs(self.store.get('tokena ', 1, 2, 100.0), state)
+
+    def test_parameter_change_and_idle_timeout_reset_state(self):
+        state = self.store.get('a', 1, 2, 100.0)
+        self.assertIsNot(self.store.get('a', 1, 3, 100.0), state)
+        state = self.store.get('a', 1, 3, 100.0)
+        self.assertIsNot(self.store.get('a', 1, 3, 200.0), state)
+        state = self.store.get('a', 1, 3, 100.0)
+        self.now += 60
+        self.assertIsNot(self.store.get('a', 1, 3, 100.0), state)
+
+    def test_least_recently_used_token_is_evicted(self):
+        state_a = self.store.get('a', 1, 2, 100.0)
+        self.store.get('b', 1, 2, 100.0)
+        self.store.get('a', 1, 2, 100.0)
+        self.store.get('c', 1, 2, 100.0)
+        self.assertIs(self.store.get('a', 1, 2, 100.0), state_a)
+        self.assertEqual(list(self.store.states), ['c', 'a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
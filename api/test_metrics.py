@@ -0,0 +1,63 @@
+import unittest
+from metrics import Metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = Metrics(time_func=self.clock)
+
+    def test_stages_are_recorded_per_request(self):
+        with self.metrics.request() as timings:
+            for _ in range(2):
+                with self.metrics.stage('read_csv') as stage:
+                    self.clock.now += 0.02
+                    stage.rows = 500
+            with self.metrics.stage('serialize') as stage:
+                self.clock.now += 0.003
+                stage.nbytes = 1024
+            timings.status = 200
+            self.assertEqual(timings.server_timing(), 'read_csv;dur=40.0, serialize;dur=3.0')
+        self.assertIsNone(self.metrics.current())
+
+        text = self.metrics.render()
+        self.assertIn('token_analyzer_stage_seconds_bucket{stage="read_csv",le="0.025"} 2', text)
+        self.assertIn('token_analyzer_stage_seconds_bucket{stage="read_csv",le="0.01"} 0', text)
+        self.assertIn('token_analyzer_stage_seconds_count{stage="read_csv"} 2', text)
+        self.assertIn('token_analyzer_stage_seconds_count{stage="request"} 1', text)
+        self.assertIn('token_analyzer_stage_rows_total{stage="read_csv"} 1000', text)
+        self.assertIn('token_analyzer_stage_bytes_total{stage="serialize"} 1024', text)
+        self.assertIn('token_analyzer_responses_total{code="200"} 1', text)
+
+    def test_stage_outside_a_request_is_still_counted(self):
+        with self.metrics.stage('evaluate'):
+            self.clock.now += 2
+        self.assertIn('token_analyzer_stage_seconds_sum{stage="evaluate"} 2.000000', self.metrics.render())
+
+    def test_extra_counters_share_one_header(self):
+        text = self.metrics.render([
+            ('cache_hits_total', 'Hits', {'cache': 'result'}, 3),
+            ('cache_hits_total', 'Hits', {'cache': 'intermediate'}, 1)
+        ])
+        self.assertEqual(text.count('# TYPE token_analyzer_cache_hits_total counter'), 1)
+        self.assertIn('token_analyzer_cache_hits_total{cache="intermediate"} 1', text)
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics(enabled=False, time_func=self.clock)
+        with metrics.request() as timings:
+            with metrics.stage('read_csv') as stage:
+                stage.rows = 10
+        self.assertIsNone(timings)
+        self.assertNotIn('read_csv', metrics.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
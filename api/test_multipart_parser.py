@@ -0,0 +1,86 @@
+import unittest
+from io import BytesIO
+from multipart_parser import MultipartParser, parse_header_options
+
+BOUNDARY = '----tokenanalyzerboundary'
+
+
+def encode(fields, files, boundary=BOUNDARY, preamble=b'', epilogue=b''):
+    body = [preamble]
+    for name, value in fields.items():
+        body.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        body.append(value.encode() + b'\r\n')
+    for name, (filename, data) in files.items():
+        body.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode()
+        )
+        body.append(data + b'\r\n')
+    body.append(f'--{boundary}--'.encode() + epilogue)
+    return b''.join(body)
+
+
+def parse(body, **kwargs):
+    return MultipartParser(BytesIO(body), BOUNDARY, len(body), **kwargs).parse()
+
+
+class TestMultipartParser(unittest.TestCase):
+    def setUp(self):
+        self.csv = b"Signature,Human Time\r\nsig1,2024-03-20 10:00:00\r\n--" + BOUNDARY[:-3].encode() + b"\r\n"
+
+    def test_fields_and_file(self):
+        form = parse(encode({'solPrice': '170.5', 'tokenAddress': 'abc'}, {'file': ('swaps.csv', self.csv)}))
+        self.assertEqual(form.getvalue('solPrice'), '170.5')
+        self.assertEqual(form.getvalue('tokenAddress'), 'abc')
+        self.assertIsNone(form.getvalue('marketCap'))
+        uploaded = form.files['file']
+        self.assertEqual(uploaded.filename, 'swaps.csv')
+        self.assertEqual(uploaded.content_type, 'text/csv')
+        self.assertEqual(uploaded.size, len(self.csv))
+        self.assertEqual(uploaded.file.read(), self.csv)
+        self.assertIsNone(uploaded.file.name)
+        form.close()
+
+    def test_boundaries_split_across_chunks(self):
+        body = encode({'a': '1', 'b': ''}, {'file': ('x.csv', self.csv * 50)}, preamble=b'ignored\r\n',
+                      epilogue=b'\r\ntrailing')
+        for chunk_size in (1, 7, 64, 4096):
+            form = parse(body, chunk_size=chunk_size)
+            self.assertEqual(form.fields, {'a': '1', 'b': ''})
+            self.assertEqual(form.files['file'].file.read(), self.csv * 50)
+            form.close()
+
+    def test_large_file_is_spooled_to_disk(self):
+        data = b'x' * 5000
+        form = parse(encode({}, {'file': ('big.csv', data)}), spool_threshold=1024)
+        uploaded = form.files['file']
+        self.assertEqual(uploaded.size, 5000)
+        # Only a rolled-over spool is backed by a real (named) file
+        self.assertIsInstance(uploaded.file.name, int)
+        self.assertEqual(uploaded.file.read(), data)
+        form.close()
+
+    def test_truncated_body(self):
+        body = encode({'a': '1'}, {'file': ('x.csv', self.csv)})
+        with self.assertRaises(ValueError):
+            MultipartParser(BytesIO(body), BOUNDARY, len(body) - 20).parse()
+
+    def test_missing_boundary(self):
+        with self.assertRaises(ValueError):
+            parse(b'no boundary here')
+        with self.assertRaises(ValueError):
+            MultipartParser(BytesIO(b''), None, 0)
+
+    def test_oversized_field(self):
+        with self.assertRaises(ValueError):
+            parse(encode({'a': 'x' * (MultipartParser.MAX_FIELD_SIZE + 1)}, {}))
+
+    def test_parse_header_options(self):
+        ctype, params = parse_header_options(f'multipart/form-data; boundary="{BOUNDARY}"')
+        self.assertEqual(ctype, 'multipart/form-data')
+        self.assertEqual(params['boundary'], BOUNDARY)
+        self.assertEqual(parse_header_options(None), ('', {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import json
+import threading
+import numpy as np
+import pandas as pd
+from parallel import AnalysisExecutor, Overloaded, shard_parts
+from test_helpers import TOKEN_COLUMNS
+from transaction_engine import TransactionEngine
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    buys = rng.random(rows) < 0.8
+    # Amounts in quarters keep every partial sum exact, whatever the grouping
+    sol = rng.integers(1, 400, rows) / 4
+    tokens = rng.integers(1, 4000, rows).astype(float)
+    return pd.DataFrame({
+        'Signature': [f'sig{i}' for i in range(rows)],
+        'Human Time': ['2024-03-20 10:00:00'] * rows,
+        'Token1 Address': np.where(buys, 'sol', 'token123'),
+        'Token1 Amount': np.where(buys, sol, tokens),
+        'Token2 Address': np.where(buys, 'token123', 'sol'),
+        'Token2 Amount': np.where(buys, tokens, sol),
+        'Wallet': [f'wallet{i}' for i in rng.integers(0, 50, rows)]
+    })
+
+
+class TestSharding(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        df = make_frame(2000)
+        cls.parts = list(TransactionEngine.prepare_chunks(
+            [df.iloc[start:start + 700] for start in range(0, len(df), 700)], TOKEN_COLUMNS
+        ))
+        cls.executor = AnalysisExecutor(workers=3, min_rows=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def test_shards_cover_rows_in_order(self):
+        shards = shard_parts(self.parts, 3)
+        self.assertEqual([sum(len(part) for part in shard) for shard in shards], [667, 667, 666])
+        signatures = [signature for shard in shards for part in shard for signature in part.signatures]
+        self.assertEqual(signatures, [f'sig{i}' for i in range(2000)])
+
+    def test_sharded_result_equals_single_pass(self):
+        for args in ((100.0, 'token123', 1000000, 1000000), (55.5, 'TOKEN123', 2000000, 100000)):
+            expected = TransactionEngine.process_prepared(self.parts, *args, top_n=10)
+            actual = self.executor.process_prepared(self.parts, *args, top_n=10)
+            self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+            expected = TransactionEngine.process_prepared(self.parts, *args, columnar=True)
+            actual = self.executor.process_prepared(self.parts, *args, columnar=True)
+            self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_small_inputs_stay_in_process(self):
+        executor = AnalysisExecutor(workers=2, min_rows=10000)
+        executor.process_prepared(self.parts, 100.0, 'token123', 1000000, 1000000)
+        self.assertIsNone(executor.pool)
+
+
+class TestAnalysisSlots(unittest.TestCase):
+    def test_unlimited_by_default(self):
+        executor = AnalysisExecutor()
+        with executor.slot(), executor.slot():
+            pass
+
+    def test_full_queue_is_rejected(self):
+        executor = AnalysisExecutor(max_concurrent=1, max_queued=1)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold_slot():
+            with executor.slot():
+                entered.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_slot)
+        holder.start()
+        entered.wait(5)
+        waiter = threading.Thread(target=hold_slot)
+        waiter.start()
+        while executor.waiting == 0:
+            threading.Event().wait(0.01)
+
+        # One running and one waiting: a third request is turned away
+        with self.assertRaises(Overloaded):
+            with executor.slot():
+                pass
+        release.set()
+        holder.join()
+        waiter.join()
+        with executor.slot():
+            self.assertEqual(executor.active, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
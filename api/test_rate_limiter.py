@@ -0,0 +1,63 @@
+import unittest
+from rate_limiter import RateLimiter
+from shared_state import MemoryBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(requests_per_minute=60, time_func=self.clock)
+
+    def test_burst_then_refill(self):
+        for _ in range(60):
+            self.assertFalse(self.limiter.is_rate_limited('1.2.3.4'))
+        self.assertTrue(self.limiter.is_rate_limited('1.2.3.4'))
+        self.assertFalse(self.limiter.is_rate_limited('5.6.7.8'))
+        # One token comes back every second
+        self.assertAlmostEqual(self.limiter.acquire('1.2.3.4'), 1.0)
+        self.clock.now += 1
+        self.assertFalse(self.limiter.is_rate_limited('1.2.3.4'))
+
+    def test_cost_weighting(self):
+        self.assertEqual(self.limiter.acquire('a', cost=50), 0)
+        self.assertAlmostEqual(self.limiter.acquire('a', cost=20), 10.0)
+        self.assertEqual(self.limiter.acquire('a', cost=10), 0)
+        # Costs above the bucket size drain a full bucket instead of never passing
+        self.assertEqual(self.limiter.acquire('b', cost=1000), 0)
+        self.assertTrue(self.limiter.is_rate_limited('b'))
+
+    def test_request_cost(self):
+        self.assertEqual(RateLimiter.request_cost(5000, 0), 1)
+        self.assertEqual(RateLimiter.request_cost(0, 1000), 1)
+        self.assertEqual(RateLimiter.request_cost(2500, 1000), 3)
+        self.assertEqual(RateLimiter.request_cost('2500', 1000), 3)
+        for invalid in (None, '', 'abc', '-5'):
+            self.assertEqual(RateLimiter.request_cost(invalid, 1000), 1)
+
+    def test_idle_keys_are_evicted(self):
+        backend = MemoryBackend(stripes=1, sweep_interval=30, time_func=self.clock)
+        limiter = RateLimiter(requests_per_minute=60, backend=backend, time_func=self.clock)
+        for i in range(100):
+            limiter.is_rate_limited(f'10.0.0.{i}')
+        self.assertEqual(len(limiter), 100)
+        self.clock.now += 30
+        limiter.is_rate_limited('active')
+        # The sweep only drops buckets that would have refilled completely
+        self.assertEqual(len(limiter), 101)
+        self.clock.now += 31
+        limiter.is_rate_limited('active')
+        self.assertEqual(len(limiter), 1)
+        # An evicted key starts over with a full bucket, as it would have anyway
+        for _ in range(60):
+            self.assertFalse(limiter.is_rate_limited('10.0.0.1'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import threading
+import unittest
+from result_cache import ResultCache, etag_matches
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SlowBackend:
+    """A shared backend whose writes wait until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def put(self, key, value, ttl):
+        self.release.wait(10)
+        self.values[key] = value
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResultCache(max_bytes=100, ttl=60, time_func=self.clock)
+
+    def test_get_put_and_counters(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', b'x' * 10)
+        self.assertEqual(self.cache.get('a'), b'x' * 10)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'entries': 1, 'bytes': 10})
+
+    def test_lru_eviction_respects_memory_budget(self):
+        self.cache.put('a', b'x' * 40)
+        self.cache.put('b', b'x' * 40)
+        self.cache.get('a')
+        self.cache.put('c', b'x' * 40)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertLessEqual(self.cache.stats()['bytes'], 100)
+
+    def test_oversized_entries_are_not_kept(self):
+        self.cache.put('a', b'x' * 101)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['bytes'], 0)
+
+    def test_entries_expire(self):
+        self.cache.put('a', b'payload')
+        self.clock.now += 59
+        self.assertEqual(self.cache.get('a'), b'payload')
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_disk_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory=directory)
+            cache.put('abc', b'{"ok": true}')
+            cache.flush()
+            self.assertTrue(os.path.exists(os.path.join(directory, 'abc.json')))
+            # A fresh instance (e.g. after a restart) finds the persisted entry
+            self.assertEqual(ResultCache(directory=directory).get('abc'), b'{"ok": true}')
+
+    def test_write_through_does_not_wait_for_the_backend(self):
+        backend = SlowBackend()
+        cache = ResultCache(shared=backend)
+        cache.put('abc', b'{"ok": true}')
+        # Served from memory while the shared write is still pending
+        self.assertEqual(cache.get('abc'), b'{"ok": true}')
+        self.assertEqual(backend.values, {})
+        backend.release.set()
+        cache.flush()
+        self.assertEqual(backend.values, {'result:abc': b'{"ok": true}'})
+
+    def test_oversized_entries_are_not_written_through(self):
+        backend = SlowBackend()
+        backend.release.set()
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(max_bytes=10, directory=directory, shared=backend)
+            cache.put('big', b'x' * 11)
+            cache.put('small', b'x' * 10)
+            cache.flush()
+            self.assertEqual(os.listdir(directory), ['small.json'])
+        self.assertEqual(list(backend.values), ['result:small'])
+
+    def test_key_normalizes_parameters(self):
+        key = ResultCache.make_key('digest', 100.0, 'TokenABC ', 1000000.0, 5000000.0, None)
+        self.assertEqual(key, ResultCache.make_key('digest', 100.0, 'tokenabc', 1000000.0, 5000000.0, None))
+        self.assertNotEqual(key, ResultCache.make_key('digest', 100.5, 'tokenabc', 1000000.0, 5000000.0, None))
+        self.assertNotEqual(key, ResultCache.make_key('other', 100.0, 'tokenabc', 1000000.0, 5000000.0, None))
+        self.assertNotEqual(ResultCache.make_key('digest', [('ABC', 1.0, 2.0)]),
+                            ResultCache.make_key('digest', [('abc', 1.0, 2.0)]))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches('W/"b"', '"b"'))
+        self.assertFalse(etag_matches('*', '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import http.client
+import json
+import socket
+import threading
+import time
+import unittest
+from server import make_server
+from test_analyze import build_multipart
+
+CSV_BYTES = (
+    b"Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount\n"
+    b"sig1,2024-03-20 10:00:00,sol,1.0,token123,100\n"
+    b"sig2,2024-03-20 10:01:00,token123,100,sol,1.0\n"
+)
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server('127.0.0.1', 0, threads=4, keep_alive=5)
+        cls.port = cls.server.server_address[1]
+        # Keep access logs and the dropped slow upload out of the test output
+        cls.server.RequestHandlerClass.log_message = lambda *args: None
+        cls.server.handle_error = lambda request, client_address: None
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def post(self, connection, sol_price):
+        fields = {'solPrice': sol_price, 'tokenAddress': 'token123', 'totalSupply': '1000000',
+                  'marketCap': '10000000'}
+        body, content_type = build_multipart(fields, CSV_BYTES)
+        connection.request('POST', '/api/analyze', body, {'Content-Type': content_type})
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_requests_share_a_keep_alive_connection(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        try:
+            status, payload = self.post(connection, '41.5')
+            self.assertEqual(status, 200)
+            sock = connection.sock
+            status, payload = self.post(connection, '42.5')
+            self.assertEqual(status, 200)
+            self.assertIs(connection.sock, sock)
+            self.assertEqual(json.loads(payload)['transactions'][0]['TOKEN2_USD_Price'], 0.425)
+        finally:
+            connection.close()
+
+    def test_cors_headers_follow_the_status_line(self):
+        body, content_type = build_multipart({'solPrice': '45.5', 'tokenAddress': 'token123',
+                                              'totalSupply': '1000000', 'marketCap': '10000000'}, CSV_BYTES)
+        for method, request_body, headers in (
+            ('POST', body, {'Content-Type': content_type}),
+            ('OPTIONS', None, {}),
+            ('GET', None, {})
+        ):
+            with socket.create_connection(('127.0.0.1', self.port), timeout=10) as sock:
+                head = (f'{method} /api/analyze HTTP/1.1\r\nHost: localhost\r\nOrigin: http://localhost:3000\r\n'
+                        f'Connection: close\r\nContent-Length: {len(request_body or b"")}\r\n')
+                head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+                sock.sendall(head.encode() + b'\r\n' + (request_body or b''))
+                response = sock.makefile('rb').read()
+            self.assertTrue(response.startswith(b'HTTP/1.1 '), (method, response[:100]))
+            response_head = response.partition(b'\r\n\r\n')[0].decode('latin-1')
+            self.assertIn('\r\nAccess-Control-Allow-Origin: http://localhost:3000', response_head, method)
+
+    def test_oversized_body_is_refused_before_it_is_read(self):
+        with socket.create_connection(('127.0.0.1', self.port), timeout=10) as sock:
+            sock.sendall(b'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\n'
+                         b'Content-Type: multipart/form-data; boundary=x\r\n'
+                         b'Content-Length: 100000000000\r\n\r\n')
+            response = sock.makefile('rb').read()
+        self.assertTrue(response.startswith(b'HTTP/1.1 413'), response[:100])
+
+    def test_invalid_content_length_is_a_bad_request(self):
+        with socket.create_connection(('127.0.0.1', self.port), timeout=10) as sock:
+            sock.sendall(b'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\n'
+                         b'Content-Type: multipart/form-data; boundary=x\r\n'
+                         b'Content-Length: abc\r\n\r\n')
+            response = sock.makefile('rb').read()
+        self.assertTrue(response.startswith(b'HTTP/1.1 400'), response[:100])
+        self.assertIn(b'Invalid Content-Length header.', response)
+
+    def test_slow_upload_does_not_block_other_requests(self):
+        with socket.create_connection(('127.0.0.1', self.port), timeout=10) as slow:
+            body, content_type = build_multipart({'solPrice': '43.5'}, CSV_BYTES)
+            slow.sendall(f'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(body)}\r\n\r\n'.encode() + body[:20])
+            time.sleep(0.1)
+            connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+            try:
+                status, payload = self.post(connection, '44.5')
+            finally:
+                connection.close()
+            self.assertEqual(status, 200)
+
+
+
+class TestServerLimits(unittest.TestCase):
+    def start(self, **options):
+        server = make_server('127.0.0.1', 0, **options)
+        server.RequestHandlerClass.log_message = lambda *args: None
+        server.handle_error = lambda request, client_address: None
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[1]
+
+    def post(self, port):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            body, content_type = build_multipart({'solPrice': '46.5', 'tokenAddress': 'token123',
+                                                  'totalSupply': '1000000', 'marketCap': '10000000'}, CSV_BYTES)
+            connection.request('POST', '/api/analyze', body, {'Content-Type': content_type})
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def test_trickled_body_is_cut_off_at_the_deadline(self):
+        port = self.start(threads=1, keep_alive=5, body_timeout=0.5)
+        start = time.monotonic()
+        with socket.create_connection(('127.0.0.1', port), timeout=10) as sock:
+            sock.sendall(b'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\n'
+                         b'Content-Type: multipart/form-data; boundary=x\r\nContent-Length: 1000\r\n\r\n')
+            # Each byte arrives well within the idle timeout, but the body as a whole never does
+            with self.assertRaises(OSError):
+                while time.monotonic() - start < 5:
+                    sock.sendall(b'x')
+                    time.sleep(0.05)
+        self.assertLess(time.monotonic() - start, 3)
+        # The only connection thread is free again
+        self.assertEqual(self.post(port), 200)
+
+    def test_connections_beyond_the_queue_are_refused(self):
+        port = self.start(threads=1, max_pending=1, keep_alive=5, body_timeout=10)
+        busy = socket.create_connection(('127.0.0.1', port), timeout=10)
+        busy.sendall(b'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\n'
+                     b'Content-Type: multipart/form-data; boundary=x\r\nContent-Length: 1000\r\n\r\n')
+        time.sleep(0.2)
+        queued = socket.create_connection(('127.0.0.1', port), timeout=10)
+        time.sleep(0.2)
+        with socket.create_connection(('127.0.0.1', port), timeout=10) as refused:
+            response = refused.makefile('rb').read()
+        self.assertTrue(response.startswith(b'HTTP/1.1 503'), response[:100])
+        self.assertIn(b'Retry-After: 5', response)
+
+        # Once both connections are closed and their threads notice, the server takes requests again
+        busy.close()
+        queued.close()
+        deadline = time.monotonic() + 5
+        status = None
+        while time.monotonic() < deadline:
+            try:
+                status = self.post(port)
+            except OSError:
+                # Refused mid-request while the closed connections still held their slots
+                status = None
+            if status == 200:
+                break
+            time.sleep(0.05)
+        self.assertEqual(status, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from rate_limiter import RateLimiter
+from result_cache import ResultCache
+from shared_state import BackendError, MemoryBackend, RedisBackend, SQLiteBackend, backend_from_url
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """A local stand-in speaking just enough of the Redis protocol for RedisBackend"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        # Number of separate reads that carried at least one command
+        self.round_trips = 0
+
+    def live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and time.time() >= expires:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def run(self, command):
+        name = command[0].upper()
+        args = command[1:]
+        if name == b'PING':
+            return b'+PONG\r\n'
+        if name == b'GET':
+            if not self.live(args[0]):
+                return b'$-1\r\n'
+            value = self.data[args[0]]
+            return b'$%d\r\n%s\r\n' % (len(value), value)
+        if name == b'SET':
+            key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+            if b'NX' in options and self.live(key):
+                return b'$-1\r\n'
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if b'PX' in options:
+                self.expires[key] = time.time() + int(options[options.index(b'PX') + 1]) / 1000
+            return b'+OK\r\n'
+        if name in (b'INCRBY', b'DECRBY'):
+            value = int(self.data[args[0]]) if self.live(args[0]) else 0
+            value += int(args[1]) if name == b'INCRBY' else -int(args[1])
+            self.data[args[0]] = str(value).encode()
+            return b':%d\r\n' % value
+        if name == b'PTTL':
+            if not self.live(args[0]):
+                return b':-2\r\n'
+            if args[0] not in self.expires:
+                return b':-1\r\n'
+            return b':%d\r\n' % int((self.expires[args[0]] - time.time()) * 1000)
+        if name == b'PEXPIRE':
+            if not self.live(args[0]):
+                return b':0\r\n'
+            self.expires[args[0]] = time.time() + int(args[1]) / 1000
+            return b':1\r\n'
+        return b'-ERR unknown command\r\n'
+
+
+class FakeRedisHandler(socketserver.BaseRequestHandler):
+    @staticmethod
+    def parse(buffer):
+        """Split complete commands off the front of the buffer"""
+        commands = []
+        while True:
+            try:
+                header, rest = buffer.split(b'\r\n', 1)
+                command = []
+                for _ in range(int(header[1:])):
+                    length_line, rest = rest.split(b'\r\n', 1)
+                    length = int(length_line[1:])
+                    if len(rest) < length + 2:
+                        raise ValueError
+                    command.append(rest[:length])
+                    rest = rest[length + 2:]
+            except ValueError:
+                return commands, buffer
+            commands.append(command)
+            buffer = rest
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        buffer = b''
+        # Commands queued since MULTI, or None outside a transaction
+        transaction = None
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            commands, buffer = self.parse(buffer + data)
+            if not commands:
+                continue
+            # Everything received in one read counts as one round trip
+            replies = []
+            with server.lock:
+                server.round_trips += 1
+                for command in commands:
+                    name = command[0].upper()
+                    if name == b'MULTI':
+                        transaction = []
+                        replies.append(b'+OK\r\n')
+                    elif name == b'EXEC':
+                        results = [server.run(queued) for queued in transaction]
+                        replies.append(b'*%d\r\n' % len(results) + b''.join(results))
+                        transaction = None
+                    elif transaction is not None:
+                        transaction.append(command)
+                        replies.append(b'+QUEUED\r\n')
+                    else:
+                        replies.append(server.run(command))
+            self.request.sendall(b''.join(replies))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BackendContract:
+    """Checks every backend must pass; subclasses provide make_backend()"""
+
+    def test_token_bucket(self):
+        backend = self.make_backend()
+        for _ in range(3):
+            self.assertEqual(backend.take_tokens('ip', 1, 3.0, 0.05, 1000.0), 0)
+        self.assertGreater(backend.take_tokens('ip', 1, 3.0, 0.05, 1000.0), 0)
+        self.assertEqual(backend.take_tokens('other', 1, 3.0, 0.05, 1000.0), 0)
+
+    def test_values(self):
+        backend = self.make_backend()
+        self.assertIsNone(backend.get('missing'))
+        backend.put('key', b'\x00payload', 60)
+        self.assertEqual(backend.get('key'), b'\x00payload')
+
+
+class TestMemoryBackend(BackendContract, unittest.TestCase):
+    def make_backend(self):
+        return MemoryBackend()
+
+
+class TestSQLiteBackend(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'state.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_backend(self):
+        return SQLiteBackend(self.path)
+
+    def test_state_is_shared_between_instances(self):
+        clock = FakeClock()
+        first = RateLimiter(requests_per_minute=2, backend=self.make_backend(), time_func=clock)
+        second = RateLimiter(requests_per_minute=2, backend=self.make_backend(), time_func=clock)
+        self.assertFalse(first.is_rate_limited('ip'))
+        self.assertFalse(second.is_rate_limited('ip'))
+        self.assertTrue(first.is_rate_limited('ip'))
+
+    def test_concurrent_updates_are_not_lost(self):
+        backend = self.make_backend()
+        allowed = []
+
+        def worker():
+            for _ in range(25):
+                allowed.append(backend.take_tokens('ip', 1, 50.0, 0.0, 1000.0) == 0)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(allowed), 50)
+
+
+class TestRedisBackend(BackendContract, unittest.TestCase):
+    def setUp(self):
+        self.server = FakeRedisServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_backend(self, **kwargs):
+        return RedisBackend('127.0.0.1', self.server.server_address[1], **kwargs)
+
+    def test_connections_are_pooled(self):
+        backend = self.make_backend(max_connections=2)
+        for _ in range(20):
+            backend.get('key')
+        self.assertEqual(self.server.connections, 1)
+        backend.close()
+
+    def test_rate_check_is_one_round_trip(self):
+        backend = self.make_backend()
+        limiter = RateLimiter(requests_per_minute=2, backend=backend)
+        self.assertFalse(limiter.is_rate_limited('ip'))
+        self.assertEqual(self.server.round_trips, 1)
+        self.assertFalse(limiter.is_rate_limited('ip'))
+        wait = limiter.acquire('ip')
+        self.assertGreater(wait, 59)
+        self.assertLessEqual(wait, 60)
+        # The rejected request was given back, so the count stays at the limit
+        self.assertEqual(int(self.server.data[b'token-analyzer:rate:ip']), 2)
+
+    def test_window_without_expiry_is_given_one(self):
+        # A counter left at the limit without an expiry used to reject the client for good
+        self.server.data[b'token-analyzer:rate:ip'] = b'2'
+        limiter = RateLimiter(requests_per_minute=2, backend=self.make_backend())
+        wait = limiter.acquire('ip')
+        self.assertGreater(wait, 59)
+        self.assertLessEqual(wait, 60)
+        self.assertEqual(int(self.server.data[b'token-analyzer:rate:ip']), 2)
+        self.assertIn(b'token-analyzer:rate:ip', self.server.expires)
+
+        # Once the window runs out the client is let through again
+        self.server.expires[b'token-analyzer:rate:ip'] = time.time()
+        self.assertEqual(limiter.acquire('ip'), 0)
+        self.assertIn(b'token-analyzer:rate:ip', self.server.expires)
+
+    def test_unreachable_server_fails_open(self):
+        unused = socket.socket()
+        unused.bind(('127.0.0.1', 0))
+        port = unused.getsockname()[1]
+        unused.close()
+        backend = RedisBackend('127.0.0.1', port)
+        with self.assertRaises(BackendError):
+            backend.get('key')
+        self.assertFalse(RateLimiter(requests_per_minute=1, backend=backend).is_rate_limited('ip'))
+        self.assertIsNone(ResultCache(shared=backend).get('key'))
+        # The failed connections went back to the pool as empty slots
+        self.assertEqual(backend.pool.qsize(), 8)
+
+    def test_result_cache_reads_through(self):
+        writer = ResultCache(shared=self.make_backend())
+        reader = ResultCache(shared=self.make_backend())
+        writer.put('abc', b'{"ok": true}')
+        writer.flush()
+        self.assertEqual(reader.get('abc'), b'{"ok": true}')
+        self.assertEqual(reader.stats()['entries'], 1)
+        self.assertIsNone(reader.get('missing'))
+
+
+class TestBackendFromUrl(unittest.TestCase):
+    def test_schemes(self):
+        self.assertIsInstance(backend_from_url(None), MemoryBackend)
+        backend = backend_from_url('redis://:secret@cache.internal:6380/2')
+        self.assertEqual((backend.host, backend.port, backend.db, backend.password),
+                         ('cache.internal', 6380, 2, 'secret'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.db')
+            self.assertEqual(backend_from_url(f'sqlite://{path}').path, path)
+        with self.assertRaises(ValueError):
+            backend_from_url('memcached://localhost')
+
+
+if __name__ == '__main__':
+    unittest.main()
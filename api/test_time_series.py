@@ -0,0 +1,137 @@
+import json
+import unittest
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from parallel import AnalysisExecutor
+from test_helpers import TOKEN_COLUMNS, prepare, random_csv
+from time_series import TimeSeries
+from transaction_engine import TransactionEngine
+
+
+def priced_rows(data, sol_usd_price, total_supply):
+    """Priced buys and sells of token123 as (time, side, SOL, market cap, wallet), sorted by time in Python"""
+    rows = []
+    for line in data.decode().splitlines()[1:]:
+        signature, human_time, token1, amount1, token2, amount2, wallet = line.split(',')
+        token1, token2 = token1.lower(), token2.lower()
+        if token1 in ('sol', 'solana') and token2 == 'token123':
+            side, sol, tokens = 'buy', float(amount1), float(amount2)
+        elif token1 == 'token123' and token2 in ('sol', 'solana'):
+            side, sol, tokens = 'sell', float(amount2), float(amount1)
+        else:
+            continue
+        if tokens > 0:
+            rows.append((datetime.strptime(human_time, '%Y-%m-%d %H:%M:%S'), side, sol,
+                         (sol / tokens) * sol_usd_price * total_supply, wallet.lower()))
+    return sorted(rows, key=lambda row: row[0])
+
+
+def rounded(value, digits):
+    """Round the way the engine does; numpy and Python can differ on values next to a tie"""
+    return float(np.round(value, digits))
+
+
+class TestTimeSeries(unittest.TestCase):
+    def test_timeline_matches_python(self):
+        data = random_csv(1, rows=400)
+        result = TransactionEngine.process_prepared(prepare(data), 150.0, 'token123', 1e6, 1e9, interval=21600)
+        buckets = {}
+        for human_time, side, sol, market_cap, wallet in priced_rows(data, 150.0, 1e6):
+            start = datetime.fromtimestamp(human_time.replace(tzinfo=timezone.utc).timestamp() // 21600 * 21600,
+                                           timezone.utc)
+            buckets.setdefault(start, []).append((side, sol, market_cap))
+
+        expected = [
+            {
+                "Time": start.strftime('%Y-%m-%dT%H:%M:%S'),
+                "Market_Cap_Open": rounded(rows[0][2], 2),
+                "Market_Cap_High": rounded(max(row[2] for row in rows), 2),
+                "Market_Cap_Low": rounded(min(row[2] for row in rows), 2),
+                "Market_Cap_Close": rounded(rows[-1][2], 2),
+                "Buys": sum(row[0] == 'buy' for row in rows),
+                "Sells": sum(row[0] == 'sell' for row in rows),
+                "SOL_Bought": rounded(sum(row[1] for row in rows if row[0] == 'buy'), 4),
+                "SOL_Sold": rounded(sum(row[1] for row in rows if row[0] == 'sell'), 4)
+            }
+            for start, rows in sorted(buckets.items())
+        ]
+        self.assertEqual(result['timeline'], expected)
+        self.assertEqual(len(result['transactions']), 400)
+
+    def test_early_buyers_match_python(self):
+        data = random_csv(2)
+        result = TransactionEngine.process_prepared(prepare(data), 150.0, 'token123', 1e6, 1e9, early_buyers=5)
+        rows = priced_rows(data, 150.0, 1e6)
+        entries = []
+        spent = 0.0
+        for human_time, side, sol, market_cap, wallet in rows:
+            if side == 'buy' and wallet not in [entry[0] for entry in entries]:
+                entries.append((wallet, human_time, market_cap, sol, spent))
+            if side == 'buy':
+                spent += sol
+
+        ranking = result['early_buyers']
+        self.assertEqual(len(ranking), 5)
+        for rank, (entry, (wallet, human_time, market_cap, sol, before)) in enumerate(zip(ranking, entries), 1):
+            total = sum(row[2] for row in rows if row[1] == 'buy' and row[4] == wallet)
+            sold = sum(row[2] for row in rows if row[1] == 'sell' and row[4] == wallet)
+            self.assertEqual(entry, {
+                "Rank": rank,
+                "Wallet": wallet,
+                "First_Buy_Time": human_time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "Entry_Market_Cap_USD": f"${market_cap / 1000000:.2f}M" if market_cap >= 1000000
+                                        else f"${market_cap:,.2f}",
+                "Entry_SOL": f"{sol:.2f} SOL",
+                "SOL_Before_Entry": f"{before:.2f} SOL",
+                "Total_SOL": f"{total:.2f} SOL",
+                "SOL_Sold": f"{sold:.2f} SOL"
+            })
+
+    def test_parts_and_shards_give_the_same_result(self):
+        data = random_csv(3, rows=2000)
+        args = (87.5, 'TOKEN123', 1e6, 1e9)
+        options = dict(interval=3600, early_buyers=10, include_transactions=False)
+        expected = TransactionEngine.process_prepared(prepare(data), *args, **options)
+        self.assertNotIn('transactions', expected)
+        self.assertEqual(
+            json.dumps(TransactionEngine.process_prepared(prepare(data, chunk_rows=300), *args, **options)),
+            json.dumps(expected)
+        )
+        executor = AnalysisExecutor(workers=3, min_rows=1)
+        try:
+            actual = executor.process_prepared(prepare(data, chunk_rows=300), *args, **options)
+        finally:
+            executor.shutdown()
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_times_are_parsed_when_the_validator_did_not(self):
+        # Prepared straight from a DataFrame there are no parsed timestamps, and offsets may differ per row
+        df = pd.DataFrame({
+            'Signature': ['sig1', 'sig2', 'sig3'],
+            'Human Time': ['2024-03-20T10:00:00+02:00', '2024-03-20T07:30:00Z', None],
+            'Token1 Address': ['sol'] * 3,
+            'Token1 Amount': [1.0, 2.0, 4.0],
+            'Token2 Address': ['token123'] * 3,
+            'Token2 Amount': [100.0] * 3,
+            'Wallet': ['a', 'b', 'c']
+        })
+        prepared = TransactionEngine.prepare(df, TOKEN_COLUMNS)
+        self.assertIsNone(prepared.timestamps)
+        series = TimeSeries()
+        priced, price, market_cap, side = TransactionEngine.evaluate(prepared, 100.0, 'token123', 1000)
+        series.add(prepared, priced, market_cap, side)
+        # The row without a time is left out
+        self.assertEqual(len(series), 2)
+        self.assertEqual([entry['Wallet'] for entry in series.early_buyers(5)], ['b', 'a'])
+        self.assertEqual([bucket['Time'] for bucket in series.timeline(3600)],
+                         ['2024-03-20T07:00:00', '2024-03-20T08:00:00'])
+
+    def test_no_priced_rows(self):
+        series = TimeSeries()
+        self.assertEqual(series.timeline(60), [])
+        self.assertEqual(series.early_buyers(3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+import unittest
+import json
+import re
+import numpy as np
+import pandas as pd
+from test_helpers import TOKEN_COLUMNS
+from transaction_engine import TransactionEngine
+
+
+def _parse_numeric(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = re.sub(r'[^\d.-]', '', value)
+        return float(value)
+    raise ValueError(f"Invalid numeric value: {value}")
+
+
+def reference_process_transactions(df, sol_usd_price, token_address, total_supply, market_cap_threshold, token_columns):
+    """The original df.iterrows() implementation, extended to sells, kept as the equivalence oracle"""
+    transactions = []
+    whale_data = {}
+    sol_sold = {}
+    sol_spent = {}
+    for index, row in df.iterrows():
+        transaction = {
+            "Signature": row["Signature"],
+            "Human Time": row["Human Time"]
+        }
+        token1_address = str(row[token_columns['token1_address']]).lower()
+        token2_address = str(row[token_columns['token2_address']]).lower()
+        is_buy = token1_address in ("sol", "solana") and token2_address == token_address.lower()
+        is_sell = token1_address == token_address.lower() and token2_address in ("sol", "solana")
+        side = "buy" if is_buy else "sell" if is_sell else "N/A"
+        wallet_column = token_columns.get('wallet')
+        if wallet_column and wallet_column in row:
+            wallet_address = str(row[wallet_column]).lower()
+        else:
+            wallet_address = "unknown"
+        if is_buy or is_sell:
+            try:
+                token1_amount = _parse_numeric(row[token_columns['token1_amount']])
+                token2_amount = _parse_numeric(row[token_columns['token2_amount']])
+                sol_amount, token_amount = (token1_amount, token2_amount) if is_buy else (token2_amount, token1_amount)
+                if token_amount > 0:
+                    token2_usd_price = (sol_amount / token_amount) * sol_usd_price
+                    market_cap_usd = token2_usd_price * total_supply
+                    transaction["TOKEN2_USD_Price"] = round(token2_usd_price, 4)
+                    transaction["Market_Cap_USD"] = round(market_cap_usd, 2)
+                    if is_sell:
+                        sol_sold[wallet_address] = sol_sold.get(wallet_address, 0) + sol_amount
+                    else:
+                        sol_spent[wallet_address] = sol_spent.get(wallet_address, 0) + sol_amount
+                    if is_buy and market_cap_usd < market_cap_threshold:
+                        if wallet_address not in whale_data:
+                            whale_data[wallet_address] = {"sol_invested": 0, "market_caps": []}
+                        whale_data[wallet_address]["sol_invested"] += sol_amount
+                        whale_data[wallet_address]["market_caps"].append(market_cap_usd)
+                else:
+                    transaction["TOKEN2_USD_Price"] = "N/A"
+                    transaction["Market_Cap_USD"] = "N/A"
+            except (ValueError, TypeError):
+                transaction["TOKEN2_USD_Price"] = "N/A"
+                transaction["Market_Cap_USD"] = "N/A"
+        else:
+            transaction["TOKEN2_USD_Price"] = "N/A"
+            transaction["Market_Cap_USD"] = "N/A"
+        transaction["Side"] = side
+        transactions.append(transaction)
+
+    whale_report = []
+    for wallet, data in whale_data.items():
+        total_sol = data["sol_invested"]
+        total_usd = total_sol * sol_usd_price
+        avg_market_cap = sum(data["market_caps"]) / len(data["market_caps"]) if data["market_caps"] else 0
+        sold = sol_sold.get(wallet, 0.0)
+        whale_report.append({
+            "Wallet": wallet,
+            "Total_SOL": f"{total_sol:.2f} SOL",
+            "Total_USD": f"${total_usd:,.2f}",
+            "Avg_Market_Cap_USD": f"${avg_market_cap / 1000000:.2f}M" if avg_market_cap >= 1000000 else f"${avg_market_cap:,.2f}",
+            "SOL_Sold": f"{sold:.2f} SOL",
+            "Net_SOL": f"{sold - sol_spent[wallet]:.2f} SOL"
+        })
+    whale_report.sort(key=lambda x: float(x["Total_SOL"].split()[0]), reverse=True)
+    return {"transactions": transactions, "whale_report": whale_report}
+
+
+class TestTransactionEngine(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'Signature': ['sig1', 'sig2', 'sig3', 'sig4', 'sig5', 'sig6', 'sig7', 'sig8', 'sig9', 'sig10'],
+            'Human Time': ['2024-03-20 10:00:00'] * 10,
+            'Token1 Address': ['SOL', 'solana', 'sol', 'token123', 'sol', 'sol', 'Sol', 'sol', np.nan, 'sol'],
+            'Token1 Amount': ['1.5', '$2,000.25', '3', '100', 'abc', '0.5', '4.0', '7', '1', '2'],
+            'Token2 Address': ['TOKEN123', 'token123', 'token123', 'sol', 'token123', 'token123',
+                               'token123', 'other', 'token123', 'token123'],
+            'Token2 Amount': ['100', '1,000,000', '0', '2', '10', '50', '-', '70', '10', '1e3'],
+            'Wallet': ['WalletA', 'walletb', 'walleta', 'walletc', 'walletd', 'WALLETB', 'wallete',
+                       'walletf', 'walletg', 'walleth']
+        })
+
+    def _assert_equivalent(self, df, *args, token_columns=TOKEN_COLUMNS):
+        expected = reference_process_transactions(df, *args, token_columns)
+        actual = TransactionEngine.process(df, *args, token_columns)
+        # json.dumps keeps NaN comparable and checks the result is serializable the same way
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_matches_row_loop(self):
+        self._assert_equivalent(self.df, 100.0, 'token123', 1000000, 10000000)
+
+    def test_matches_row_loop_with_low_threshold(self):
+        self._assert_equivalent(self.df, 170.5, 'TOKEN123', 999982230.99, 1500000)
+
+    def test_matches_row_loop_without_wallet_column(self):
+        token_columns = {k: v for k, v in TOKEN_COLUMNS.items() if k != 'wallet'}
+        self._assert_equivalent(self.df.drop(columns=['Wallet']), 100.0, 'token123', 1000000, 10000000,
+                                token_columns=token_columns)
+
+    def test_matches_row_loop_with_numeric_columns(self):
+        df = self.df.copy()
+        df['Token1 Amount'] = [1.5, 2.0, 3.0, 100.0, np.nan, 0.5, 4.0, 7.0, 1.0, 2.0]
+        df['Token2 Amount'] = [100, 1000000, 0, 2, 10, 50, 3, 70, 10, 1000]
+        self._assert_equivalent(df, 100.0, 'token123', 1000000, 10000000)
+
+    def test_matches_row_loop_with_categorical_addresses(self):
+        df = self.df.astype({'Token1 Address': 'category', 'Token2 Address': 'category', 'Wallet': 'category'})
+        self._assert_equivalent(df, 100.0, 'token123', 1000000, 10000000)
+
+    def test_matches_row_loop_on_empty_frame(self):
+        self._assert_equivalent(self.df.iloc[0:0], 100.0, 'token123', 1000000, 10000000)
+
+    def test_chunked_processing_matches_single_frame(self):
+        expected = TransactionEngine.process(self.df, 100.0, 'token123', 1000000, 10000000, TOKEN_COLUMNS)
+        chunks = [self.df.iloc[start:start + 3] for start in range(0, len(self.df), 3)]
+        actual = TransactionEngine.process_chunks(chunks, 100.0, 'token123', 1000000, 10000000, TOKEN_COLUMNS)
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+    def test_prepared_columns_can_be_reevaluated(self):
+        parts = list(TransactionEngine.prepare_chunks([self.df.iloc[:4], self.df.iloc[4:]], TOKEN_COLUMNS))
+        self.assertGreater(sum(part.nbytes for part in parts), 0)
+        for args in ((100.0, 'token123', 1000000, 10000000), (55.5, 'TOKEN123', 2000000, 1000), (1.0, 'sol', 1, 1)):
+            expected = TransactionEngine.process(self.df, *args, TOKEN_COLUMNS)
+            self.assertEqual(json.dumps(TransactionEngine.process_prepared(parts, *args)), json.dumps(expected))
+
+    def test_columnar_result_matches_records(self):
+        args = (100.0, 'token123', 1000000, 10000000, TOKEN_COLUMNS)
+        records = TransactionEngine.process(self.df, *args)
+        parts = list(TransactionEngine.prepare_chunks([self.df.iloc[:4], self.df.iloc[4:]], TOKEN_COLUMNS))
+        columns = TransactionEngine.process_prepared(parts, *args[:4], columnar=True)
+        self.assertEqual(columns['whale_report'], records['whale_report'])
+        self.assertEqual(list(columns['transactions']), list(TransactionEngine.TRANSACTION_FIELDS))
+        for field, values in columns['transactions'].items():
+            expected = [record[field] for record in records['transactions']]
+            self.assertEqual(values, [None if value == 'N/A' else value for value in expected])
+
+    def test_multi_token_matches_per_token_runs(self):
+        df = self.df.copy()
+        df['Token2 Address'] = ['TOKEN123', 'other', 'token123', 'sol', 'Other', 'token123',
+                                'token123', 'other', 'token123', 'third']
+        parts = list(TransactionEngine.prepare_chunks([df.iloc[:4], df.iloc[4:]], TOKEN_COLUMNS))
+        tokens = [('token123', 1000000, 10000000), ('OTHER', 2000000, 1000), ('missing', 1, 1)]
+        results = TransactionEngine.process_tokens(parts, 100.0, tokens)
+        self.assertEqual([result['tokenAddress'] for result in results], ['token123', 'OTHER', 'missing'])
+        for (token_address, total_supply, threshold), result in zip(tokens, results):
+            is_sell = (df['Token1 Address'].str.lower() == token_address.lower()) & (df['Token2 Address'] == 'sol')
+            subset = df[(df['Token2 Address'].str.lower() == token_address.lower()) | is_sell]
+            expected = TransactionEngine.process(subset, 100.0, token_address, total_supply, threshold, TOKEN_COLUMNS)
+            self.assertEqual(json.dumps({k: v for k, v in result.items() if k != 'tokenAddress'}), json.dumps(expected))
+
+    def test_sells_are_priced_in_the_same_pass(self):
+        result = TransactionEngine.process(self.df, 100.0, 'token123', 1000000, 10000000, TOKEN_COLUMNS)
+        sell = result['transactions'][3]
+        self.assertEqual(sell['Side'], 'sell')
+        self.assertEqual(sell['TOKEN2_USD_Price'], 2.0)
+        self.assertEqual(result['transactions'][7]['Side'], 'N/A')
+
+    def test_net_sol_counts_buys_above_the_threshold(self):
+        df = pd.DataFrame({
+            'Signature': ['sig1', 'sig2', 'sig3'],
+            'Human Time': ['2024-03-20 10:00:00'] * 3,
+            'Token1 Address': ['sol', 'sol', 'token123'],
+            'Token1 Amount': [1.0, 100.0, 1000.0],
+            'Token2 Address': ['token123', 'token123', 'sol'],
+            'Token2 Amount': [1000.0, 1000.0, 101.0],
+            'Wallet': ['walleta'] * 3
+        })
+        result = TransactionEngine.process(df, 100.0, 'token123', 1000000, 1000000, TOKEN_COLUMNS)
+        self.assertEqual(result['whale_report'][0]['Total_SOL'], '1.00 SOL')
+        self.assertEqual(result['whale_report'][0]['Net_SOL'], '0.00 SOL')
+        self._assert_equivalent(df, 100.0, 'token123', 1000000, 1000000)
+
+    def test_unparseable_amounts_are_not_priced(self):
+        result = TransactionEngine.process(self.df, 100.0, 'token123', 1000000, 10000000, TOKEN_COLUMNS)
+        transactions = result['transactions']
+        self.assertEqual(transactions[4]['TOKEN2_USD_Price'], 'N/A')
+        self.assertEqual(transactions[6]['TOKEN2_USD_Price'], 'N/A')
+        self.assertEqual(transactions[0]['TOKEN2_USD_Price'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
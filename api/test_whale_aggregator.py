@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+from whale_aggregator import WhaleAggregator
+
+
+class TestWhaleAggregator(unittest.TestCase):
+    def setUp(self):
+        self.labels = np.array(['a', 'b', 'c', 'd', 'e'], dtype=object)
+        self.codes = np.array([1, 0, 1, 2, 3, 4, 2, 0])
+        self.sol = np.array([1.0, 5.0, 2.0, 3.0, 3.0, 0.5, 1.0, 1.0])
+        self.market_caps = np.array([100.0, 200.0, 300.0, 400.0, 500.0, 2000000.0, 600.0, 800.0])
+
+    def _aggregator(self):
+        aggregator = WhaleAggregator()
+        aggregator.add(self.codes, self.labels, self.sol, self.market_caps)
+        aggregator.add_spent(self.codes, self.labels, self.sol)
+        return aggregator
+
+    def test_sums_and_averages_per_wallet(self):
+        report = self._aggregator().report(100.0)
+        self.assertEqual([entry['Wallet'] for entry in report], ['a', 'c', 'b', 'd', 'e'])
+        self.assertEqual(report[0], {
+            "Wallet": "a",
+            "Total_SOL": "6.00 SOL",
+            "Total_USD": "$600.00",
+            "Avg_Market_Cap_USD": "$500.00",
+            "SOL_Sold": "0.00 SOL",
+            "Net_SOL": "-6.00 SOL"
+        })
+        self.assertEqual(report[4]['Avg_Market_Cap_USD'], "$2.00M")
+
+    def test_sells_are_netted_and_sell_only_wallets_hidden(self):
+        aggregator = self._aggregator()
+        aggregator.add_sells(np.array([0, 4, 0]), np.array(['a', 'f', 'g', 'h', 'z'], dtype=object),
+                             np.array([2.0, 9.0, 1.5]))
+        report = aggregator.report(100.0)
+        self.assertEqual([entry['Wallet'] for entry in report], ['a', 'c', 'b', 'd', 'e'])
+        self.assertEqual(report[0]['SOL_Sold'], '3.50 SOL')
+        self.assertEqual(report[0]['Net_SOL'], '-2.50 SOL')
+        self.assertEqual(aggregator.report(100.0, 2), report[:2])
+
+    def test_net_counts_buys_at_any_market_cap(self):
+        # b also bought 100 SOL above the threshold, then sold everything for 106 SOL
+        aggregator = self._aggregator()
+        aggregator.add_spent(np.array([1]), self.labels, np.array([100.0]))
+        aggregator.add_sells(np.array([1]), self.labels, np.array([106.0]))
+        entry = [entry for entry in aggregator.report(1.0) if entry['Wallet'] == 'b'][0]
+        self.assertEqual(entry['Total_SOL'], '3.00 SOL')
+        self.assertEqual(entry['Net_SOL'], '3.00 SOL')
+
+    def test_ties_keep_first_seen_order(self):
+        # b and d both total 3.0 SOL, b was seen first
+        report = self._aggregator().report(1.0)
+        self.assertEqual(report[2]['Wallet'], 'b')
+        self.assertEqual(report[3]['Wallet'], 'd')
+
+    def test_top_n_matches_full_sort(self):
+        aggregator = self._aggregator()
+        full = aggregator.report(1.0)
+        for top_n in range(0, 7):
+            self.assertEqual(aggregator.report(1.0, top_n), full[:top_n])
+
+    def test_top_n_with_many_ties(self):
+        aggregator = WhaleAggregator()
+        labels = np.array([f'w{i}' for i in range(50)], dtype=object)
+        codes = np.arange(50)
+        aggregator.add(codes, labels, np.array([float(i % 3) for i in range(50)]), np.ones(50))
+        full = aggregator.report(1.0)
+        self.assertEqual(aggregator.report(1.0, 10), full[:10])
+
+    def test_merge_equals_single_pass(self):
+        left = WhaleAggregator()
+        left.add(self.codes[:3], self.labels, self.sol[:3], self.market_caps[:3])
+        left.add_spent(self.codes[:3], self.labels, self.sol[:3])
+        right = WhaleAggregator()
+        right.add(self.codes[3:], self.labels, self.sol[3:], self.market_caps[3:])
+        right.add_spent(self.codes[3:], self.labels, self.sol[3:])
+        left.merge(right)
+        self.assertEqual(left.report(100.0), self._aggregator().report(100.0))
+
+    def test_empty(self):
+        aggregator = WhaleAggregator()
+        aggregator.add(np.zeros(0, dtype=np.intp), self.labels, np.zeros(0), np.zeros(0))
+        self.assertEqual(len(aggregator), 0)
+        self.assertEqual(aggregator.report(100.0), [])
+        self.assertEqual(aggregator.report(100.0, 5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import fast_path
+
+
+class TimeSeries:
+    """Priced rows in time order, for the market cap timeline and the early buyer ranking.
+
+    Only what the two reports need is kept for each priced row: its time,
+    market cap, side, SOL amount and wallet. Parts are appended in file
+    order and sorted by time once, on first use; the sort is stable, so
+    rows with the same timestamp stay in file order.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._sorted = None
+
+    def __len__(self):
+        return sum(len(part[0]) for part in self._parts)
+
+    @staticmethod
+    def _timestamps(prepared):
+        """Row times as datetime64[ns], parsing 'Human Time' only when the validator could not"""
+        if prepared.timestamps is not None:
+            return prepared.timestamps
+        # Mixed UTC offsets have no single datetime64 column; normalize them to naive UTC
+        parsed = pd.to_datetime(pd.Series(prepared.times, dtype=object), format='mixed', utc=True, errors='coerce')
+        return parsed.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+
+    def add(self, prepared, priced, market_cap, side):
+        """Keep the priced rows of one evaluated PreparedTransactions part"""
+        if not len(prepared):
+            return
+        times = self._timestamps(prepared)
+        with np.errstate(invalid='ignore'):
+            keep = priced & ~np.isnat(times) & np.isfinite(market_cap)
+        if not keep.any():
+            return
+        is_sell = side == fast_path.SELL
+        sol_amount = np.where(is_sell, prepared.token2_amount, prepared.token1_amount)
+        self._parts.append((
+            times[keep].view(np.int64),
+            market_cap[keep],
+            side[keep],
+            sol_amount[keep],
+            prepared.wallet_labels[prepared.wallet_codes[keep]]
+        ))
+        self._sorted = None
+
+    def merge(self, other):
+        """Append the rows of another TimeSeries, which must come later in the file"""
+        self._parts.extend(other._parts)
+        self._sorted = None
+
+    def _columns(self):
+        """(times, market caps, sides, SOL amounts, wallets) of every kept row, sorted by time"""
+        if self._sorted is None:
+            if self._parts:
+                columns = [np.concatenate(values) for values in zip(*self._parts)]
+            else:
+                columns = [np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int8), np.zeros(0),
+                           np.zeros(0, dtype=object)]
+            order = np.argsort(columns[0], kind='stable')
+            self._sorted = [values[order] for values in columns]
+        return self._sorted
+
+    def timeline(self, interval_seconds):
+        """
+        Market cap open/high/low/close and buy and sell volume per time bucket.
+        Buckets start at multiples of the interval since the epoch; buckets
+        without trades are left out.
+        """
+        times, market_cap, side, sol_amount, _ = self._columns()
+        if not len(times):
+            return []
+        buckets = times // (interval_seconds * 1000000000)
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.append(starts[1:], len(times)) - 1
+        is_buy = side == fast_path.BUY
+        is_sell = side == fast_path.SELL
+
+        bucket_times = np.datetime_as_string(
+            (buckets[starts] * interval_seconds).astype('datetime64[s]'), unit='s'
+        ).tolist()
+        columns = zip(
+            bucket_times,
+            np.round(market_cap[starts], 2).tolist(),
+            np.round(np.maximum.reduceat(market_cap, starts), 2).tolist(),
+            np.round(np.minimum.reduceat(market_cap, starts), 2).tolist(),
+            np.round(market_cap[ends], 2).tolist(),
+            np.add.reduceat(is_buy.astype(np.int64), starts).tolist(),
+            np.add.reduceat(is_sell.astype(np.int64), starts).tolist(),
+            np.round(np.add.reduceat(np.where(is_buy, sol_amount, 0.0), starts), 4).tolist(),
+            np.round(np.add.reduceat(np.where(is_sell, sol_amount, 0.0), starts), 4).tolist()
+        )
+        return [
+            {
+                "Time": bucket_time,
+                "Market_Cap_Open": market_cap_open,
+                "Market_Cap_High": market_cap_high,
+                "Market_Cap_Low": market_cap_low,
+                "Market_Cap_Close": market_cap_close,
+                "Buys": buys,
+                "Sells": sells,
+                "SOL_Bought": sol_bought,
+                "SOL_Sold": sol_sold
+            }
+            for (bucket_time, market_cap_open, market_cap_high, market_cap_low, market_cap_close, buys, sells,
+                 sol_bought, sol_sold) in columns
+        ]
+
+    def early_buyers(self, count):
+        """
+        The first `count` wallets to buy, in order of their first buy, with the
+        market cap they entered at, the SOL all earlier buyers had put in by
+        then, and their total SOL bought and sold over the whole file.
+        """
+        times, market_cap, side, sol_amount, wallets = self._columns()
+        is_buy = side == fast_path.BUY
+        buy_sol = sol_amount[is_buy]
+        # Codes are assigned in order of first appearance, i.e. of first buy
+        codes, buyers = pd.factorize(wallets[is_buy])
+        if not len(buyers):
+            return []
+        first = np.unique(codes, return_index=True)[1][:count]
+        spent_before = np.cumsum(buy_sol) - buy_sol
+        total_sol = np.bincount(codes, weights=buy_sol, minlength=len(buyers))
+
+        is_sell = side == fast_path.SELL
+        sellers = pd.Index(buyers).get_indexer(wallets[is_sell])
+        known = sellers >= 0
+        sol_sold = np.bincount(sellers[known], weights=sol_amount[is_sell][known], minlength=len(buyers))
+
+        first_times = np.datetime_as_string(times[is_buy][first].astype('datetime64[ns]'), unit='s').tolist()
+        rows = zip(
+            buyers[:len(first)].tolist(), first_times, market_cap[is_buy][first].tolist(), buy_sol[first].tolist(),
+            spent_before[first].tolist(), total_sol[:len(first)].tolist(), sol_sold[:len(first)].tolist()
+        )
+        return [
+            {
+                "Rank": rank,
+                "Wallet": wallet,
+                "First_Buy_Time": first_time,
+                "Entry_Market_Cap_USD": fast_path.format_market_cap(entry_market_cap),
+                "Entry_SOL": f"{entry_sol:.2f} SOL",
+                "SOL_Before_Entry": f"{before:.2f} SOL",
+                "Total_SOL": f"{total:.2f} SOL",
+                "SOL_Sold": f"{sold:.2f} SOL"
+            }
+            for rank, (wallet, first_time, entry_market_cap, entry_sol, before, total, sold) in enumerate(rows, 1)
+        ]
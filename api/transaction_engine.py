@@ -0,0 +1,439 @@
+import itertools
+import sys
+import numpy as np
+import pandas as pd
+import metrics
+import time_series
+import whale_aggregator
+
+
+class PreparedTransactions:
+    """Column arrays extracted once from a transactions DataFrame.
+
+    Nothing in here depends on the request parameters (SOL price, token
+    address, supply or threshold), so the same instance can be evaluated
+    against any of them.
+    """
+
+    def __init__(self, signatures, times, token1_codes, token1_labels, token2_codes, token2_labels,
+                 token1_amount, token1_valid, token2_amount, token2_valid, wallet_codes, wallet_labels,
+                 timestamps=None):
+        self.signatures = signatures
+        self.times = times
+        # Parsed 'Human Time' as datetime64[ns], when the validator provided it
+        self.timestamps = timestamps
+        # Addresses are stored as integer codes into lowercased label arrays
+        self.token1_codes = token1_codes
+        self.token1_labels = token1_labels
+        self.token2_codes = token2_codes
+        self.token2_labels = token2_labels
+        # Amounts are float arrays; *_valid is False where a string could not be parsed
+        self.token1_amount = token1_amount
+        self.token1_valid = token1_valid
+        self.token2_amount = token2_amount
+        self.token2_valid = token2_valid
+        self.wallet_codes = wallet_codes
+        self.wallet_labels = wallet_labels
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def take(self, mask):
+        """Return the rows selected by a boolean mask as a new PreparedTransactions"""
+        return PreparedTransactions(
+            signatures=list(itertools.compress(self.signatures, mask)),
+            times=list(itertools.compress(self.times, mask)),
+            token1_codes=self.token1_codes[mask],
+            token1_labels=self.token1_labels,
+            token2_codes=self.token2_codes[mask],
+            token2_labels=self.token2_labels,
+            token1_amount=self.token1_amount[mask],
+            token1_valid=self.token1_valid[mask],
+            token2_amount=self.token2_amount[mask],
+            token2_valid=self.token2_valid[mask],
+            wallet_codes=self.wallet_codes[mask],
+            wallet_labels=self.wallet_labels,
+            timestamps=None if self.timestamps is None else self.timestamps[mask]
+        )
+
+    def select(self, indices):
+        """Return the rows at the given positions as a new PreparedTransactions"""
+        positions = indices.tolist()
+        return PreparedTransactions(
+            signatures=[self.signatures[i] for i in positions],
+            times=[self.times[i] for i in positions],
+            token1_codes=self.token1_codes[indices],
+            token1_labels=self.token1_labels,
+            token2_codes=self.token2_codes[indices],
+            token2_labels=self.token2_labels,
+            token1_amount=self.token1_amount[indices],
+            token1_valid=self.token1_valid[indices],
+            token2_amount=self.token2_amount[indices],
+            token2_valid=self.token2_valid[indices],
+            wallet_codes=self.wallet_codes[indices],
+            wallet_labels=self.wallet_labels,
+            timestamps=None if self.timestamps is None else self.timestamps[indices]
+        )
+
+    def slice(self, start, stop):
+        """Return rows start:stop as a new PreparedTransactions sharing the label arrays"""
+        return PreparedTransactions(
+            signatures=self.signatures[start:stop],
+            times=self.times[start:stop],
+            token1_codes=self.token1_codes[start:stop],
+            token1_labels=self.token1_labels,
+            token2_codes=self.token2_codes[start:stop],
+            token2_labels=self.token2_labels,
+            token1_amount=self.token1_amount[start:stop],
+            token1_valid=self.token1_valid[start:stop],
+            token2_amount=self.token2_amount[start:stop],
+            token2_valid=self.token2_valid[start:stop],
+            wallet_codes=self.wallet_codes[start:stop],
+            wallet_labels=self.wallet_labels,
+            timestamps=None if self.timestamps is None else self.timestamps[start:stop]
+        )
+
+    @property
+    def nbytes(self):
+        """Approximate memory footprint, used to budget caches of prepared data"""
+        arrays = (self.token1_codes, self.token2_codes, self.token1_amount, self.token1_valid,
+                  self.token2_amount, self.token2_valid, self.wallet_codes)
+        objects = (self.signatures, self.times, self.token1_labels, self.token2_labels, self.wallet_labels)
+        if self.timestamps is not None:
+            arrays += (self.timestamps,)
+        return (sum(array.nbytes for array in arrays)
+                + sum(sys.getsizeof(values) + sum(map(sys.getsizeof, values)) for values in objects))
+
+
+class TransactionEngine:
+    SOL_ADDRESSES = ('sol', 'solana')
+    UNKNOWN_WALLET = 'unknown'
+    # Anything that is not a digit, a dot or a minus sign is stripped from amounts
+    NUMERIC_JUNK = r'[^\d.-]'
+    TRANSACTION_FIELDS = ('Signature', 'Human Time', 'TOKEN2_USD_Price', 'Market_Cap_USD', 'Side')
+    # Swap direction of each row relative to the target token
+    BUY = 1
+    SELL = -1
+    SIDE_NAMES = {BUY: 'buy', SELL: 'sell'}
+
+    @staticmethod
+    def encode_addresses(series):
+        """Encode a column as integer codes into an array of lowercased labels"""
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        # Lowercase the distinct values only, then merge labels that differ by case
+        lowered = np.array([str(value).lower() for value in uniques], dtype=object)
+        merged_codes, labels = pd.factorize(lowered)
+        return merged_codes[codes], np.asarray(labels, dtype=object)
+
+    @staticmethod
+    def parse_numeric_column(series):
+        """Parse an amount column, returning float values and a validity mask"""
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            return values, np.ones(len(values), dtype=bool)
+
+        if pd.api.types.is_string_dtype(series) and series.dtype != object:
+            # A text column holds nothing but strings and missing values, so it is
+            # cleaned in place without the round trip through Python objects
+            is_text = series.notna().to_numpy()
+            text = series.str.replace(TransactionEngine.NUMERIC_JUNK, '', regex=True)
+            values = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            return values, ~(is_text & np.isnan(values))
+
+        # Strings are cleaned of currency symbols and commas; other values pass through
+        objects = series.astype(object)
+        try:
+            text = objects.str.replace(TransactionEngine.NUMERIC_JUNK, '', regex=True)
+        except AttributeError:
+            # The .str accessor refuses columns without a single string value
+            text = pd.Series(np.nan, index=objects.index, dtype=object)
+        is_text = text.notna().to_numpy()
+        parsed = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        passthrough = pd.to_numeric(objects.where(~is_text), errors='coerce')
+        values = np.where(is_text, parsed, passthrough.to_numpy(dtype=np.float64, na_value=np.nan))
+
+        # A string that is left empty or malformed after cleaning is a parse failure
+        valid = ~(is_text & np.isnan(parsed))
+        return values, valid
+
+    @staticmethod
+    def prepare(df, token_columns, timestamps=None):
+        """Extract the columns needed for pricing into a PreparedTransactions"""
+        token1_codes, token1_labels = TransactionEngine.encode_addresses(df[token_columns['token1_address']])
+        token2_codes, token2_labels = TransactionEngine.encode_addresses(df[token_columns['token2_address']])
+        token1_amount, token1_valid = TransactionEngine.parse_numeric_column(df[token_columns['token1_amount']])
+        token2_amount, token2_valid = TransactionEngine.parse_numeric_column(df[token_columns['token2_amount']])
+
+        wallet_column = token_columns.get('wallet')
+        if wallet_column and wallet_column in df.columns:
+            wallet_codes, wallet_labels = TransactionEngine.encode_addresses(df[wallet_column])
+        else:
+            wallet_codes = np.zeros(len(df), dtype=np.intp)
+            wallet_labels = np.array([TransactionEngine.UNKNOWN_WALLET], dtype=object)
+
+        return PreparedTransactions(
+            signatures=df['Signature'].tolist(),
+            times=df['Human Time'].tolist(),
+            token1_codes=token1_codes,
+            token1_labels=token1_labels,
+            token2_codes=token2_codes,
+            token2_labels=token2_labels,
+            token1_amount=token1_amount,
+            token1_valid=token1_valid,
+            token2_amount=token2_amount,
+            token2_valid=token2_valid,
+            wallet_codes=wallet_codes,
+            wallet_labels=wallet_labels,
+            timestamps=timestamps
+        )
+
+    @staticmethod
+    def evaluate(prepared, sol_usd_price, token_address, total_supply):
+        """
+        Classify every row as a buy (SOL -> target), a sell (target -> SOL) or
+        neither, and compute price and market cap arrays for both directions.
+        """
+        target = token_address.lower()
+        token1_is_sol = np.isin(prepared.token1_labels, TransactionEngine.SOL_ADDRESSES)[prepared.token1_codes]
+        token2_is_sol = np.isin(prepared.token2_labels, TransactionEngine.SOL_ADDRESSES)[prepared.token2_codes]
+        token1_is_target = (prepared.token1_labels == target)[prepared.token1_codes]
+        token2_is_target = (prepared.token2_labels == target)[prepared.token2_codes]
+
+        side = np.zeros(len(prepared), dtype=np.int8)
+        side[token1_is_sol & token2_is_target] = TransactionEngine.BUY
+        side[token1_is_target & token2_is_sol] = TransactionEngine.SELL
+        is_sell = side == TransactionEngine.SELL
+
+        # SOL is token1 of a buy and token2 of a sell; the target token is the other side
+        sol_amount = np.where(is_sell, prepared.token2_amount, prepared.token1_amount)
+        token_amount = np.where(is_sell, prepared.token1_amount, prepared.token2_amount)
+
+        # A row is priced when it is a swap of the target against SOL with parseable amounts
+        # and a positive target amount
+        with np.errstate(invalid='ignore'):
+            priced = ((side != 0) & prepared.token1_valid & prepared.token2_valid
+                      & (token_amount > 0))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price = (sol_amount / token_amount) * sol_usd_price
+        market_cap = price * total_supply
+        return priced, price, market_cap, side
+
+    @staticmethod
+    def build_transactions(prepared, priced, price, market_cap, side):
+        """Serialize per-row results into the transactions list of the response"""
+        side_names = TransactionEngine.SIDE_NAMES
+        return [
+            {
+                "Signature": signature,
+                "Human Time": human_time,
+                "TOKEN2_USD_Price": round(row_price, 4) if is_priced else "N/A",
+                "Market_Cap_USD": round(row_market_cap, 2) if is_priced else "N/A",
+                "Side": side_names.get(row_side, "N/A")
+            }
+            for signature, human_time, row_price, row_market_cap, is_priced, row_side in zip(
+                prepared.signatures, prepared.times, price.tolist(), market_cap.tolist(), priced.tolist(),
+                side.tolist()
+            )
+        ]
+
+    @staticmethod
+    def build_columns(prepared, priced, price, market_cap, side):
+        """Serialize per-row results as one list per field, with None for unpriced rows"""
+        priced = priced.tolist()
+        side_names = TransactionEngine.SIDE_NAMES
+        return {
+            "Signature": list(prepared.signatures),
+            "Human Time": list(prepared.times),
+            "TOKEN2_USD_Price": [
+                round(row_price, 4) if is_priced else None
+                for row_price, is_priced in zip(price.tolist(), priced)
+            ],
+            "Market_Cap_USD": [
+                round(row_market_cap, 2) if is_priced else None
+                for row_market_cap, is_priced in zip(market_cap.tolist(), priced)
+            ],
+            "Side": [side_names.get(row_side) for row_side in side.tolist()]
+        }
+
+    @staticmethod
+    def skip_transactions(prepared, priced, price, market_cap, side):
+        """Builder for responses without per-row records"""
+        return None
+
+    @staticmethod
+    def accumulate_whales(aggregator, prepared, priced, market_cap, side, market_cap_threshold):
+        """
+        Add priced buys below the market cap threshold to a WhaleAggregator,
+        along with every priced buy and sell, so whales' SOL put in and taken
+        out is counted at whatever market cap they traded.
+        """
+        buy_mask = priced & (side == TransactionEngine.BUY)
+        with np.errstate(invalid='ignore'):
+            whale_mask = buy_mask & (market_cap < market_cap_threshold)
+        aggregator.add(
+            prepared.wallet_codes[whale_mask],
+            prepared.wallet_labels,
+            prepared.token1_amount[whale_mask],
+            market_cap[whale_mask]
+        )
+        aggregator.add_spent(
+            prepared.wallet_codes[buy_mask],
+            prepared.wallet_labels,
+            prepared.token1_amount[buy_mask]
+        )
+        sell_mask = priced & (side == TransactionEngine.SELL)
+        aggregator.add_sells(
+            prepared.wallet_codes[sell_mask],
+            prepared.wallet_labels,
+            prepared.token2_amount[sell_mask]
+        )
+
+    @staticmethod
+    def prepare_chunks(chunks, token_columns):
+        """Prepare an iterable of DataFrame chunks, one at a time"""
+        for chunk in chunks:
+            yield TransactionEngine.prepare(chunk, token_columns)
+
+    @staticmethod
+    def iter_transaction_batches(parts, sol_usd_price, token_address, total_supply, market_cap_threshold, aggregator,
+                                 builder=None, series=None):
+        """
+        Yield the transaction records of each PreparedTransactions part as it is
+        evaluated, folding its whale rows into `aggregator` along the way, and
+        its priced rows into `series` when one is given. The whale report is
+        only complete once the generator is exhausted.
+        """
+        builder = builder or TransactionEngine.build_transactions
+        for prepared in parts:
+            with metrics.metrics.stage('evaluate') as stage:
+                priced, price, market_cap, side = TransactionEngine.evaluate(
+                    prepared, sol_usd_price, token_address, total_supply
+                )
+                TransactionEngine.accumulate_whales(aggregator, prepared, priced, market_cap, side,
+                                                    market_cap_threshold)
+                if series is not None:
+                    series.add(prepared, priced, market_cap, side)
+                stage.rows = len(prepared)
+            with metrics.metrics.stage('build') as stage:
+                batch = builder(prepared, priced, price, market_cap, side)
+                stage.rows = len(prepared)
+            yield batch
+
+    @staticmethod
+    def process_prepared(parts, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n=None,
+                         aggregator=None, columnar=False, interval=None, early_buyers=None, include_transactions=True,
+                         series=None):
+        """
+        Evaluate a sequence of PreparedTransactions against the request
+        parameters, carrying the whale aggregates from one part to the next.
+        An existing aggregator can be passed in to continue earlier totals.
+        With `columnar`, transactions are returned as one list per field.
+
+        An `interval` in seconds adds a market cap `timeline`, and
+        `early_buyers` ranks the first wallets to buy; both come from one
+        time-sorted TimeSeries, which can also be passed in to collect the
+        priced rows. Without `include_transactions` the per-row records are
+        left out and only the aggregates are returned.
+        """
+        if aggregator is None:
+            aggregator = whale_aggregator.WhaleAggregator()
+        if series is None and (interval is not None or early_buyers is not None):
+            series = time_series.TimeSeries()
+        if not include_transactions:
+            transactions = None
+            builder = TransactionEngine.skip_transactions
+        elif columnar:
+            transactions = {field: [] for field in TransactionEngine.TRANSACTION_FIELDS}
+            builder = TransactionEngine.build_columns
+        else:
+            transactions = []
+            builder = TransactionEngine.build_transactions
+        for batch in TransactionEngine.iter_transaction_batches(
+            parts, sol_usd_price, token_address, total_supply, market_cap_threshold, aggregator, builder, series
+        ):
+            if transactions is None:
+                continue
+            if columnar:
+                for field, values in batch.items():
+                    transactions[field].extend(values)
+            else:
+                transactions.extend(batch)
+
+        result = {"whale_report": aggregator.report(sol_usd_price, top_n)}
+        if transactions is not None:
+            result = {"transactions": transactions, **result}
+        TransactionEngine.add_time_series(result, series, interval, early_buyers)
+        return result
+
+    @staticmethod
+    def add_time_series(result, series, interval=None, early_buyers=None):
+        """Add the requested timeline and early buyer ranking of a TimeSeries to a result"""
+        if interval is None and early_buyers is None:
+            return
+        with metrics.metrics.stage('time_series') as stage:
+            if interval is not None:
+                result["timeline"] = series.timeline(interval)
+            if early_buyers is not None:
+                result["early_buyers"] = series.early_buyers(early_buyers)
+            stage.rows = len(series)
+
+    @staticmethod
+    def group_by_token(prepared, token_addresses):
+        """
+        Split rows by traded token in one pass, returning one PreparedTransactions
+        per address. A row belongs to its token2 address, or to its token1
+        address when it sells that token for SOL.
+        """
+        lookup = {address.lower(): index for index, address in enumerate(token_addresses)}
+        token1_groups = np.array([lookup.get(label, -1) for label in prepared.token1_labels], dtype=np.intp)
+        token2_groups = np.array([lookup.get(label, -1) for label in prepared.token2_labels], dtype=np.intp)
+        row_groups = token2_groups[prepared.token2_codes]
+        token2_is_sol = np.isin(prepared.token2_labels, TransactionEngine.SOL_ADDRESSES)[prepared.token2_codes]
+        row_groups = np.where((row_groups < 0) & token2_is_sol, token1_groups[prepared.token1_codes], row_groups)
+
+        # A stable sort keeps every group in file order; untracked rows (-1) sort first
+        order = np.argsort(row_groups, kind='stable')
+        bounds = np.cumsum(np.bincount(row_groups + 1, minlength=len(token_addresses) + 1))
+        return [prepared.select(order[bounds[index]:bounds[index + 1]]) for index in range(len(token_addresses))]
+
+    @staticmethod
+    def process_tokens(parts, sol_usd_price, tokens, top_n=None, columnar=False, interval=None, early_buyers=None,
+                       include_transactions=True):
+        """
+        Evaluate several tokens against a single parse. `tokens` is a list of
+        (token_address, total_supply, market_cap_threshold); each token gets
+        the rows that buy or sell it, priced with its own parameters.
+        """
+        addresses = [token_address for token_address, _, _ in tokens]
+        groups = [[] for _ in tokens]
+        for prepared in parts:
+            for group, rows in zip(groups, TransactionEngine.group_by_token(prepared, addresses)):
+                group.append(rows)
+
+        results = []
+        for (token_address, total_supply, market_cap_threshold), group in zip(tokens, groups):
+            result = TransactionEngine.process_prepared(
+                group, sol_usd_price, token_address, total_supply, market_cap_threshold, top_n, columnar=columnar,
+                interval=interval, early_buyers=early_buyers, include_transactions=include_transactions
+            )
+            results.append({"tokenAddress": token_address, **result})
+        return results
+
+    @staticmethod
+    def process_chunks(chunks, sol_usd_price, token_address, total_supply, market_cap_threshold, token_columns, top_n=None):
+        """Process an iterable of DataFrame chunks, preparing only one chunk at a time"""
+        return TransactionEngine.process_prepared(
+            TransactionEngine.prepare_chunks(chunks, token_columns),
+            sol_usd_price, token_address, total_supply, market_cap_threshold, top_n
+        )
+
+    @staticmethod
+    def process(df, sol_usd_price, token_address, total_supply, market_cap_threshold, token_columns, top_n=None):
+        """
+        Calculate TOKEN2/USD Price and Market Cap for every row with whole-column
+        operations, and build the whale report from rows below the threshold.
+        """
+        return TransactionEngine.process_chunks(
+            [df], sol_usd_price, token_address, total_supply, market_cap_threshold, token_columns, top_n
+        )
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import fast_path
+
+
+class WhaleAggregator:
+    """Running per-wallet totals for the whale report.
+
+    Each wallet owns one slot in a set of parallel numeric arrays, assigned
+    in the order wallets are first seen. Only sums and counts are kept, so
+    memory grows with the number of wallets, not with the number of rows.
+    SOL spent on buys and received from sells are tracked for every wallet
+    at any market cap, for the net figure, but only wallets with at least
+    one qualifying buy appear in the report.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._wallets = []
+        self._sol_invested = np.zeros(0, dtype=np.float64)
+        self._market_cap_sum = np.zeros(0, dtype=np.float64)
+        self._buy_count = np.zeros(0, dtype=np.int64)
+        self._sol_sold = np.zeros(0, dtype=np.float64)
+        self._sol_spent = np.zeros(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self._wallets)
+
+    def _ensure_capacity(self, size):
+        """Grow the slot arrays geometrically so appends stay amortized O(1)"""
+        capacity = len(self._sol_invested)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for name in ('_sol_invested', '_market_cap_sum', '_buy_count', '_sol_sold', '_sol_spent'):
+            values = getattr(self, name)
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[:len(values)] = values
+            setattr(self, name, grown)
+
+    def _slots_for(self, wallets):
+        """Return the slot of every wallet label, registering unseen ones"""
+        slots = np.empty(len(wallets), dtype=np.intp)
+        for i, wallet in enumerate(wallets):
+            slot = self._slots.get(wallet)
+            if slot is None:
+                slot = len(self._wallets)
+                self._slots[wallet] = slot
+                self._wallets.append(wallet)
+            slots[i] = slot
+        self._ensure_capacity(len(self._wallets))
+        return slots
+
+    def add(self, wallet_codes, wallet_labels, sol_amounts, market_caps):
+        """Fold buy rows into the totals; wallet_codes index into wallet_labels"""
+        if len(wallet_codes) == 0:
+            return
+        # One reduction per distinct wallet: codes are re-factorized in first-seen order
+        local_codes, present = pd.factorize(wallet_codes)
+        slots = self._slots_for(wallet_labels[present].tolist())
+        count = len(present)
+        self._sol_invested[slots] += np.bincount(local_codes, weights=sol_amounts, minlength=count)
+        self._market_cap_sum[slots] += np.bincount(local_codes, weights=market_caps, minlength=count)
+        self._buy_count[slots] += np.bincount(local_codes, minlength=count)
+
+    def add_sells(self, wallet_codes, wallet_labels, sol_amounts):
+        """Fold sell rows into the SOL received per wallet"""
+        self._add_flow('_sol_sold', wallet_codes, wallet_labels, sol_amounts)
+
+    def add_spent(self, wallet_codes, wallet_labels, sol_amounts):
+        """Fold buy rows at any market cap into the SOL spent per wallet"""
+        self._add_flow('_sol_spent', wallet_codes, wallet_labels, sol_amounts)
+
+    def _add_flow(self, name, wallet_codes, wallet_labels, sol_amounts):
+        if len(wallet_codes) == 0:
+            return
+        local_codes, present = pd.factorize(wallet_codes)
+        slots = self._slots_for(wallet_labels[present].tolist())
+        getattr(self, name)[slots] += np.bincount(local_codes, weights=sol_amounts, minlength=len(present))
+
+    def merge(self, other):
+        """Add the totals of another aggregator into this one"""
+        if not len(other):
+            return
+        size = len(other)
+        slots = self._slots_for(other._wallets)
+        self._sol_invested[slots] += other._sol_invested[:size]
+        self._market_cap_sum[slots] += other._market_cap_sum[:size]
+        self._buy_count[slots] += other._buy_count[:size]
+        self._sol_sold[slots] += other._sol_sold[:size]
+        self._sol_spent[slots] += other._sol_spent[:size]
+
+    def ranked_slots(self, top_n=None):
+        """Slots of wallets with buys, ordered by SOL invested (descending), ties kept in first-seen order"""
+        candidates = np.flatnonzero(self._buy_count[:len(self._wallets)] > 0)
+        sol_invested = self._sol_invested[candidates]
+        if top_n is None or top_n >= len(candidates):
+            return candidates[np.argsort(-sol_invested, kind='stable')]
+        if top_n <= 0:
+            return np.zeros(0, dtype=np.intp)
+
+        # Partial selection: find the n-th largest value, then take everything above it
+        # plus the earliest wallets tied with it, so the result equals a full sort's head
+        kth_value = -np.partition(-sol_invested, top_n - 1)[top_n - 1]
+        above = np.flatnonzero(sol_invested > kth_value)
+        tied = np.flatnonzero(sol_invested == kth_value)[:top_n - len(above)]
+        selected = np.concatenate([above, tied])
+        return candidates[selected[np.lexsort((selected, -sol_invested[selected]))]]
+
+    # Shared with the fast path, which formats its report without numpy
+    format_entry = staticmethod(fast_path.format_whale_entry)
+
+    def report(self, sol_usd_price, top_n=None):
+        """Build the sorted whale report; numbers are only formatted here"""
+        slots = self.ranked_slots(top_n)
+        counts = self._buy_count[slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_market_caps = np.where(counts > 0, self._market_cap_sum[slots] / counts, 0.0)
+        return [
+            self.format_entry(self._wallets[slot], total_sol, avg_market_cap, sol_usd_price, sol_sold, sol_spent)
+            for slot, total_sol, avg_market_cap, sol_sold, sol_spent in zip(
+                slots.tolist(), self._sol_invested[slots].tolist(), avg_market_caps.tolist(),
+                self._sol_sold[slots].tolist(), self._sol_spent[slots].tolist()
+            )
+        ]
@@ -0,0 +1,144 @@
+"""
+Cold start of the analyze function: what `import analyze` costs, module by
+module, and how long a fresh process takes to answer its first upload with
+and without the pure-Python fast path.
+
+    python benchmarks/bench_cold_start.py --sizes 100,1000,5000
+
+Import times come from `python -X importtime -c "import analyze"` and list
+the modules with the largest cumulative time. Every request run starts a
+new interpreter; `first_request_ms` covers importing the handler and
+answering one upload, and `warm_request_ms` is a second upload with new
+parameters in the same process. FAST_PATH_MAX_BYTES=0 turns the fast path
+off for the comparison runs.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API = os.path.join(HERE, '..', 'api')
+sys.path.insert(0, API)
+sys.path.insert(0, HERE)
+
+DEFAULT_SIZES = (100, 1000, 2000, 5000)
+
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into (module, self_us, cumulative_us) tuples"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_imports(top):
+    """Import the handler in a fresh interpreter and report the costliest modules"""
+    env = dict(os.environ, PYTHONPATH=API)
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import analyze'],
+        cwd=API, env=env, capture_output=True, text=True, check=True
+    ).stderr
+    modules = parse_importtime(stderr)
+    total_us = next(cumulative for name, _, cumulative in modules if name == 'analyze')
+    loaded = {name for name, _, _ in modules}
+    heaviest = sorted(modules, key=lambda module: -module[2])[:top]
+    return {
+        'import_ms': round(total_us / 1000, 1),
+        'loads_pandas': 'pandas' in loaded,
+        'loads_numpy': 'numpy' in loaded,
+        'heaviest_ms': {name: round(cumulative / 1000, 1) for name, _, cumulative in heaviest}
+    }
+
+
+def worker(args):
+    """Child process: time the handler import and two requests, print JSON"""
+    from bench_suite import run_handler
+
+    start = time.perf_counter()
+    import analyze  # noqa: F401
+    imported = time.perf_counter()
+    first = run_handler(args.body)
+    answered = time.perf_counter()
+    # A different price gives a new cache key, so the warm request is computed too
+    second = run_handler(args.warm_body)
+    print(json.dumps({
+        'import_ms': round((imported - start) * 1000, 2),
+        'first_request_ms': round((answered - start) * 1000, 2),
+        'warm_request_ms': second['stages_ms']['total'],
+        'stages_ms': first['stages_ms'],
+        'loads_pandas': 'pandas' in sys.modules
+    }))
+
+
+def run_request(body_path, warm_body_path, fast_path):
+    env = dict(os.environ)
+    if not fast_path:
+        env['FAST_PATH_MAX_BYTES'] = '0'
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--body', body_path,
+               '--warm-body', warm_body_path]
+    start = time.perf_counter()
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    # Includes starting the interpreter itself
+    result['process_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def run_size(rows, generator_options, tmp):
+    from bench_suite import PARAMS, write_multipart
+    from swap_csv import TARGET_TOKEN, write_swap_csv
+
+    csv_path = os.path.join(tmp, f'swaps_{rows}.csv')
+    body_path = os.path.join(tmp, f'upload_{rows}.bin')
+    warm_body_path = os.path.join(tmp, f'upload_{rows}_warm.bin')
+    csv_bytes = write_swap_csv(csv_path, rows, **generator_options)
+    write_multipart(csv_path, body_path, dict(PARAMS, tokenAddress=TARGET_TOKEN))
+    write_multipart(csv_path, warm_body_path, dict(PARAMS, tokenAddress=TARGET_TOKEN, solPrice='151'))
+    return {
+        'rows': rows,
+        'csv_bytes': csv_bytes,
+        'fast_path': run_request(body_path, warm_body_path, fast_path=True),
+        'full_engine': run_request(body_path, warm_body_path, fast_path=False)
+    }
+
+
+def main():
+    from swap_csv import add_generator_arguments, generator_options
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='comma-separated row counts')
+    parser.add_argument('--top', type=int, default=10, help='number of modules listed by import time')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    add_generator_arguments(parser)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--body', help=argparse.SUPPRESS)
+    parser.add_argument('--warm-body', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    options = generator_options(args)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_size(rows, options, tmp) for rows in sizes]
+    report = {'generator': options, 'imports': measure_imports(args.top), 'results': results}
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Load and prepare time of an upload: plain pd.read_csv of every column
+against the schema-driven loader (selected columns, explicit dtypes,
+categorical addresses) with the pandas C parser and with pyarrow.
+
+    python benchmarks/bench_csv_load.py --rows 300000 --extra-columns 4
+
+--extra-columns appends unused text columns, like the notes and program ids
+found in real explorer exports.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+sys.path.insert(0, HERE)
+
+
+def load_legacy(path):
+    """Every column read with inferred dtypes, validated and prepared chunk by chunk"""
+    import pandas as pd
+    from csv_validator import CSVValidator
+    from transaction_engine import TransactionEngine
+
+    parts = []
+    token_columns = None
+    for chunk in pd.read_csv(path, chunksize=CSVValidator.CHUNK_ROWS):
+        CSVValidator._validate_frame(chunk)
+        token_columns = token_columns or CSVValidator.validate_token_columns(chunk)
+        parts.append(TransactionEngine.prepare(chunk, token_columns))
+    return parts
+
+
+def load_schema(path):
+    from csv_validator import CSVValidator
+    from transaction_engine import TransactionEngine
+
+    with open(path, 'rb') as f:
+        chunks = list(CSVValidator.iter_validated_chunks(f))
+    token_columns = chunks[0].schema.token_columns()
+    return [TransactionEngine.prepare(chunk.frame, token_columns, chunk.timestamps) for chunk in chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--extra-columns', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    import csv_validator
+    from swap_csv import HEADER, iter_swap_lines
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'swaps.csv')
+        extra = ''.join(f',"note {i}: {"x" * 60}"' for i in range(args.extra_columns))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(HEADER.rstrip('\n') + ''.join(f',Extra {i}' for i in range(args.extra_columns)) + '\n')
+            for line in iter_swap_lines(args.rows):
+                f.write(line.rstrip('\n') + extra + '\n')
+        size = os.path.getsize(path)
+
+        loaders = [('legacy', load_legacy, None), ('schema_c', load_schema, 'c')]
+        if csv_validator.pyarrow is not None:
+            loaders.append(('schema_pyarrow', load_schema, 'pyarrow'))
+        results = []
+        for name, loader, engine in loaders:
+            if engine:
+                csv_validator.CSVValidator.CSV_ENGINE = engine
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                parts = loader(path)
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            results.append({'loader': name, 'ms': round(best, 1), 'rows': sum(len(part) for part in parts)})
+
+    print(json.dumps({'rows': args.rows, 'file_mb': round(size / 1024 / 1024, 1), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
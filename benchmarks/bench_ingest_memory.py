@@ -0,0 +1,83 @@
+"""
+Peak RSS of CSV ingestion: the original base64 round-trip against parsing
+straight from the uploaded file object.
+
+    python benchmarks/bench_ingest_memory.py --rows 150000
+
+Every mode runs in a fresh interpreter so ru_maxrss only reflects that mode.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+sys.path.insert(0, HERE)
+
+MODES = ('base64', 'stream', 'chunks')
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, path):
+    import base64
+    from io import StringIO
+    import pandas as pd
+    from csv_validator import CSVValidator
+
+    baseline = _peak_rss_mb()
+    if mode == 'base64':
+        # What do_POST used to do: read, encode, decode, re-encode to measure, parse from str
+        with open(path, 'rb') as f:
+            file_content = f.read()
+        csv_base64 = base64.b64encode(file_content).decode('utf-8')
+        csv_data = base64.b64decode(csv_base64).decode('utf-8')
+        len(csv_data.encode('utf-8'))
+        df = pd.read_csv(StringIO(csv_data))
+        CSVValidator._validate_frame(df)
+        rows = len(df)
+    elif mode == 'stream':
+        with open(path, 'rb') as f:
+            rows = len(CSVValidator.validate_csv_stream(f))
+    else:
+        with open(path, 'rb') as f:
+            rows = sum(len(chunk) for chunk in CSVValidator.iter_csv_chunks(f))
+    return {'mode': mode, 'rows': rows, 'baseline_rss_mb': round(baseline, 1),
+            'peak_rss_mb': round(_peak_rss_mb(), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=150000)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path)))
+        return
+
+    from swap_csv import write_swap_csv
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'swaps.csv')
+        size = write_swap_csv(path, args.rows)
+        results = []
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--path', path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output))
+
+    print(json.dumps({'rows': args.rows, 'file_mb': round(size / 1024 / 1024, 1), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Rate limiter cost per request and retained memory: the original
+list-of-timestamps limiter against the token bucket limiter, with traffic
+spread over many distinct client IPs.
+
+    python benchmarks/bench_rate_limiter.py --ips 100000
+
+Each IP sends `--requests` requests in turn. Memory is the tracemalloc
+peak while the limiter is filled, and `retained_keys` is what is left
+after every IP has been idle for two minutes. The hot-key timing is one
+client sending requests slightly faster than the limit.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LegacyRateLimiter:
+    """The limiter rate_limiter.py used to ship, kept for comparison"""
+
+    def __init__(self, requests_per_minute=60, time_func=time.time):
+        self.requests_per_minute = requests_per_minute
+        self.requests = defaultdict(list)
+        self.lock = threading.Lock()
+        self.time_func = time_func
+
+    def is_rate_limited(self, ip):
+        with self.lock:
+            now = self.time_func()
+            self.requests[ip] = [req_time for req_time in self.requests[ip] if now - req_time < 60]
+            if len(self.requests[ip]) >= self.requests_per_minute:
+                return True
+            self.requests[ip].append(now)
+            return False
+
+    def __len__(self):
+        return len(self.requests)
+
+
+def _replay(limiter, clock, ips, requests):
+    for _ in range(requests):
+        for ip in ips:
+            limiter.is_rate_limited(ip)
+        clock.now += 0.5
+
+
+def run(factory, ips, requests):
+    clock = FakeClock()
+    limiter = factory(time_func=clock)
+    start = time.perf_counter()
+    _replay(limiter, clock, ips, requests)
+    elapsed = time.perf_counter() - start
+
+    # Sweeps are per stripe, so enough fresh traffic must arrive after the idle period
+    clock.now += 120
+    for i in range(256):
+        limiter.is_rate_limited(f'late-{i}')
+    retained = len(limiter) - 256
+
+    # A single client at the limit: the legacy limiter rebuilds a 60-entry list per request
+    clock = FakeClock()
+    limiter = factory(time_func=clock)
+    start = time.perf_counter()
+    for _ in range(100000):
+        limiter.is_rate_limited('hot')
+        clock.now += 0.9
+    hot_elapsed = time.perf_counter() - start
+
+    # Memory is measured on a separate run, since tracing slows every allocation down
+    clock = FakeClock()
+    tracemalloc.start()
+    _replay(factory(time_func=clock), clock, ips, requests)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'us_per_request': round(elapsed / (len(ips) * requests) * 1e6, 2),
+        'hot_key_us_per_request': round(hot_elapsed / 100000 * 1e6, 2),
+        'peak_mb': round(peak / 1e6, 1),
+        'retained_keys': retained
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ips', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=5)
+    args = parser.parse_args()
+
+    from rate_limiter import RateLimiter
+
+    ips = [f'{i >> 24 & 255}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(args.ips)]
+    results = {}
+    for name, factory in (('legacy', LegacyRateLimiter), ('token_bucket', RateLimiter)):
+        results[name] = run(factory, ips, args.requests)
+
+    print(json.dumps({'ips': args.ips, 'requests_per_ip': args.requests, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Payload size and serialization time of the analyze response formats: the
+original list of transaction objects against one array per column (JSON or
+Arrow IPC when pyarrow is installed).
+
+    python benchmarks/bench_response_format.py --rows 150000
+
+The CSV is parsed once; every format is then built from the same prepared
+columns. decode_ms is the time to load the payload back (json.loads or an
+Arrow stream read), a stand-in for the client's parsing cost.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+sys.path.insert(0, HERE)
+
+
+def _best_of(repeat, func):
+    """Run `func` `repeat` times, returning its last result and the fastest time in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=150000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    import response_writer
+    from csv_validator import CSVValidator
+    from swap_csv import TARGET_TOKEN, write_swap_csv
+    from transaction_engine import TransactionEngine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'swaps.csv')
+        write_swap_csv(path, args.rows)
+        with open(path, 'rb') as f:
+            chunks = CSVValidator.iter_csv_chunks(f)
+            first_chunk = next(chunks)
+            token_columns = CSVValidator.validate_token_columns(first_chunk)
+            token_columns['wallet'] = 'Wallet'
+            parts = list(TransactionEngine.prepare_chunks([first_chunk, *chunks], token_columns))
+
+    params = (150.0, TARGET_TOKEN, 1000000000, 50000000)
+    formats = [name for name in response_writer.FORMATS if name != 'ndjson']
+    results = []
+    for response_format in formats:
+        columnar = response_format in response_writer.COLUMNAR_FORMATS
+        result, build_ms = _best_of(args.repeat, lambda: TransactionEngine.process_prepared(
+            parts, *params, columnar=columnar
+        ))
+        body, encode_ms = _best_of(args.repeat, lambda: response_writer.encode_result(result, response_format))
+        if response_format == 'arrow':
+            pyarrow = response_writer.pyarrow
+            _, decode_ms = _best_of(args.repeat, lambda: pyarrow.ipc.open_stream(body).read_all())
+        else:
+            _, decode_ms = _best_of(args.repeat, lambda: json.loads(body))
+        results.append({
+            'format': response_format,
+            'bytes': len(body),
+            'gzip_bytes': len(gzip.compress(body, 6)),
+            'build_ms': round(build_ms, 1),
+            'encode_ms': round(encode_ms, 1),
+            'decode_ms': round(decode_ms, 1)
+        })
+
+    print(json.dumps({'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Load test of the self-hosted server: throughput and latency of concurrent
+keep-alive clients posting uploads, optionally while slow clients trickle
+uploads in over other connections.
+
+    python benchmarks/bench_server.py --concurrency 1,8,32 --duration 5
+
+The server runs in its own process (`api/server.py --port 0`) with the rate
+limit lifted. Each client thread keeps one connection open and posts the
+same CSV in a loop:
+
+- cached: identical parameters, answered from the result cache after the
+  first request, so this measures the HTTP and middleware overhead.
+- compute: a new SOL price on every request, so every upload is parsed and
+  priced.
+
+With --slow-clients, that many extra connections send their upload a
+kilobyte at a time for the whole run; each holds a connection thread but
+no analysis slot.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API = os.path.join(HERE, '..', 'api')
+sys.path.insert(0, API)
+sys.path.insert(0, HERE)
+
+BOUNDARY = '----benchserverboundary'
+DEFAULT_CONCURRENCY = (1, 8, 32)
+MODES = ('cached', 'compute')
+
+
+def multipart_body(fields, csv_bytes):
+    parts = [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="swaps.csv"\r\n'
+                 f'Content-Type: text/csv\r\n\r\n'.encode())
+    parts.append(csv_bytes)
+    parts.append(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    return b''.join(parts)
+
+
+def start_server(threads):
+    """Start api/server.py on a free port and return the process and its port"""
+    env = dict(os.environ, RATE_LIMIT_PER_MINUTE=str(10 ** 9))
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(API, 'server.py'), '--port', '0', '--threads', str(threads)],
+        cwd=API, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    line = process.stdout.readline()
+    if not line.startswith('Serving on'):
+        process.kill()
+        raise RuntimeError(f"Server did not start: {line!r}")
+    return process, int(line.split()[2].rsplit(':', 1)[1])
+
+
+def client(port, csv_bytes, params, mode, deadline, latencies, statuses, seed):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}
+    body = multipart_body(params, csv_bytes)
+    count = 0
+    while time.perf_counter() < deadline:
+        if mode == 'compute':
+            count += 1
+            body = multipart_body(dict(params, solPrice=f'{100 + seed}.{count}'), csv_bytes)
+        start = time.perf_counter()
+        try:
+            connection.request('POST', '/api/analyze', body, headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status = 'error'
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    connection.close()
+
+
+def slow_client(port, csv_bytes, params, stop):
+    """Send an upload a kilobyte at a time until stopped"""
+    body = multipart_body(params, csv_bytes)
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        sock.sendall(f'POST /api/analyze HTTP/1.1\r\nHost: localhost\r\n'
+                     f'Content-Type: multipart/form-data; boundary={BOUNDARY}\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode())
+        for start in range(0, len(body) - 1, 1024):
+            if stop.wait(0.5):
+                return
+            sock.sendall(body[start:min(start + 1024, len(body) - 1)])
+        stop.wait()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else None
+
+
+def run_load(port, csv_bytes, params, mode, concurrency, duration, slow_clients):
+    stop = threading.Event()
+    slow = [threading.Thread(target=slow_client, args=(port, csv_bytes, params, stop), daemon=True)
+            for _ in range(slow_clients)]
+    for thread in slow:
+        thread.start()
+
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(port, csv_bytes, params, mode, deadline, latencies[i], statuses[i], i))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+
+    all_latencies = [latency for client_latencies in latencies for latency in client_latencies]
+    status_counts = {}
+    for client_statuses in statuses:
+        for status, count in client_statuses.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'slow_clients': slow_clients,
+        'requests': len(all_latencies),
+        'requests_per_sec': round(len(all_latencies) / elapsed, 1),
+        # 503s are answered straight away once the analysis queue is full
+        'ok_per_sec': round(status_counts.get('200', 0) / elapsed, 1),
+        'latency_ms': {
+            name: round(percentile(all_latencies, fraction) * 1000, 2) if all_latencies else None
+            for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+        },
+        'statuses': status_counts
+    }
+
+
+def main():
+    from swap_csv import TARGET_TOKEN, add_generator_arguments, generator_options, write_swap_csv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000, help='rows of the uploaded CSV')
+    parser.add_argument('--concurrency', default=','.join(map(str, DEFAULT_CONCURRENCY)),
+                        help='comma-separated numbers of keep-alive clients')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated: cached, compute')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    parser.add_argument('--slow-clients', type=int, default=0, help='connections trickling an upload in')
+    parser.add_argument('--server-threads', type=int, default=64)
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    options = generator_options(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'swaps.csv')
+        write_swap_csv(csv_path, args.rows, **options)
+        with open(csv_path, 'rb') as f:
+            csv_bytes = f.read()
+    params = {'solPrice': '150', 'tokenAddress': TARGET_TOKEN, 'totalSupply': '1000000000', 'marketCap': '50000000'}
+
+    process, port = start_server(args.server_threads)
+    try:
+        results = [
+            run_load(port, csv_bytes, params, mode, int(concurrency), args.duration, args.slow_clients)
+            for mode in args.modes.split(',') if mode
+            for concurrency in args.concurrency.split(',') if concurrency
+        ]
+    finally:
+        process.terminate()
+        process.wait()
+    report = {
+        'generator': options,
+        'rows': args.rows,
+        'csv_bytes': len(csv_bytes),
+        'server_threads': args.server_threads,
+        'cpus': os.cpu_count(),
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+End-to-end benchmark suite: per-stage timings, throughput and peak memory
+of the analysis pipeline and of the full HTTP handler, from 1k to 1M rows.
+
+    python benchmarks/bench_suite.py --output report.json
+    python benchmarks/bench_suite.py --sizes 1000,10000 --compare report.json
+
+Every size runs twice, each time in a fresh interpreter so ru_maxrss only
+covers that run:
+
+- pipeline: CSV parsing and validation, preparing the columns, pricing and
+  JSON serialization, called directly. Stage times come from the metrics
+  registry and are the best of `--repeat` runs.
+- handler: one multipart upload through the wrapped request handler. Its
+  stage times are read from the Server-Timing header.
+
+The report is JSON and records the generator options and library versions.
+With --compare, any timing more than --tolerance slower than the baseline,
+or any peak RSS more than --tolerance larger, is listed as a regression
+and the exit status is 1. Tiny timings are noisy; --min-ms skips them.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+sys.path.insert(0, HERE)
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+BOUNDARY = '----benchsuiteboundary'
+# Analysis parameters sent with every run
+PARAMS = {'solPrice': '150', 'totalSupply': '1000000000', 'marketCap': '50000000'}
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_multipart(csv_path, body_path, fields):
+    """Wrap a CSV file into a multipart/form-data body on disk, as a browser upload would send it"""
+    with open(body_path, 'wb') as body, open(csv_path, 'rb') as csv_file:
+        for name, value in fields.items():
+            body.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        body.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="swaps.csv"\r\n'
+                   f'Content-Type: text/csv\r\n\r\n'.encode())
+        while True:
+            block = csv_file.read(1 << 20)
+            if not block:
+                break
+            body.write(block)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def run_pipeline(csv_path, repeat):
+    """Time each pipeline stage in-process, keeping the fastest run of each"""
+    import metrics
+    import response_writer
+    from csv_validator import CSVValidator
+    from swap_csv import TARGET_TOKEN
+    from transaction_engine import TransactionEngine
+
+    metrics.metrics.enabled = True
+    best = {}
+    for _ in range(repeat):
+        with metrics.metrics.request() as timings:
+            with open(csv_path, 'rb') as f:
+                chunks = list(CSVValidator.iter_validated_chunks(f))
+            token_columns = chunks[0].schema.token_columns()
+            parts = []
+            for chunk in chunks:
+                with metrics.metrics.stage('prepare'):
+                    parts.append(TransactionEngine.prepare(chunk.frame, token_columns, chunk.timestamps))
+            del chunks
+            with metrics.metrics.stage('process'):
+                result = TransactionEngine.process_prepared(
+                    parts, float(PARAMS['solPrice']), TARGET_TOKEN, float(PARAMS['totalSupply']),
+                    float(PARAMS['marketCap'])
+                )
+            with metrics.metrics.stage('serialize'):
+                body = response_writer.encode_result(result, 'json')
+            del result, parts
+        for name, seconds in timings.durations.items():
+            if name == 'request':
+                continue
+            best[name] = min(best.get(name, seconds), seconds)
+
+    stages_ms = {name: round(seconds * 1000, 2) for name, seconds in best.items()}
+    # read_csv and validate alternate per chunk; together they are the validation step
+    stages_ms['total'] = round(sum(best[name] for name in ('read_csv', 'validate', 'prepare', 'process', 'serialize'))
+                               * 1000, 2)
+    return {'stages_ms': stages_ms, 'response_bytes': len(body)}
+
+
+def run_handler(body_path):
+    """Send one multipart upload through the full handler stack"""
+    from email.message import Message
+    import analyze
+
+    size = os.path.getsize(body_path)
+    h = analyze.handler.__new__(analyze.handler)
+    h.wfile = io.BytesIO()
+    h.client_address = ('127.0.0.1', 50000)
+    h.request_version = 'HTTP/1.1'
+    h.requestline = 'POST /api/analyze HTTP/1.1'
+    h.command = 'POST'
+    h.path = '/api/analyze'
+    h.headers = Message()
+    h.headers['Content-Type'] = f'multipart/form-data; boundary={BOUNDARY}'
+    h.headers['Content-Length'] = str(size)
+    h.log_message = lambda *args: None
+    with open(body_path, 'rb') as h.rfile:
+        start = time.perf_counter()
+        h.do_POST()
+        elapsed = time.perf_counter() - start
+
+    head, _, payload = h.wfile.getvalue().partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    if status != 200:
+        raise RuntimeError(f"Handler answered {status}: {payload[:200]!r}")
+
+    stages_ms = {}
+    for entry in headers.get('Server-Timing', '').split(', '):
+        if ';dur=' in entry:
+            name, duration = entry.split(';dur=')
+            stages_ms[name] = float(duration)
+    stages_ms['total'] = round(elapsed * 1000, 2)
+    return {'stages_ms': stages_ms, 'request_bytes': size, 'response_bytes': len(payload)}
+
+
+def worker(args):
+    """Entry point of the per-run child process; prints its result as JSON"""
+    if args.worker == 'pipeline':
+        result = run_pipeline(args.csv, args.repeat)
+    else:
+        result = run_handler(args.body)
+    result['peak_rss_mb'] = round(_peak_rss_mb(), 1)
+    print(json.dumps(result))
+
+
+def _spawn(mode, **paths):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', mode]
+    for name, value in paths.items():
+        command += [f'--{name}', str(value)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_size(rows, generator_options, repeat, tmp):
+    from swap_csv import TARGET_TOKEN, write_swap_csv
+
+    csv_path = os.path.join(tmp, f'swaps_{rows}.csv')
+    body_path = os.path.join(tmp, f'upload_{rows}.bin')
+    csv_bytes = write_swap_csv(csv_path, rows, **generator_options)
+    write_multipart(csv_path, body_path, dict(PARAMS, tokenAddress=TARGET_TOKEN))
+
+    pipeline = _spawn('pipeline', csv=csv_path, repeat=repeat)
+    handler = _spawn('handler', body=body_path)
+    os.remove(body_path)
+    os.remove(csv_path)
+    for run in (pipeline, handler):
+        run['rows_per_sec'] = round(rows / (run['stages_ms']['total'] / 1000)) if run['stages_ms']['total'] else None
+    return {'rows': rows, 'csv_bytes': csv_bytes, 'pipeline': pipeline, 'handler': handler}
+
+
+def _versions():
+    versions = {'python': platform.python_version(), 'platform': platform.platform()}
+    for module in ('numpy', 'pandas', 'pyarrow'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    try:
+        versions['commit'] = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        versions['commit'] = None
+    return versions
+
+
+def compare(report, baseline, tolerance, min_ms):
+    """List the timings and peak memory figures that got worse than the baseline by more than `tolerance`"""
+    regressions = []
+    previous = {run['rows']: run for run in baseline['results']}
+    for run in report['results']:
+        old = previous.get(run['rows'])
+        if old is None:
+            continue
+        for kind in ('pipeline', 'handler'):
+            metrics = [(f'{stage}_ms', value, old[kind]['stages_ms'].get(stage))
+                       for stage, value in run[kind]['stages_ms'].items()]
+            metrics.append(('peak_rss_mb', run[kind]['peak_rss_mb'], old[kind]['peak_rss_mb']))
+            for name, value, old_value in metrics:
+                if old_value is None or (name.endswith('_ms') and max(value, old_value) < min_ms):
+                    continue
+                if value > old_value * (1 + tolerance):
+                    regressions.append({
+                        'rows': run['rows'], 'run': kind, 'metric': name,
+                        'baseline': old_value, 'current': value, 'ratio': round(value / old_value, 2)
+                    })
+    return regressions
+
+
+def main():
+    from swap_csv import add_generator_arguments, generator_options
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated row counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--compare', help='baseline report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--min-ms', type=float, default=5.0)
+    add_generator_arguments(parser)
+    parser.add_argument('--worker', choices=('pipeline', 'handler'), help=argparse.SUPPRESS)
+    parser.add_argument('--csv', help=argparse.SUPPRESS)
+    parser.add_argument('--body', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    options = generator_options(args)
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_size(rows, options, args.repeat, tmp) for rows in sizes]
+    report = {'generator': options, 'repeat': args.repeat, 'environment': _versions(), 'results': results}
+
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance, args.min_ms)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
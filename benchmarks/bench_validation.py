@@ -0,0 +1,100 @@
+"""
+CSV validation time: the original per-element checks against the schema
+fast path (sampled date format detection, one vectorized date parse and a
+bytes-level signature charset test).
+
+    python benchmarks/bench_validation.py --rows 100000
+
+Only validation is timed; every file is read into a DataFrame beforehand.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'api'))
+sys.path.insert(0, HERE)
+
+# Rewrites of the generated 'YYYY-MM-DD HH:MM:SS' times into other accepted layouts
+DATE_LAYOUTS = {
+    'default': None,
+    'iso8601': lambda value: value.replace(' ', 'T') + '.000Z',
+    'day_first': lambda value: f"{value[8:10]}/{value[5:7]}/{value[0:4]}{value[10:]}"
+}
+
+
+def legacy_validate(df):
+    """The checks validate_csv_base64 used to run, kept for comparison"""
+    import pandas as pd
+    from csv_validator import CSVValidator
+
+    missing_columns = [col for col in CSVValidator.REQUIRED_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+    pd.to_datetime(df['Human Time'], format='mixed')
+    if not df['Signature'].str.match(r'^[A-Za-z0-9+/=]+$').all():
+        raise ValueError("Invalid signature format")
+    token_columns = {}
+    for col in df.columns:
+        col_lower = col.lower()
+        for token in ('token1', 'token2'):
+            for kind in ('address', 'amount'):
+                if token in col_lower and kind in col_lower:
+                    token_columns[f'{token}_{kind}'] = col
+    return token_columns
+
+
+def fast_validate(df):
+    from csv_validator import CSVValidator
+
+    schema = CSVValidator._resolve_schema(df.columns)
+    CSVValidator._validate_frame(df, schema)
+    return schema.token_columns()
+
+
+def _best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    import pandas as pd
+    from swap_csv import write_swap_csv
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'swaps.csv')
+        write_swap_csv(path, args.rows)
+        base = pd.read_csv(path)
+
+    results = []
+    for layout, rewrite in DATE_LAYOUTS.items():
+        df = base.copy()
+        if rewrite:
+            df['Human Time'] = df['Human Time'].map(rewrite)
+        legacy_ms = _best_of(args.repeat, legacy_validate, df)
+        fast_ms = _best_of(args.repeat, fast_validate, df)
+        results.append({
+            'dates': layout,
+            'legacy_ms': round(legacy_ms, 1),
+            'fast_ms': round(fast_ms, 1),
+            'speedup': round(legacy_ms / fast_ms, 1)
+        })
+
+    print(json.dumps({'rows': args.rows, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
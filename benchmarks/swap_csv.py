@@ -0,0 +1,118 @@
+"""
+Deterministic synthetic swap exports for the benchmarks.
+
+    python benchmarks/swap_csv.py swaps.csv --rows 100000 --dates iso8601 --numbers mixed
+
+The same arguments and seed always produce the same file. With the
+defaults, every row swaps SOL against TARGET_TOKEN in one direction or
+the other, with plain decimal amounts and 'YYYY-MM-DD HH:MM:SS' times.
+"""
+import argparse
+import random
+
+HEADER = "Signature,Human Time,Token1 Address,Token1 Amount,Token2 Address,Token2 Amount,Wallet\n"
+TARGET_TOKEN = "CfVs3waH2Z9TM397qSkaipTDhA9wWgtt8UchZKfwkYiu"
+SIGNATURE_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# Rewrites of a 'YYYY-MM-DD HH:MM:SS' time into the layouts the validator accepts
+DATE_FORMATS = {
+    'default': lambda value: value,
+    'iso8601': lambda value: value.replace(' ', 'T') + '.000Z',
+    'day_first': lambda value: f"{value[8:10]}/{value[5:7]}/{value[0:4]}{value[10:]}",
+    'month_first': lambda value: f"{value[5:7]}/{value[8:10]}/{value[0:4]}{value[10:]}"
+}
+
+
+def _currency(value):
+    # Quoted, since the thousands separators are commas
+    return f'"${value:,.6f}"'
+
+
+# How amounts are written. 'mixed' puts a currency-formatted value on every
+# third row, so the column can only be parsed as text. 'scientific' writes
+# every value in exponent notation, which parses as float.
+NUMBER_FORMATS = {
+    'plain': lambda value, row: str(value),
+    'currency': lambda value, row: _currency(value),
+    'mixed': lambda value, row: _currency(value) if row % 3 == 0 else str(value),
+    'scientific': lambda value, row: f"{value:.6e}"
+}
+
+
+def iter_swap_lines(rows, seed=0, wallets=5000, sell_ratio=0.2, other_tokens=0, other_token_ratio=0.0,
+                    date_format='default', number_format='plain'):
+    """
+    Yield CSV lines for `rows` swaps of the target token, bought or sold for SOL.
+    A share `other_token_ratio` of the rows trade one of `other_tokens` other
+    tokens instead, so the target has to be picked out of a mixed export.
+    """
+    rng = random.Random(seed)
+    wallet_ids = [''.join(rng.choices(SIGNATURE_ALPHABET, k=44)) for _ in range(wallets)]
+    # Only drawn when asked for, so the default output never changes
+    other_ids = [''.join(rng.choices(SIGNATURE_ALPHABET, k=44)) for _ in range(other_tokens)]
+    format_date = DATE_FORMATS[date_format]
+    format_number = NUMBER_FORMATS[number_format]
+    for i in range(rows):
+        signature = ''.join(rng.choices(SIGNATURE_ALPHABET, k=88))
+        human_time = format_date(
+            f"2025-05-{17 + i // 86400 % 10:02d} {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+        )
+        sol_amount = round(rng.uniform(0.01, 25.0), 6)
+        token_amount = round(sol_amount * rng.uniform(4000.0, 9000.0), 2)
+        wallet = rng.choice(wallet_ids)
+        token = TARGET_TOKEN
+        if other_ids and rng.random() < other_token_ratio:
+            token = rng.choice(other_ids)
+        sol_text = format_number(sol_amount, i)
+        token_text = format_number(token_amount, i)
+        if rng.random() < 1 - sell_ratio:
+            yield f"{signature},{human_time},SOL,{sol_text},{token},{token_text},{wallet}\n"
+        else:
+            yield f"{signature},{human_time},{token},{token_text},SOL,{sol_text},{wallet}\n"
+
+
+def write_swap_csv(path, rows, seed=0, wallets=5000, **options):
+    """Write a synthetic export to `path` and return its size in bytes; options go to iter_swap_lines"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        for line in iter_swap_lines(rows, seed, wallets, **options):
+            f.write(line)
+        return f.tell()
+
+
+def add_generator_arguments(parser):
+    """Add the generator options to an argparse parser"""
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--wallets', type=int, default=5000)
+    parser.add_argument('--sell-ratio', type=float, default=0.2)
+    parser.add_argument('--other-tokens', type=int, default=0)
+    parser.add_argument('--other-token-ratio', type=float, default=0.0)
+    parser.add_argument('--dates', choices=list(DATE_FORMATS), default='default')
+    parser.add_argument('--numbers', choices=list(NUMBER_FORMATS), default='plain')
+
+
+def generator_options(args):
+    """The iter_swap_lines keyword arguments selected on the command line"""
+    return {
+        'seed': args.seed,
+        'wallets': args.wallets,
+        'sell_ratio': args.sell_ratio,
+        'other_tokens': args.other_tokens,
+        'other_token_ratio': args.other_token_ratio,
+        'date_format': args.dates,
+        'number_format': args.numbers
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=100000)
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+    size = write_swap_csv(args.path, args.rows, **generator_options(args))
+    print(f"Wrote {args.rows} rows ({size} bytes) to {args.path}")
+
+
+if __name__ == '__main__':
+    main()